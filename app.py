@@ -1,9 +1,8 @@
 # app.py
 from __future__ import annotations
 import streamlit as st
-import pandas as pd
 
-from modules.storage import init_db, fetch_dreams_dataframe
+from modules.storage import init_db, fetch_user_stats, fetch_monthly_counts
 from modules.auth import (
     ensure_session_keys, current_user,
     login_form, signup_form, logout_button, user_greeting
@@ -49,14 +48,16 @@ with right:
 # ---------- Overview content ----------
 st.markdown("#### Overview")
 
-df = fetch_dreams_dataframe(user["email"])
-total_dreams = int(df.shape[0]) if not df.empty else 0
-avg_sleep = (
-    f"{df['sleep_hours'].dropna().mean():.1f} h"
-    if (not df.empty and 'sleep_hours' in df)
-    else "–"
-)
-trend = "↑ improving" if total_dreams >= 2 else "–"
+# KPIs come from the user's running statistics (one row), not the full history
+us = fetch_user_stats(user["email"])
+total_dreams = us.n_dreams
+avg_sleep = f"{us.mean('sleep_hours'):.1f} h" if us.count("sleep_hours") else "–"
+# Recent (exponentially weighted) negative affect against the long-run mean
+if us.count("neg_affect") >= 2:
+    delta = us.ew_mean("neg_affect") - us.mean("neg_affect")
+    trend = "↑ improving" if delta < -2 else ("↓ heavier lately" if delta > 2 else "→ steady")
+else:
+    trend = "–"
 
 # KPI row
 c1, c2, c3 = st.columns(3)
@@ -66,12 +67,10 @@ kpi_card("Mood Trend", trend, "+ gentle routines", col=c3)
 
 # Monthly bar chart card
 def _monthly_chart():
-    if df.empty:
+    counts = fetch_monthly_counts(user["email"])
+    if counts.empty:
         st.info("Log your first dream to see charts here.")
         return
-    d = df.copy()
-    d["month"] = pd.to_datetime(d["created_at"]).dt.to_period("M").astype(str)
-    counts = d.groupby("month").size().reset_index(name="count")
     st.bar_chart(counts.set_index("month")["count"])
 
 card("Monthly Dreams", _monthly_chart)
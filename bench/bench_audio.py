@@ -0,0 +1,109 @@
+# bench/bench_audio.py
+"""
+Benchmark for the pre-upload audio stage (modules.audio.prepare_for_stt).
+
+Uses real clips passed with --files, otherwise synthesizes speech-like
+WAV clips in the formats browsers produce (44.1/48 kHz stereo PCM). For
+each clip it reports decode+resample+encode time, bytes before/after, and
+(with --upload) the transcription round trip through the local Groq stub
+for the raw vs. preprocessed upload.
+
+    python -m bench.bench_audio --durations 10 60 300 --codec flac opus --upload --json audio.json
+"""
+from __future__ import annotations
+import argparse
+import io
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+import soundfile as sf
+
+
+def synth_clip(seconds: float, sr: int = 48_000, channels: int = 2, seed: int = 0) -> bytes:
+    """Speech-ish test signal: voiced harmonics with syllable envelopes, pauses and room noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    syllables = np.clip(np.sin(2 * np.pi * 3.0 * t), 0, None) ** 2
+    pauses = (np.sin(2 * np.pi * 0.15 * t) > -0.6).astype(float)
+    x = 0.3 * voice * syllables * pauses + 0.01 * rng.standard_normal(t.size)
+    data = np.stack([x * (1.0 - 0.1 * c) for c in range(channels)], axis=1).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, data, sr, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def _clips(args) -> List[Tuple[str, bytes]]:
+    if args.files:
+        return [(os.path.basename(p), open(p, "rb").read()) for p in args.files]
+    out = []
+    for d in args.durations:
+        for sr, ch in ((44_100, 2), (48_000, 2), (48_000, 1)):
+            out.append((f"synth_{d:g}s_{sr // 1000}k_{ch}ch.wav", synth_clip(d, sr, ch, seed=int(d))))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", nargs="*", default=None, help="real audio clips to measure")
+    ap.add_argument("--durations", nargs="*", type=float, default=[10, 60, 300])
+    ap.add_argument("--codec", nargs="*", default=["flac", "opus"], choices=["flac", "opus"])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--upload", action="store_true", help="also time raw vs. processed upload via the stub")
+    ap.add_argument("--json", default=None)
+    args = ap.parse_args()
+
+    from bench.common import write_json, environment
+    from modules.audio import prepare_for_stt
+
+    post = None
+    if args.upload:
+        import requests
+        from tools.groq_stub import StubConfig, start_in_thread
+        server, base_url = start_in_thread(StubConfig(stt_latency_ms=0, jitter_ms=0))
+        session = requests.Session()
+
+        def post(data: bytes, name: str) -> float:
+            t0 = time.perf_counter()
+            r = session.post(f"{base_url}/audio/transcriptions",
+                             files={"file": (name, io.BytesIO(data), "application/octet-stream")},
+                             data={"model": "whisper-large-v3", "response_format": "text"})
+            r.raise_for_status()
+            return time.perf_counter() - t0
+
+    results: List[Dict] = []
+    print(f"{'clip':<28}{'codec':>6}{'raw KB':>10}{'out KB':>10}{'ratio':>8}{'prep ms':>10}"
+          + (f"{'up raw ms':>11}{'up out ms':>11}" if post else ""))
+    for name, raw in _clips(args):
+        for codec in args.codec:
+            times = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                out, out_name = prepare_for_stt(raw, name, codec=codec)
+                times.append(time.perf_counter() - t0)
+            row = {
+                "clip": name, "codec": codec, "out_name": out_name,
+                "raw_bytes": len(raw), "out_bytes": len(out),
+                "ratio": len(raw) / max(len(out), 1),
+                "prep_ms_median": float(np.median(times) * 1000),
+            }
+            if post:
+                row["upload_raw_ms"] = post(raw, name) * 1000
+                row["upload_out_ms"] = post(out, out_name) * 1000
+            results.append(row)
+            print(f"{name:<28}{codec:>6}{len(raw) / 1024:>10.0f}{len(out) / 1024:>10.0f}"
+                  f"{row['ratio']:>8.1f}{row['prep_ms_median']:>10.1f}"
+                  + (f"{row['upload_raw_ms']:>11.1f}{row['upload_out_ms']:>11.1f}" if post else ""))
+
+    write_json(args.json, {"benchmark": "audio_preprocess", "params": vars(args),
+                           "env": environment(), "results": results})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
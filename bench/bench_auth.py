@@ -0,0 +1,145 @@
+# bench/bench_auth.py
+"""
+Login throughput / load test for modules.auth.
+
+Provisions N synthetic users in an auth database (a scratch file by
+default; pass --db data/auth.db to use the real path) and drives
+concurrent sign-in and sign-up workloads through signin_user /
+signup_user, i.e. the real PBKDF2 cost, hash worker pool, throttling and
+connection pool. For each workload and concurrency level it reports
+throughput, latency percentiles, outcome counts and CPU usage.
+
+    python -m bench.bench_auth --users 2000 --ops 400 --concurrency 1 4 16 64 --json auth.json
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", default=None, help="auth database path (default: scratch file)")
+    ap.add_argument("--users", type=int, default=1000, help="synthetic users to provision")
+    ap.add_argument("--ops", type=int, default=300, help="operations per workload per concurrency level")
+    ap.add_argument("--concurrency", type=int, nargs="*", default=[1, 4, 16])
+    ap.add_argument("--workload", nargs="*", default=["signin", "signup"], choices=["signin", "signup"])
+    ap.add_argument("--wrong-rate", type=float, default=0.1, help="fraction of sign-ins with a wrong password")
+    ap.add_argument("--iterations", type=int, default=None, help="override AUTH_PBKDF2_ITERATIONS")
+    ap.add_argument("--hash-workers", type=int, default=None, help="override AUTH_HASH_WORKERS")
+    ap.add_argument("--json", default=None)
+    return ap.parse_args()
+
+
+def main():
+    args = _parse_args()
+    db = args.db or os.path.join(tempfile.mkdtemp(prefix="noctimind-auth-bench-"), "auth.db")
+    os.environ["NOCTIMIND_AUTH_DB"] = db
+    if args.iterations:
+        os.environ["AUTH_PBKDF2_ITERATIONS"] = str(args.iterations)
+    if args.hash_workers:
+        os.environ["AUTH_HASH_WORKERS"] = str(args.hash_workers)
+    # Keep lockouts out of the measurement; wrong passwords are part of the mix.
+    os.environ.setdefault("AUTH_EMAIL_FREE_ATTEMPTS", "1000")
+
+    from bench.common import summarize, print_table, write_json, environment
+    from modules import auth
+
+    password = "Bench12345"
+    run_id = str(int(time.time()))
+
+    # ---- Provision: one real hash, reused, so setup is fast but sign-ins pay full cost.
+    t0 = time.perf_counter()
+    pwhash, salt = auth._hash_password(password)
+    emails = [f"user{i}.{run_id}@bench.test" for i in range(args.users)]
+    with auth._db.connection() as conn:
+        conn.executemany(
+            auth._SQL_INSERT_USER,
+            [(e, f"User {i}", pwhash, salt, time.time(), auth.HASH_ALG, auth.HASH_ITERATIONS)
+             for i, e in enumerate(emails)],
+        )
+    print(f"provisioned {args.users} users in {time.perf_counter() - t0:.2f}s "
+          f"(db={db}, {auth.HASH_ALG}/{auth.HASH_ITERATIONS}, hash workers={auth._HASH_WORKERS})")
+
+    signup_seq = iter(range(10**9))
+    seq_lock = threading.Lock()
+
+    def op_signin(i: int) -> str:
+        wrong = random.Random(i).random() < args.wrong_rate
+        ok, msg, _ = auth.signin_user(emails[i % len(emails)], "WrongPass1" if wrong else password)
+        return "ok" if ok else ("wrong_password" if "Incorrect" in msg else "busy" if "busy" in msg else "error")
+
+    def op_signup(_i: int) -> str:
+        with seq_lock:
+            n = next(signup_seq)
+        ok, msg = auth.signup_user(f"new{n}.{run_id}@bench.test", "New User", password)
+        return "ok" if ok else ("busy" if "busy" in msg else "error")
+
+    ops = {"signin": op_signin, "signup": op_signup}
+    results: Dict[str, Dict] = {}
+    table: Dict[str, Dict[str, float]] = {}
+    ncpu = os.cpu_count() or 1
+
+    for workload in args.workload:
+        for conc in args.concurrency:
+            lat: List[float] = []
+            outcomes: Counter = Counter()
+            lock = threading.Lock()
+            counter = iter(range(args.ops))
+
+            def worker():
+                while True:
+                    with lock:
+                        i = next(counter, None)
+                    if i is None:
+                        return
+                    p0 = time.perf_counter()
+                    out = ops[workload](i)
+                    dt = time.perf_counter() - p0
+                    with lock:
+                        lat.append(dt)
+                        outcomes[out] += 1
+
+            cpu0, w0 = time.process_time(), time.perf_counter()
+            threads = [threading.Thread(target=worker) for _ in range(conc)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall, cpu = time.perf_counter() - w0, time.process_time() - cpu0
+
+            key = f"{workload}@{conc}"
+            summary = summarize(lat, wall)
+            table[key] = summary
+            results[key] = {
+                "workload": workload, "concurrency": conc, "latency_s": summary,
+                "outcomes": dict(outcomes), "wall_s": wall, "cpu_s": cpu,
+                "cpu_util_of_one_core": cpu / wall if wall else 0.0,
+                "cpu_util_of_machine": cpu / (wall * ncpu) if wall else 0.0,
+            }
+
+    print_table("Auth latency", table)
+    print(f"\n{'run':<16}{'ops/s':>10}{'cpu (cores)':>13}{'cpu %':>8}  outcomes")
+    for key, r in results.items():
+        print(f"{key:<16}{r['latency_s'].get('throughput_per_s', 0):>10.1f}"
+              f"{r['cpu_util_of_one_core']:>13.2f}{100 * r['cpu_util_of_machine']:>7.0f}%  {r['outcomes']}")
+    maxrss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print(f"\nmax RSS {maxrss_mb:.0f} MB, {ncpu} CPUs")
+
+    write_json(args.json, {
+        "benchmark": "auth", "params": vars(args), "env": environment(),
+        "hash": {"alg": auth.HASH_ALG, "iterations": auth.HASH_ITERATIONS, "workers": auth._HASH_WORKERS},
+        "max_rss_mb": maxrss_mb, "results": results,
+    })
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
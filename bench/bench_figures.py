@@ -0,0 +1,84 @@
+# bench/bench_figures.py
+"""
+Figure construction benchmark for the per-dream charts in modules.visuals.
+
+Compares building emotion_node_graph / the emotion bar from scratch
+(_build_node_graph / _build_emotion_bar) with the skeleton path, both on a
+cold memo cache (every vector new) and on a history-like stream where
+emotion vectors repeat. Also reports the serialized JSON size, which is
+what Streamlit ships to the browser per chart.
+
+    python -m bench.bench_figures --dreams 500 --distinct 120 --json figures.json
+"""
+from __future__ import annotations
+import argparse
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+
+def _vectors(n: int, distinct: int, seed: int) -> List[Dict[str, float]]:
+    from modules.visuals import EMOTION_ORDER
+    rng = np.random.default_rng(seed)
+    pool = rng.dirichlet(np.ones(len(EMOTION_ORDER)), size=max(distinct, 1)) * 100
+    picks = rng.integers(0, len(pool), size=n)
+    return [dict(zip(EMOTION_ORDER, pool[i])) for i in picks]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dreams", type=int, default=500, help="figures to build per mode")
+    ap.add_argument("--distinct", type=int, default=120, help="distinct emotion vectors in the stream")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", default=None)
+    args = ap.parse_args()
+
+    from bench.common import summarize, timer, print_table, write_json, environment
+    from modules import visuals as v
+
+    emos = _vectors(args.dreams, args.distinct, args.seed)
+    as_array = [np.array([e[k] for k in v.EMOTION_ORDER]) for e in emos]
+    fresh = _vectors(args.dreams, args.dreams, args.seed + 1)  # all distinct: cold cache
+
+    runs = {
+        "node/scratch": lambda i: v._build_node_graph(as_array[i]),
+        "node/skeleton cold": lambda i: v.emotion_node_graph(fresh[i]),
+        "node/skeleton stream": lambda i: v.emotion_node_graph(emos[i]),
+        "bar/scratch": lambda i: v._build_emotion_bar(as_array[i]),
+        "bar/skeleton stream": lambda i: v.emotion_bar_figure(emos[i]),
+    }
+    # Skeletons are built once per process; keep that out of the per-figure numbers.
+    v.emotion_node_graph({}), v.emotion_bar_figure({})
+    v._node_graph_dict.cache_clear()
+    v._emotion_bar_dict.cache_clear()
+
+    table: Dict[str, Dict[str, float]] = {}
+    for name, build in runs.items():
+        samples: List[float] = []
+        for i in range(args.dreams):
+            with timer(samples):
+                build(i)
+        table[name] = summarize(samples)
+    print_table("Figure construction", table)
+
+    sizes = {
+        "node/scratch": len(v._build_node_graph(as_array[0]).to_json()),
+        "node/skeleton": len(v.emotion_node_graph(emos[0]).to_json()),
+        "node/no animation": len(v.emotion_node_graph(emos[0], blink_top=False).to_json()),
+        "bar/scratch": len(v._build_emotion_bar(as_array[0]).to_json()),
+        "bar/skeleton": len(v.emotion_bar_figure(emos[0]).to_json()),
+    }
+    print(f"\n{'figure':<24}{'JSON KB':>10}")
+    for name, n in sizes.items():
+        print(f"{name:<24}{n / 1024:>10.1f}")
+    stats = v.figure_cache_stats()
+    print(f"\ncache: {stats}")
+
+    write_json(args.json, {"benchmark": "figures", "params": vars(args), "env": environment(),
+                           "latency_s": table, "json_bytes": sizes, "cache": stats})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# bench/bench_log_path.py
+"""
+End-to-end latency benchmark for the Log page's analyze-and-save path,
+run against the local Groq stub (tools/groq_stub.py) so no API quota is used.
+
+Each simulated session does what the Log page does on "Analyze & Save":
+embed the text, insert the dream with its analysis pending, and let the
+analysis worker(s) fill it in through the rate limiter and the stub.
+
+    python -m bench.bench_log_path --dreams 300 --sessions 16 --workers 4 \
+        --latency-ms 400 --error-rate 0.05 --fake-embeddings --json log_path.json
+
+Reports throughput and p50/p95/p99 for save (embed + insert), analysis
+(queue + LLM + update) and end-to-end latency.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dreams", type=int, default=200, help="total dreams to log")
+    ap.add_argument("--sessions", type=int, default=8, help="concurrent simulated sessions")
+    ap.add_argument("--workers", type=int, default=1, help="analysis worker threads")
+    ap.add_argument("--base-url", default=None, help="use an already-running stub instead of starting one")
+    ap.add_argument("--latency-ms", type=float, default=300.0)
+    ap.add_argument("--jitter-ms", type=float, default=100.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--rpm", type=float, default=6000.0, help="GROQ_RPM for the limiter under test")
+    ap.add_argument("--max-concurrent", type=int, default=8, help="GROQ_MAX_CONCURRENT")
+    ap.add_argument("--fake-embeddings", action="store_true",
+                    help="use deterministic hash vectors instead of loading MiniLM")
+    ap.add_argument("--timeout", type=float, default=600.0, help="max seconds to wait for analyses")
+    ap.add_argument("--json", default=None, help="write machine-readable results here")
+    return ap.parse_args()
+
+
+def main():
+    args = _parse_args()
+
+    # The modules read their config at import time, so set it up first.
+    scratch = tempfile.mkdtemp(prefix="noctimind-bench-")
+    os.environ["NOCTIMIND_DB"] = os.path.join(scratch, "noctimind.db")
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.environ["GROQ_RPM"] = str(args.rpm)
+    os.environ["GROQ_BURST"] = str(max(args.rpm / 60.0, 1.0))
+    os.environ["GROQ_MAX_CONCURRENT"] = str(args.max_concurrent)
+    os.environ["NOCTIMIND_JOB_MAX_ATTEMPTS"] = "50"
+
+    from tools.groq_stub import StubConfig, start_in_thread
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        cfg = StubConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         error_rate=args.error_rate, rate_429=args.rate_429,
+                         malformed_rate=args.malformed_rate)
+        server, base_url = start_in_thread(cfg)
+    os.environ["GROQ_BASE_URL"] = base_url
+
+    from bench.common import summarize, print_table, write_json, environment, fake_embedding
+    from modules import storage, jobs
+    from modules.ratelimit import limiter_metrics
+    from sqlalchemy import text as sa_text
+
+    if args.fake_embeddings:
+        embed = fake_embedding
+    else:
+        from modules.nlp import get_embedding as embed
+        embed("warm up")
+
+    # Retries in the bench should not wait out the production backoff.
+    _fail = storage.fail_analysis_job
+    jobs.fail_analysis_job = lambda job_id, error, max_attempts=8: _fail(
+        job_id, error, max_attempts=max_attempts, base_delay_s=0.05, max_delay_s=1.0)
+
+    texts = [
+        f"Dream {i}: I was walking through a forest when the path turned into a school corridor "
+        f"and an exam started without me. Then water rose slowly around the desks ({i % 17})."
+        for i in range(args.dreams)
+    ]
+    save_lat: List[float] = []
+    started: Dict[int, float] = {}
+    lock = threading.Lock()
+    next_idx = iter(range(args.dreams))
+
+    def session(sid: int):
+        email = f"bench{sid}@example.com"
+        while True:
+            with lock:
+                i = next(next_idx, None)
+            if i is None:
+                return
+            t0 = time.time()
+            p0 = time.perf_counter()
+            emb = embed(texts[i])
+            did = storage.insert_dream(email, texts[i], "bench", 7.0, 3, None, None, None, None,
+                                       emb, analysis_pending=True)
+            dt = time.perf_counter() - p0
+            with lock:
+                save_lat.append(dt)
+                started[did] = t0
+
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            if not jobs.run_one_job():
+                time.sleep(0.01)
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(args.workers)]
+    for w in workers:
+        w.start()
+
+    t_start = time.perf_counter()
+    sessions = [threading.Thread(target=session, args=(s,)) for s in range(args.sessions)]
+    for s in sessions:
+        s.start()
+    for s in sessions:
+        s.join()
+    t_saved = time.perf_counter()
+
+    deadline = time.time() + args.timeout
+    while storage.pending_analysis_count() and time.time() < deadline:
+        time.sleep(0.05)
+    t_done = time.perf_counter()
+    stop.set()
+
+    with storage._engine.begin() as conn:
+        rows = conn.execute(sa_text(
+            "SELECT dream_id, status, attempts, created_at, updated_at FROM analysis_jobs"
+        )).mappings().all()
+    analysis_lat = [r["updated_at"] - r["created_at"] for r in rows if r["status"] == "done"]
+    e2e_lat = [r["updated_at"] - started[r["dream_id"]] for r in rows
+               if r["status"] == "done" and r["dream_id"] in started]
+    retries = sum(max(int(r["attempts"]), 0) for r in rows)
+    unfinished = sum(1 for r in rows if r["status"] != "done")
+
+    results = {
+        "save": summarize(save_lat, t_saved - t_start),
+        "analysis": summarize(analysis_lat),
+        "end_to_end": summarize(e2e_lat, t_done - t_start),
+    }
+    print_table(f"Analyze-and-save via stub at {base_url}", results)
+    print(f"\nsaved {len(save_lat)} dreams in {t_saved - t_start:.2f}s "
+          f"({len(save_lat) / max(t_saved - t_start, 1e-9):.1f}/s); "
+          f"all analyzed after {t_done - t_start:.2f}s "
+          f"({len(e2e_lat) / max(t_done - t_start, 1e-9):.1f}/s); "
+          f"retries={retries} unfinished={unfinished}")
+
+    write_json(args.json, {
+        "benchmark": "log_path",
+        "params": vars(args),
+        "env": environment(),
+        "results": results,
+        "retries": retries,
+        "unfinished": unfinished,
+        "limiters": limiter_metrics(),
+    })
+    if server is not None:
+        server.shutdown()
+    return 0 if unfinished == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# bench/bench_storage.py
+"""
+Storage / Insights / visuals benchmark across history sizes.
+
+For each --sizes entry a fresh user with exactly that many synthetic dreams
+(bench.synth) is added to a scratch database that also holds --background
+dreams spread over --users other users. Every storage read the pages make,
+the Insights engine and the figure builders are then timed for that user:
+
+  first   the first call, which includes building lazily materialized
+          aggregates (word counts, stats, motif graph, archetypes)
+  warm    --repeat further calls (mean / p50 / p95 / p99 / max)
+
+Whole-history scans (fetch_dreams_dataframe, wordcloud_image over all texts)
+are skipped above --max-full-scan dreams and reported as skipped.
+
+    python -m bench.bench_storage --sizes 1000 10000 100000 --background 20000 --json storage.json
+    python -m bench.bench_storage --sizes 1000000 --embedding-dim 0 --max-full-scan 0 --only "fetch_|Insights"
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+from typing import Callable, Dict, List, Tuple
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", default=None, help="new database path (default: scratch file)")
+    ap.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000], help="dreams per benchmarked user")
+    ap.add_argument("--users", type=int, default=20, help="background users")
+    ap.add_argument("--background", type=int, default=10000, help="background dreams across --users")
+    ap.add_argument("--repeat", type=int, default=5, help="warm calls per case")
+    ap.add_argument("--max-full-scan", type=int, default=100000,
+                    help="skip whole-history cases above this many dreams")
+    ap.add_argument("--embedding-dim", type=int, default=384, help="0 leaves embeddings NULL")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--only", default=None, help="regex: run only matching cases")
+    ap.add_argument("--skip", default=None, help="regex: skip matching cases")
+    ap.add_argument("--json", default=None)
+    return ap.parse_args()
+
+
+def _cases(email: str, full_scan: bool) -> List[Tuple[str, Callable[[], object], bool]]:
+    """(name, call, whole-history scan) in page order; the insert goes last."""
+    import pandas as pd
+    from modules import storage as s
+    from modules import visuals as v
+    from modules.insights import InsightsEngine
+    from modules.motif_graph import motif_graph, motif_layout, motif_communities
+
+    # Inputs the figure builders take, fetched outside the timed calls
+    rows = s.fetch_insight_rows(email)
+    eng = InsightsEngine.from_rows(rows)
+    arc_df = pd.DataFrame({"created_at": [r[0] for r in rows], "emotions": [json.loads(r[1]) for r in rows]})
+    top = s.top_motifs(email, k=10)
+    motif = top[0][0] if top else "ocean"
+    texts: List[str] = []
+    if full_scan:
+        texts = s.fetch_dreams_dataframe(email)["text"].tolist()
+
+    return [
+        ("storage.fetch_data_version", lambda: s.fetch_data_version(email), False),
+        ("storage.fetch_user_stats", lambda: s.fetch_user_stats(email), False),
+        ("storage.fetch_monthly_counts", lambda: s.fetch_monthly_counts(email), False),
+        ("storage.fetch_analysis_status_counts", lambda: s.fetch_analysis_status_counts(email), False),
+        ("storage.fetch_dreams_dataframe", lambda: s.fetch_dreams_dataframe(email), True),
+        ("storage.fetch_dreams_page", lambda: s.fetch_dreams_page(email, limit=20), False),
+        ("storage.fetch_dreams_page[emotion]", lambda: s.fetch_dreams_page(email, limit=20, emotion="fear"), False),
+        ("storage.fetch_dreams_page[motif]", lambda: s.fetch_dreams_page(email, limit=20, motif=motif), False),
+        ("storage.fetch_word_frequencies", lambda: s.fetch_word_frequencies(email), False),
+        ("storage.fetch_insight_rows", lambda: s.fetch_insight_rows(email), False),
+        ("storage.fetch_regression_stats", lambda: s.fetch_regression_stats(email), False),
+        ("storage.top_motifs", lambda: s.top_motifs(email, k=10), False),
+        ("storage.fetch_dreams_with_motif", lambda: s.fetch_dreams_with_motif(email, motif, limit=5), False),
+        ("storage.motif_neighbors", lambda: s.motif_neighbors(email, motif, k=5), False),
+        ("storage.fetch_motif_graph", lambda: s.fetch_motif_graph(email), False),
+        ("storage.fetch_archetype_stats", lambda: s.fetch_archetype_stats(email), False),
+        ("storage.fetch_archetype_transitions", lambda: s.fetch_archetype_transitions(email, normalize=True), False),
+        ("insights.InsightsEngine.from_rows", lambda: InsightsEngine.from_rows(rows), False),
+        ("insights.mean_emotions", lambda: (eng.mean_emotions(), eng.mean_emotions(10)), False),
+        ("insights.rolling_neg_affect", lambda: eng.rolling_neg_affect(7), False),
+        ("motif_graph.communities+layout", lambda: (motif_graph(email), motif_communities(email), motif_layout(email)), False),
+        ("visuals.emotion_arc_chart", lambda: v.emotion_arc_chart(arc_df), False),
+        ("visuals.emotion_arc_chart[W]", lambda: v.emotion_arc_chart(arc_df, resample="W", rolling=4), False),
+        ("visuals.wordcloud_image", lambda: v.wordcloud_image(texts), True),
+        ("visuals.wordcloud_png_from_frequencies",
+         lambda: v.wordcloud_png_from_frequencies(s.fetch_word_frequencies(email)[1]), False),
+        ("visuals.emotion_distribution_pie", lambda: v.emotion_distribution_pie(eng.mean_emotions()), False),
+        ("visuals.correlation_scatter",
+         lambda: v.correlation_scatter(eng.frame().dropna(subset=["sleep_hours"]), x="sleep_hours", y="neg_affect",
+                                       stats=s.fetch_regression_stats(email).get(("sleep_hours", "neg_affect"))), False),
+        ("visuals.motif_network_figure",
+         lambda: v.motif_network_figure(motif_graph(email)[1], motif_layout(email), motif_communities(email)), False),
+        ("visuals.archetype_transition_heatmap",
+         lambda: v.archetype_transition_heatmap(s.fetch_archetype_transitions(email, normalize=True),
+                                                s.fetch_archetype_transitions(email)), False),
+        ("storage.insert_dream", lambda: s.insert_dream(
+            email, "I was swimming in a flooded classroom.", "recurring", 6.5, 3, ["swimming", "classroom"],
+            "shadow", "", {"fear": 40.0, "sadness": 20.0, "neutral": 40.0}, None), False),
+    ]
+
+
+def main():
+    args = _parse_args()
+
+    # modules.storage opens NOCTIMIND_DB at import time
+    os.environ["NOCTIMIND_DB"] = args.db or os.path.join(tempfile.mkdtemp(prefix="noctimind-bench-"), "noctimind.db")
+
+    from bench.common import summarize, timer, write_json, environment
+    from bench.synth import populate, split_counts
+
+    only = re.compile(args.only) if args.only else None
+    skip = re.compile(args.skip) if args.skip else None
+
+    setup: Dict[str, Dict[str, float]] = {}
+    if args.background:
+        counts = split_counts(args.background, args.users, args.seed)
+        bg = {f"bg{i}@example.com": c for i, c in enumerate(counts) if c}
+        setup["background"] = populate(bg, args.seed, embedding_dim=args.embedding_dim)
+        print(f"background: {args.background:,} dreams / {len(bg)} users "
+              f"({setup['background']['rows_per_s']:,.0f} rows/s)")
+
+    results: Dict[str, Dict[str, dict]] = {}
+    for size in args.sizes:
+        email = f"bench-{size}@example.com"
+        setup[str(size)] = populate({email: size}, args.seed, embedding_dim=args.embedding_dim)
+        full_scan = size <= args.max_full_scan
+        print(f"\n== {size:,} dreams ({setup[str(size)]['rows_per_s']:,.0f} rows/s to generate + write)")
+
+        per_case: Dict[str, dict] = {}
+        print(f"{'case':<44}{'first':>11}{'warm p50':>11}{'warm p95':>11}  (ms)")
+        for name, call, scan in _cases(email, full_scan):
+            if (only and not only.search(name)) or (skip and skip.search(name)):
+                continue
+            if scan and not full_scan:
+                per_case[name] = {"skipped": f"whole-history scan above --max-full-scan={args.max_full_scan}"}
+                print(f"{name:<44}{'skipped (full scan)':>33}")
+                continue
+            first: List[float] = []
+            with timer(first):
+                call()
+            warm: List[float] = []
+            for _ in range(args.repeat):
+                with timer(warm):
+                    call()
+            stats = summarize(warm)
+            per_case[name] = {"first_s": first[0], "warm": stats}
+            print(f"{name:<44}{first[0] * 1000:>11.1f}"
+                  + "".join(f"{stats.get(k, float('nan')) * 1000:>11.2f}" for k in ("p50", "p95")))
+        results[str(size)] = per_case
+
+    db_mb = os.path.getsize(os.environ["NOCTIMIND_DB"]) / 2**20
+    maxrss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print(f"\ndatabase {db_mb:,.0f} MB at {os.environ['NOCTIMIND_DB']}; max RSS {maxrss_mb:,.0f} MB")
+
+    write_json(args.json, {
+        "benchmark": "storage",
+        "params": vars(args),
+        "env": environment(),
+        "setup": setup,
+        "results": results,
+        "db_mb": db_mb,
+        "max_rss_mb": maxrss_mb,
+    })
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
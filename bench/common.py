@@ -0,0 +1,76 @@
+# bench/common.py
+"""Shared helpers for the benchmark scripts: percentiles, timing, reporting."""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+
+def percentiles(samples: Iterable[float], ps=(50, 95, 99)) -> Dict[str, float]:
+    arr = np.asarray(list(samples), dtype=float)
+    if arr.size == 0:
+        return {f"p{p}": float("nan") for p in ps}
+    return {f"p{p}": float(np.percentile(arr, p)) for p in ps}
+
+
+def summarize(samples: List[float], wall_s: float | None = None) -> Dict[str, float]:
+    """Count / mean / p50 / p95 / p99 / max (and throughput if wall time given)."""
+    out: Dict[str, float] = {"count": len(samples)}
+    if samples:
+        out["mean"] = float(np.mean(samples))
+        out.update(percentiles(samples))
+        out["max"] = float(np.max(samples))
+    if wall_s:
+        out["throughput_per_s"] = len(samples) / wall_s if wall_s > 0 else float("nan")
+    return out
+
+
+@contextmanager
+def timer(store: List[float]):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        store.append(time.perf_counter() - t0)
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": str(os.cpu_count()),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def fake_embedding(text: str, dim: int = 384) -> np.ndarray:
+    """Deterministic unit vector for benchmarks run without the MiniLM model."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    v = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+    return v / (np.linalg.norm(v) + 1e-9)
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]], unit: str = "ms", scale: float = 1000.0):
+    print(f"\n{title}")
+    print(f"{'stage':<24}{'n':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  ({unit})")
+    for name, s in rows.items():
+        if not s.get("count"):
+            print(f"{name:<24}{0:>7}")
+            continue
+        print(f"{name:<24}{int(s['count']):>7}"
+              + "".join(f"{s.get(k, float('nan')) * scale:>10.1f}" for k in ("mean", "p50", "p95", "p99", "max")))
+
+
+def write_json(path: str | None, payload: dict) -> None:
+    if not path:
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, default=float)
+    print(f"\nWrote {path}")
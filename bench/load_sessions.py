@@ -0,0 +1,398 @@
+# bench/load_sessions.py
+"""
+Concurrent session load test for the Streamlit pages.
+
+Runs N signed-in sessions in one process, as one Streamlit server would. Each
+session is a streamlit.testing.v1.AppTest that starts on Home and then wanders
+between Home, History, Insights and Log a Dream; on Log it sometimes submits
+a dream, which embeds, saves, and queues the LLM analysis. The LLM and STT
+endpoints are the local stub (tools/groq_stub.py), and embeddings are
+deterministic hash vectors unless --real-embeddings is given. Every session
+user starts with --history synthetic dreams (bench.synth).
+
+For each --sessions level it reports:
+  - per-page render time (p50 / p95 / p99 / max), plus "log.submit"
+  - process RSS at start / peak / end of the level
+  - SQLite write statements and how many waited on the write lock (slower
+    than --lock-threshold-ms) plus any "database is locked" errors
+  - page errors (exceptions raised by the page scripts) and, separately,
+    harness errors (AppTest timeouts, crashed sessions)
+
+and names the last level whose page p95s all stay under --slo-ms with no
+errors of either kind. A page run that times out is counted at --timeout, so
+it shows up in the percentiles as the SLO breach it is.
+
+    python -m bench.load_sessions --sessions 1 4 8 16 --steps 12 --history 300 --json load.json
+
+The voice card is rendered but not driven: AppTest cannot record audio, so
+STT load is covered by bench.bench_audio instead.
+"""
+from __future__ import annotations
+import argparse
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES = {
+    "home": "app.py",
+    "history": "pages/2_📊_History.py",
+    "insights": "pages/3_🧭_Insights.py",
+    "log": "pages/1_📘_Log_a_Dream.py",
+}
+# Share of navigation steps that land on each page
+MIX = {"home": 0.2, "history": 0.3, "insights": 0.3, "log": 0.2}
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, nargs="*", default=[1, 4, 8], help="concurrency levels, ascending")
+    ap.add_argument("--steps", type=int, default=10, help="page visits per session after Home")
+    ap.add_argument("--pages", nargs="*", default=list(PAGES), choices=list(PAGES))
+    ap.add_argument("--submit-rate", type=float, default=0.5, help="share of Log visits that submit a dream")
+    ap.add_argument("--history", type=int, default=200, help="synthetic dreams per session user")
+    ap.add_argument("--think-ms", type=float, default=200.0, help="pause between page visits")
+    ap.add_argument("--latency-ms", type=float, default=400.0, help="stub LLM latency")
+    ap.add_argument("--stt-latency-ms", type=float, default=800.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--base-url", default=None, help="use an already-running stub instead of starting one")
+    ap.add_argument("--real-embeddings", action="store_true", help="load MiniLM instead of hash vectors")
+    ap.add_argument("--lock-threshold-ms", type=float, default=50.0,
+                    help="write statements slower than this count as lock waits")
+    ap.add_argument("--slo-ms", type=float, default=2000.0, help="page p95 budget for the capacity verdict")
+    ap.add_argument("--timeout", type=float, default=120.0, help="max seconds for one page run")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", default=None)
+    return ap.parse_args()
+
+
+def _rss_mb() -> float:
+    """Current resident set size (Linux /proc), falling back to peak RSS."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class _RssSampler:
+    def __init__(self, interval_s: float = 0.25):
+        self.interval_s = interval_s
+        self.start = self.peak = self.end = _rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.peak = max(self.peak, _rss_mb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end = _rss_mb()
+        self.peak = max(self.peak, self.end)
+
+    def summary(self) -> Dict[str, float]:
+        return {"start_mb": self.start, "peak_mb": self.peak, "end_mb": self.end,
+                "growth_mb": self.end - self.start}
+
+
+class _WriteLockProbe:
+    """Times write statements on the storage engine; slow ones waited for the lock."""
+
+    _WRITES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+    def __init__(self, engine, threshold_s: float):
+        from sqlalchemy import event
+        self.threshold_s = threshold_s
+        self.lock = threading.Lock()
+        self.reset()
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._error)
+
+    def reset(self):
+        with self.lock:
+            self.samples: List[float] = []
+            self.locked_errors = 0
+
+    def _before(self, conn, cursor, statement, params, context, executemany):
+        conn.info["nm_t0"] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, params, context, executemany):
+        t0 = conn.info.pop("nm_t0", None)
+        if t0 is not None and statement.lstrip().upper().startswith(self._WRITES):
+            with self.lock:
+                self.samples.append(time.perf_counter() - t0)
+
+    def _error(self, ctx):
+        if "locked" in str(ctx.original_exception).lower():
+            with self.lock:
+                self.locked_errors += 1
+
+    def summary(self) -> Dict[str, float]:
+        from bench.common import summarize
+        with self.lock:
+            waits = [s for s in self.samples if s >= self.threshold_s]
+            return {"writes": summarize(self.samples), "lock_waits": len(waits),
+                    "lock_wait_total_s": sum(waits), "locked_errors": self.locked_errors}
+
+
+def _isolate_apptest_runtimes():
+    """
+    AppTest keeps each run's mock Runtime (media files, widget registry,
+    component registry) in the class attribute Runtime._instance and patches
+    config.get_option for the run; both are process-global, so concurrent
+    sessions would read each other's runtime and one run ending would undo
+    another's config patch. Instead bind the runtime a run creates to the
+    thread driving it and to the run's script thread (and any thread the page
+    starts with its script context), resolve Runtime.instance() from there,
+    and hold the config patch while any run is in flight.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    local = threading.local()
+    lock = threading.Lock()
+    by_ctx: Dict[int, tuple] = {}  # id(ScriptRunContext) -> (ctx, runtime)
+    last: Dict[str, object] = {}   # for threads outside any run (the analysis worker)
+
+    def mock(*a, **kw):
+        m = app_test_mock(*a, **kw)
+        if kw.get("spec") is Runtime:
+            local.runtime = last["runtime"] = m
+        return m
+    app_test_mock = app_test.MagicMock
+    app_test.MagicMock = mock
+
+    runner = local_script_runner.LocalScriptRunner
+    runner_init, runner_thread = runner.__init__, runner._run_script_thread
+
+    def init(self, *a, **kw):
+        runner_init(self, *a, **kw)
+        self._nm_runtime = getattr(local, "runtime", None)
+
+    def script_thread(self):
+        local.runtime = self._nm_runtime
+        try:
+            runner_thread(self)
+        finally:
+            with lock:
+                for k in [k for k, (_, rt) in by_ctx.items() if rt is self._nm_runtime]:
+                    del by_ctx[k]
+    runner.__init__, runner._run_script_thread = init, script_thread
+
+    def resolve():
+        rt = getattr(local, "runtime", None)
+        ctx = get_script_run_ctx(suppress_warning=True)
+        with lock:
+            if ctx is not None:
+                if rt is not None:
+                    by_ctx.setdefault(id(ctx), (ctx, rt))
+                else:
+                    rt = by_ctx.get(id(ctx), (None, None))[1]
+            return rt if rt is not None else last.get("runtime")
+
+    def instance(cls):
+        rt = resolve()
+        if rt is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return rt
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: resolve() is not None)
+
+    patch_config = app_test.patch_config_options
+    held = {"n": 0, "cm": None}
+
+    @contextmanager
+    def shared_patch(overrides):
+        with lock:
+            if held["n"] == 0:
+                held["cm"] = patch_config(overrides)
+                held["cm"].__enter__()
+            held["n"] += 1
+        try:
+            yield
+        finally:
+            with lock:
+                held["n"] -= 1
+                if held["n"] == 0:
+                    held["cm"].__exit__(None, None, None)
+    app_test.patch_config_options = shared_patch
+
+
+def _session(sid: int, email: str, args, record, page_errors: List[str], harness_errors: List[str]):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(args.seed * 1000 + sid)
+    pages = list(args.pages)
+    weights = [MIX[p] for p in pages]
+    at = AppTest.from_file(str(ROOT / PAGES["home"]), default_timeout=args.timeout)
+    at.session_state["auth_user"] = {"email": email, "name": f"Load {sid}"}
+
+    def visit(page: str, label: str, action=None):
+        t0 = time.perf_counter()
+        try:
+            if action:
+                action()
+            else:
+                at.switch_page(PAGES[page])
+            at.run()
+        except Exception as e:  # AppTest timeouts / failures driving the widgets
+            harness_errors.append(f"{label}: {type(e).__name__}: {e}")
+            record(label, max(time.perf_counter() - t0, args.timeout))
+            return
+        record(label, time.perf_counter() - t0)
+        for exc in at.exception:
+            page_errors.append(f"{label}: {exc.message}")
+
+    visit("home", "home")
+    for step in range(args.steps):
+        time.sleep(args.think_ms / 1000.0 * rng.uniform(0.5, 1.5))
+        page = rng.choices(pages, weights)[0]
+        visit(page, page)
+        if page == "log" and rng.random() < args.submit_rate and len(at.text_area):
+            def submit():
+                at.text_area[0].input(
+                    f"Session {sid}, step {step}: I was back at school, the corridor flooded "
+                    f"and someone was chasing me up the stairs."
+                )
+                next(b for b in at.button if b.label == "Analyze & Save").click()
+            visit("log", "log.submit", submit)
+
+
+def _run_session(sid: int, email: str, args, record, page_errors: List[str],
+                 harness_errors: List[str], finished: List[int]):
+    try:
+        _session(sid, email, args, record, page_errors, harness_errors)
+        finished.append(sid)
+    except BaseException as e:
+        harness_errors.append(f"session {sid}: {type(e).__name__}: {e}")
+
+
+def main():
+    args = _parse_args()
+
+    # The modules read their config at import time, so set it up first.
+    scratch = tempfile.mkdtemp(prefix="noctimind-load-")
+    os.environ["NOCTIMIND_DB"] = os.path.join(scratch, "noctimind.db")
+    os.environ["NOCTIMIND_AUTH_DB"] = os.path.join(scratch, "auth.db")
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.chdir(ROOT)  # pages resolve components / assets relative to the project root
+
+    from tools.groq_stub import StubConfig, start_in_thread
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server, base_url = start_in_thread(StubConfig(
+            latency_ms=args.latency_ms, stt_latency_ms=args.stt_latency_ms,
+            error_rate=args.error_rate, rate_429=args.rate_429,
+        ))
+    os.environ["GROQ_BASE_URL"] = base_url
+
+    from bench.common import summarize, print_table, write_json, environment, fake_embedding
+    from bench.synth import populate
+    from modules import storage, telemetry
+
+    if not args.real_embeddings and "log" in args.pages:
+        import modules.nlp
+        modules.nlp.get_embedding = fake_embedding  # the Log page imports it by name on every run
+
+    n_users = max(args.sessions)
+    emails = [f"load{i}@example.com" for i in range(n_users)]
+    if args.history:
+        populate({e: args.history for e in emails}, args.seed, embedding_dim=384)
+    probe = _WriteLockProbe(storage._engine, args.lock_threshold_ms / 1000.0)
+    _isolate_apptest_runtimes()
+    # Seeding a session's state happens outside a script run; Streamlit warns each time
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+    levels: Dict[str, dict] = {}
+    capacity = None
+    degraded = False
+    for n in args.sessions:
+        samples: Dict[str, List[float]] = defaultdict(list)
+        page_errors: List[str] = []
+        harness_errors: List[str] = []
+        finished: List[int] = []
+        lock = threading.Lock()
+
+        def record(label: str, dt: float):
+            with lock:
+                samples[label].append(dt)
+
+        probe.reset()
+        telemetry.reset()
+        with _RssSampler() as rss:
+            t0 = time.perf_counter()
+            threads = [threading.Thread(target=_run_session, daemon=True,
+                                        args=(i, emails[i], args, record, page_errors, harness_errors, finished))
+                       for i in range(n)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - t0
+
+        pages = {label: summarize(s) for label, s in sorted(samples.items())}
+        print_table(f"{n} concurrent session(s) — page render time", pages)
+        db = probe.summary()
+        print(f"wall {wall:.1f}s · {sum(len(s) for s in samples.values()) / wall:.1f} page runs/s · "
+              f"RSS {rss.start:.0f} → {rss.end:.0f} MB (peak {rss.peak:.0f}) · "
+              f"{db['writes']['count']} writes, {db['lock_waits']} waited ≥{args.lock_threshold_ms:.0f} ms "
+              f"({db['lock_wait_total_s']:.2f}s), {db['locked_errors']} locked errors · "
+              f"{len(finished)}/{n} sessions finished · "
+              f"{len(page_errors)} page errors, {len(harness_errors)} harness errors")
+        for e in page_errors[:5]:
+            print(f"  ! page: {e}")
+        for e in harness_errors[:5]:
+            print(f"  ? harness: {e}")
+
+        # A level only counts if every session ran to the end and was measured
+        ok = bool(pages) and all(
+            s.get("p95", 0) * 1000 <= args.slo_ms for label, s in pages.items() if label != "log.submit"
+        )
+        complete = len(finished) == n and not harness_errors
+        degraded = degraded or not ok or not complete or bool(page_errors)
+        if not degraded:
+            capacity = n
+        levels[str(n)] = {
+            "wall_s": wall, "pages": pages, "rss": rss.summary(), "db": db,
+            "sessions_finished": len(finished), "page_errors": page_errors,
+            "harness_errors": harness_errors, "within_slo": ok,
+            "spans": telemetry.snapshot()["spans"],
+        }
+
+    verdict = (f"{capacity} concurrent session(s)" if capacity is not None else "none of the tested levels")
+    print(f"\nPage p95 under {args.slo_ms:.0f} ms (excluding log.submit) with every session completing cleanly up to: {verdict}")
+
+    write_json(args.json, {
+        "benchmark": "load_sessions",
+        "params": vars(args),
+        "env": environment(),
+        "stub": base_url,
+        "levels": levels,
+        "capacity_sessions": capacity,
+    })
+    if server is not None:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+# bench/synth.py
+"""
+Deterministic synthetic dream generator for benchmarks.
+
+Fills a scratch database with dreams for many users: free text with a
+Zipf-like vocabulary, emotion mixes that lean negative after short sleep,
+motifs drawn from co-occurring themes, sticky archetype sequences, tags,
+sleep hours / quality, timestamps spread over several years and (optional)
+unit-norm float32 embeddings. The same --seed always gives the same rows.
+
+Rows are written in bulk straight into `dreams` and the motif / tag link
+tables. Per-user aggregates (word counts, user / regression stats, motif
+graph, archetypes) are left unbuilt, exactly like a user who predates them:
+storage builds them on first read, which is what the "first" timings in
+bench.bench_storage measure.
+
+    python -m bench.synth --db /tmp/noctimind-synth.db --dreams 100000 --users 50
+
+A million dreams with 384-d embeddings is ~1.6 GB on disk; pass
+--embedding-dim 0 to leave embeddings NULL.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Sequence
+
+import numpy as np
+
+EMOTIONS = ("joy", "sadness", "fear", "anger", "disgust", "surprise", "neutral")
+_NEG = [1, 2, 3, 4]
+
+# Motifs grouped by theme; a dream mostly draws from one theme, so the
+# co-occurrence graph has real communities.
+MOTIF_THEMES: Dict[str, Sequence[str]] = {
+    "water": ("ocean", "flood", "swimming", "drowning", "rain", "boat", "rising water"),
+    "pursuit": ("being chased", "running", "hiding", "monster", "stranger", "dark forest"),
+    "school": ("exam", "classroom", "teacher", "being late", "forgotten homework", "old friends"),
+    "flight": ("flying", "falling", "cliff", "sky", "airplane", "stairs"),
+    "home": ("childhood home", "family", "locked door", "hallway", "basement", "hidden room"),
+    "loss": ("teeth falling out", "lost phone", "missing train", "empty street", "wallet", "wrong city"),
+    "animals": ("dog", "snake", "spider", "wolf", "bird", "cat"),
+    "self": ("mirror", "mask", "changing body", "being naked", "twin", "voice"),
+}
+ARCHETYPES = ("shadow", "hero", "anima", "animus", "trickster", "wise old man",
+              "great mother", "child", "persona", "self")
+TAGS = ("work", "travel", "stress", "family", "exercise", "caffeine", "alcohol", "late night",
+        "meditation", "lucid", "nightmare", "recurring", "vivid", "sick", "holiday")
+
+_WORDS = (
+    "house door room night light dark water street car city school forest road window stairs "
+    "friend mother father sister brother teacher stranger child dog voice face hand eyes phone "
+    "walk run fall fly swim hide open close look find lose call wait climb follow remember "
+    "strange old empty quiet loud bright cold warm huge tiny broken familiar endless sudden "
+    "sky sea river bridge train station party kitchen garden hallway ceiling floor wall mirror "
+    "key letter bag money clock exam test class bus airport hotel hospital church beach field "
+    "storm rain snow fire smoke wind moon sun star cloud shadow corner tunnel elevator basement"
+).split()
+# Mixed in so the stopword handling has work to do
+_FILLERS = "i the and was a to in of it my we then there were but so on at with that".split()
+_SYLLABLES = "ka lo mi ren tus va dor eli fen gra hul ix jor kel mun nox pra quel sif tor ul ve wyn zar".split()
+
+END = datetime(2026, 1, 1)
+
+
+def _vocabulary(size: int, rng: np.random.Generator) -> np.ndarray:
+    """Real dream words first (most frequent), then a long tail of pseudo-words."""
+    words = list(dict.fromkeys(_WORDS))
+    seen = set(words)
+    while len(words) < size:
+        w = "".join(rng.choice(_SYLLABLES, size=int(rng.integers(2, 4))))
+        if w not in seen:
+            seen.add(w)
+            words.append(w)
+    return np.array(words[:size], dtype=object)
+
+
+def _zipf_p(n: int, s: float = 1.1, q: float = 2.7) -> np.ndarray:
+    p = 1.0 / (np.arange(n) + q) ** s
+    return p / p.sum()
+
+
+def split_counts(n_dreams: int, n_users: int, seed: int = 0, skew: float = 0.8) -> List[int]:
+    """Dreams per user: a few heavy journalers and a long tail, summing to n_dreams."""
+    if n_users <= 0:
+        return []
+    rng = np.random.default_rng(seed)
+    p = 1.0 / (np.arange(n_users) + 1.0) ** skew
+    return [int(c) for c in rng.multinomial(n_dreams, p / p.sum())]
+
+
+def generate(
+    user_email: str,
+    n: int,
+    seed: int = 0,
+    vocab_size: int = 3000,
+    embedding_dim: int = 384,
+    years: float = 5.0,
+    batch_size: int = 5000,
+) -> Iterator[List[dict]]:
+    """
+    Yield batches of dream dicts for one user (oldest first) with the columns
+    of storage.insert_dream plus created_at / top_emotion. Deterministic in
+    (user_email, n, seed, ...).
+    """
+    user_seed = int.from_bytes(user_email.encode("utf-8")[:16].ljust(16, b"\0"), "little") % (2**32)
+    rng = np.random.default_rng([seed, user_seed])
+    vocab = _vocabulary(vocab_size, np.random.default_rng(seed))
+    word_p = _zipf_p(len(vocab))
+    themes = list(MOTIF_THEMES.values())
+
+    # Per-user temperament: emotion baseline, favourite themes / archetypes / tags
+    emo_base = rng.dirichlet(np.full(len(EMOTIONS), 2.0)) * 10
+    theme_p = rng.dirichlet(np.full(len(themes), 0.7))
+    arch_p = rng.dirichlet(np.full(len(ARCHETYPES), 0.8))
+    tag_p = rng.dirichlet(np.full(len(TAGS), 0.5))
+    sleep_mu = rng.normal(7.0, 0.6)
+
+    span_s = years * 365 * 86400
+    offsets = np.sort(rng.uniform(0, span_s, size=n))
+    start = END - timedelta(seconds=span_s)
+    last_arch = None
+
+    for lo in range(0, n, batch_size):
+        b = min(batch_size, n - lo)
+        lengths = rng.integers(30, 140, size=b)
+        words = rng.choice(vocab, size=int(lengths.sum()), p=word_p)
+        fillers = rng.choice(_FILLERS, size=int(lengths.sum()))
+        use_filler = rng.random(int(lengths.sum())) < 0.3
+        tokens = np.where(use_filler, fillers, words).tolist()
+
+        hours = np.clip(rng.normal(sleep_mu, 1.2, size=b), 3.0, 11.0).round(1)
+        has_hours = rng.random(b) > 0.1
+        quality = np.clip(np.round(3 + (hours - 7) * 0.6 + rng.normal(0, 0.8, size=b)), 1, 5)
+        has_quality = rng.random(b) > 0.1
+
+        alpha = np.tile(emo_base, (b, 1)) + 0.2
+        short = np.where(has_hours, np.clip(7.0 - hours, 0, None), 0.0)
+        alpha[:, _NEG] *= (1.0 + 0.25 * short)[:, None]
+        g = rng.gamma(alpha)  # row-wise Dirichlet(alpha)
+        emos = np.round(g / g.sum(axis=1, keepdims=True) * 100, 1).tolist()
+
+        if embedding_dim:
+            emb = rng.standard_normal((b, embedding_dim), dtype=np.float32)
+            emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-9
+
+        # Motifs: 1-4 from the dream's theme (random order), sometimes one stray
+        theme_idx = rng.choice(len(themes), size=b, p=theme_p)
+        n_motifs = rng.integers(1, 5, size=b)
+        order = rng.random((b, max(len(t) for t in themes))).argsort(axis=1)
+        stray = np.where(rng.random(b) < 0.2, rng.integers(len(themes), size=b), -1)
+        stray_pick = rng.integers(0, 1 << 30, size=b)
+        mention_at = rng.random((b, 2))
+        # Archetypes: sticky sequence; tags: 0-2 weighted picks (Gumbel top-k)
+        stay = rng.random(b) < 0.35
+        arch_draw = rng.choice(len(ARCHETYPES), size=b, p=arch_p)
+        n_tags = rng.choice(3, size=b, p=(0.5, 0.35, 0.15))
+        tag_order = np.argsort(-(np.log(tag_p) + rng.gumbel(size=(b, len(TAGS)))), axis=1)
+
+        batch = []
+        pos = 0
+        for i in range(b):
+            text_tokens = tokens[pos:pos + lengths[i]]
+            pos += lengths[i]
+
+            theme = themes[theme_idx[i]]
+            motifs = [theme[j] for j in order[i] if j < len(theme)][:n_motifs[i]]
+            if stray[i] >= 0:
+                other = themes[stray[i]]
+                motifs.append(other[stray_pick[i] % len(other)])
+            motifs = list(dict.fromkeys(motifs))
+            # Mention a motif or two in the text, as people do
+            for m, at in zip(motifs[:2], mention_at[i]):
+                text_tokens.insert(int(at * (len(text_tokens) + 1)), m)
+            sentences = [" ".join(text_tokens[j:j + 12]) for j in range(0, len(text_tokens), 12)]
+            text = ". ".join(s[:1].upper() + s[1:] for s in sentences) + "."
+
+            arch = last_arch if last_arch is not None and stay[i] else ARCHETYPES[arch_draw[i]]
+            last_arch = arch
+            tags = ", ".join(TAGS[j] for j in tag_order[i][:n_tags[i]])
+
+            emotions = dict(zip(EMOTIONS, emos[i]))
+            created = start + timedelta(seconds=float(offsets[lo + i]))
+            batch.append(dict(
+                created_at=created.isoformat(timespec="seconds"),
+                user_email=user_email,
+                text=text,
+                tags=tags or None,
+                sleep_hours=float(hours[i]) if has_hours[i] else None,
+                sleep_quality=int(quality[i]) if has_quality[i] else None,
+                motifs=motifs,
+                archetype=arch,
+                reframed=f"A {arch} dream about {motifs[0]}.",
+                emotions=emotions,
+                top_emotion=max(emotions, key=emotions.get),
+                embedding=emb[i].tobytes() if embedding_dim else None,
+            ))
+        yield batch
+
+
+def populate(
+    users: Dict[str, int],
+    seed: int = 0,
+    vocab_size: int = 3000,
+    embedding_dim: int = 384,
+    years: float = 5.0,
+    batch_size: int = 5000,
+    progress: bool = False,
+) -> Dict[str, float]:
+    """
+    Write `{email: n_dreams}` into the database modules.storage points at
+    (NOCTIMIND_DB). Users must not have dreams yet. Returns row count and timing.
+    """
+    from sqlalchemy import text as sa_text
+    from modules.storage import _engine
+    from modules.labels import normalize_label, normalize_labels, split_tags
+
+    emails = [e.strip().lower() for e in users]
+    with _engine.begin() as conn:
+        for e in emails:
+            if conn.execute(sa_text("SELECT 1 FROM dreams WHERE user_email = :e LIMIT 1"), dict(e=e)).first():
+                raise ValueError(f"{e} already has dreams; synthetic users must be new")
+        all_motifs = [normalize_label(m) for ms in MOTIF_THEMES.values() for m in ms]
+        conn.execute(sa_text("INSERT OR IGNORE INTO motifs (name) VALUES (:name)"), [dict(name=m) for m in all_motifs])
+        conn.execute(sa_text("INSERT OR IGNORE INTO tags (name) VALUES (:name)"),
+                     [dict(name=normalize_label(t)) for t in TAGS])
+        motif_ids = dict(conn.execute(sa_text("SELECT name, id FROM motifs")).all())
+        tag_ids = dict(conn.execute(sa_text("SELECT name, id FROM tags")).all())
+
+    # exec_driver_sql hands the batch straight to sqlite3's executemany
+    insert = """
+        INSERT INTO dreams (
+            created_at, user_email, text, tags, sleep_hours, sleep_quality,
+            motifs, archetype, reframed, emotions, embedding, analysis_status, top_emotion
+        )
+        VALUES (
+            :created_at, :user_email, :text, :tags, :sleep_hours, :sleep_quality,
+            :motifs, :archetype, :reframed, :emotions, :embedding, 'done', :top_emotion
+        )
+    """
+    total = sum(users.values())
+    written = 0
+    t0 = time.perf_counter()
+    for email, n in zip(emails, users.values()):
+        for batch in generate(email, n, seed, vocab_size, embedding_dim, years, batch_size):
+            rows = [dict(r, motifs=json.dumps(r["motifs"]), emotions=json.dumps(r["emotions"])) for r in batch]
+            with _engine.begin() as conn:
+                conn.exec_driver_sql(insert, rows)
+                # The user is new and this transaction holds the write lock, so
+                # their newest len(batch) ids are exactly this batch, in order.
+                ids = conn.execute(
+                    sa_text("SELECT id FROM dreams WHERE user_email = :e ORDER BY id DESC LIMIT :n"),
+                    dict(e=email, n=len(batch))
+                ).scalars().all()[::-1]
+                motif_links, tag_links = [], []
+                for did, r in zip(ids, batch):
+                    motif_links += [(did, motif_ids[m], email) for m in normalize_labels(r["motifs"])]
+                    tag_links += [(did, tag_ids[t], email) for t in split_tags(r["tags"])]
+                if motif_links:
+                    conn.exec_driver_sql(
+                        "INSERT OR IGNORE INTO dream_motifs (dream_id, motif_id, user_email) VALUES (?, ?, ?)",
+                        motif_links
+                    )
+                if tag_links:
+                    conn.exec_driver_sql(
+                        "INSERT OR IGNORE INTO dream_tags (dream_id, tag_id, user_email) VALUES (?, ?, ?)",
+                        tag_links
+                    )
+            written += len(batch)
+            if progress:
+                el = time.perf_counter() - t0
+                print(f"\r{written:>10,}/{total:,} dreams  {written / max(el, 1e-9):,.0f}/s", end="", flush=True)
+    if progress:
+        print()
+    wall = time.perf_counter() - t0
+    return {"dreams": written, "users": len(emails), "wall_s": wall,
+            "rows_per_s": written / wall if wall > 0 else float("nan")}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", default=None, help="database to fill (default: new scratch file)")
+    ap.add_argument("--dreams", type=int, default=10000, help="total dreams across all users")
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--prefix", default="synth", help="user emails are <prefix><i>@example.com")
+    ap.add_argument("--skew", type=float, default=0.8, help="Zipf exponent of dreams per user (0 = even)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--vocab", type=int, default=3000)
+    ap.add_argument("--embedding-dim", type=int, default=384, help="0 leaves embeddings NULL")
+    ap.add_argument("--years", type=float, default=5.0, help="history span per user")
+    args = ap.parse_args()
+
+    os.environ["NOCTIMIND_DB"] = args.db or os.path.join(tempfile.mkdtemp(prefix="noctimind-synth-"), "noctimind.db")
+    counts = split_counts(args.dreams, args.users, args.seed, args.skew)
+    users = {f"{args.prefix}{i}@example.com": c for i, c in enumerate(counts) if c}
+    res = populate(users, args.seed, args.vocab, args.embedding_dim, args.years, progress=True)
+    size_mb = os.path.getsize(os.environ["NOCTIMIND_DB"]) / 2**20
+    print(f"wrote {res['dreams']:,} dreams for {res['users']} users to {os.environ['NOCTIMIND_DB']} "
+          f"in {res['wall_s']:.1f}s ({res['rows_per_s']:,.0f}/s, {size_mb:,.0f} MB); "
+          f"heaviest user {max(counts):,} dreams")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
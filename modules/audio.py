@@ -0,0 +1,155 @@
+# modules/audio.py
+from __future__ import annotations
+import io
+import os
+from math import gcd
+from pathlib import PurePath
+from typing import Tuple
+
+import numpy as np
+import soundfile as sf
+
+# Whisper works on 16 kHz mono internally, so browser recordings (44.1/48 kHz
+# stereo PCM WAV) are mostly wasted bytes on the upload. Decode, downmix,
+# resample and re-encode before sending to STT; anything soundfile can't
+# decode (m4a, webm) is passed through unchanged.
+
+TARGET_SR = 16_000
+_CODECS = {
+    # codec -> (soundfile format, subtype, file extension)
+    "flac": ("FLAC", "PCM_16", ".flac"),
+    "opus": ("OGG", "OPUS", ".ogg"),
+}
+
+def _max_upload_bytes() -> int:
+    return int(float(os.environ.get("STT_MAX_UPLOAD_MB", "24")) * 1024 * 1024)
+
+def _default_codec() -> str:
+    codec = os.environ.get("STT_AUDIO_CODEC", "flac").lower()
+    return codec if codec in _CODECS else "flac"
+
+class AudioTooLarge(ValueError):
+    """Even after compression the audio is over the STT upload cap."""
+
+def decode_audio(audio_bytes: bytes) -> Tuple[np.ndarray, int]:
+    """Decode to float32 samples shaped (frames,) or (frames, channels)."""
+    data, sr = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=False)
+    return data, int(sr)
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    if samples.ndim == 1:
+        return samples
+    return samples.mean(axis=1, dtype=np.float32)
+
+def resample(samples: np.ndarray, sr: int, target_sr: int = TARGET_SR) -> np.ndarray:
+    """Polyphase resampling (anti-aliased) via scipy."""
+    if sr == target_sr or samples.size == 0:
+        return samples.astype(np.float32, copy=False)
+    from scipy.signal import resample_poly
+    g = gcd(int(sr), int(target_sr))
+    return resample_poly(samples, target_sr // g, sr // g).astype(np.float32)
+
+def encode_audio(samples: np.ndarray, sr: int, codec: str = "flac") -> bytes:
+    fmt, subtype, _ = _CODECS[codec]
+    buf = io.BytesIO()
+    sf.write(buf, np.clip(samples, -1.0, 1.0), sr, format=fmt, subtype=subtype)
+    return buf.getvalue()
+
+def prepare_for_stt(audio_bytes: bytes, filename: str = "audio.wav",
+                    codec: str | None = None, max_bytes: int | None = None) -> Tuple[bytes, str]:
+    """
+    Return (bytes, filename) ready for upload: mono, 16 kHz, FLAC (or Opus).
+    Falls back to Opus when FLAC is over `max_bytes`; raises AudioTooLarge if
+    nothing fits. Undecodable input is returned as-is.
+    """
+    codec = codec or _default_codec()
+    max_bytes = _max_upload_bytes() if max_bytes is None else max_bytes
+    try:
+        samples, sr = decode_audio(audio_bytes)
+    except (sf.LibsndfileError, RuntimeError, TypeError, ValueError):
+        if len(audio_bytes) > max_bytes:
+            raise AudioTooLarge(f"Audio is {len(audio_bytes) / 1e6:.1f} MB; the upload limit is {max_bytes / 1e6:.1f} MB.")
+        return audio_bytes, filename
+
+    mono = resample(to_mono(samples), sr, TARGET_SR)
+    stem = PurePath(filename or "audio").stem or "audio"
+    order = [codec] + [c for c in ("flac", "opus") if c != codec]
+    for c in order:
+        out = encode_audio(mono, TARGET_SR, c)
+        if len(out) <= max_bytes:
+            if len(out) >= len(audio_bytes):
+                # Already compact (e.g. a low-bitrate mp3); keep the original.
+                return audio_bytes, filename
+            return out, stem + _CODECS[c][2]
+    if len(audio_bytes) <= max_bytes:
+        return audio_bytes, filename
+    raise AudioTooLarge(
+        f"Audio is still {len(out) / 1e6:.1f} MB after compression; the upload limit is {max_bytes / 1e6:.1f} MB."
+    )
+
+# ---------- Silence-based chunking ----------
+# Long voice notes are cut at pauses into bounded chunks that can be
+# transcribed in parallel. Each chunk after the first starts `overlap_s`
+# early so words at the cut aren't lost; speech.stitch_transcripts drops
+# the duplicated words when the pieces are joined.
+
+def frame_energy(samples: np.ndarray, sr: int, frame_ms: float = 30.0) -> Tuple[np.ndarray, int]:
+    """RMS energy per non-overlapping frame. Returns (energies, frame_len)."""
+    frame = max(int(sr * frame_ms / 1000.0), 1)
+    n = samples.size // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32), frame
+    x = samples[: n * frame].reshape(n, frame)
+    return np.sqrt(np.mean(x * x, axis=1)), frame
+
+def split_on_silence(samples: np.ndarray, sr: int, max_chunk_s: float = 30.0,
+                     min_chunk_s: float = 10.0, overlap_s: float = 1.0,
+                     frame_ms: float = 30.0) -> list[Tuple[int, int]]:
+    """
+    Energy-based VAD chunking. Returns [(start, end)] sample ranges, each at most
+    `max_chunk_s` (+ overlap) long, cut at the quietest stretch between
+    `min_chunk_s` and `max_chunk_s` into the chunk.
+    """
+    total = samples.size
+    if total <= int(max_chunk_s * sr):
+        return [(0, total)]
+    energy, frame = frame_energy(samples, sr, frame_ms)
+    # Smooth over ~300 ms so a cut lands inside a pause, not between syllables.
+    k = max(int(300 / frame_ms), 1)
+    smooth = np.convolve(energy, np.ones(k) / k, mode="same")
+    # Silence threshold: a bit above the noise floor of the recording.
+    floor = np.percentile(smooth, 10)
+    speech = np.percentile(smooth, 90)
+    threshold = floor + 0.15 * max(speech - floor, 1e-6)
+
+    cuts = [0]
+    start_f = 0
+    n_frames = smooth.size
+    max_f = int(max_chunk_s * 1000 / frame_ms)
+    min_f = max(min(int(min_chunk_s * 1000 / frame_ms), max_f // 2), 1)
+    while n_frames - start_f > max_f:
+        lo, hi = start_f + min_f, min(start_f + max_f, n_frames)
+        window = smooth[lo:hi]
+        quiet = np.flatnonzero(window < threshold)
+        # Prefer the latest quiet frame (longest chunk); else the quietest frame.
+        cut = lo + (int(quiet[-1]) if quiet.size else int(np.argmin(window)))
+        cuts.append(cut)
+        start_f = cut
+    bounds = [c * frame for c in cuts] + [total]
+    ov = int(overlap_s * sr)
+    return [(max(bounds[i] - (ov if i else 0), 0), bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+def chunk_for_stt(audio_bytes: bytes, max_chunk_s: float = 30.0, overlap_s: float = 1.0,
+                  codec: str | None = None) -> list[bytes] | None:
+    """
+    Decode, downmix and resample once, then split on silence and encode each
+    chunk. Returns None when the audio can't be decoded (caller sends it whole).
+    """
+    try:
+        samples, sr = decode_audio(audio_bytes)
+    except (sf.LibsndfileError, RuntimeError, TypeError, ValueError):
+        return None
+    mono = resample(to_mono(samples), sr, TARGET_SR)
+    ranges = split_on_silence(mono, TARGET_SR, max_chunk_s=max_chunk_s, overlap_s=overlap_s)
+    codec = codec or _default_codec()
+    return [encode_audio(mono[a:b], TARGET_SR, codec) for a, b in ranges]
@@ -1,10 +1,12 @@
 # modules/auth.py
 from __future__ import annotations
-import re, os, sqlite3, hashlib, hmac, secrets, time
+import re, os, sqlite3, hashlib, hmac, secrets, time, queue, atexit, threading, ipaddress
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 import streamlit as st
 
-DB_PATH = Path("data/auth.db")
+DB_PATH = Path(os.environ.get("NOCTIMIND_AUTH_DB", "data/auth.db"))
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 # Email: simple regex
@@ -13,19 +15,92 @@ EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 PASS_RE = re.compile(r"^[A-Za-z0-9]{8,}$")
 
 # ---------- DB ----------
-def _conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            email TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            password_hash BLOB NOT NULL,
-            salt BLOB NOT NULL,
-            created_at REAL NOT NULL
-        )
-    """)
-    conn.commit()
-    return conn
+# A small fixed pool of connections shared by all sessions. Schema setup runs
+# once when the pool is created; each call borrows a connection and returns it,
+# so login bursts neither open new file handles nor redo DDL. SQL strings are
+# module constants so sqlite3's per-connection statement cache reuses the
+# prepared statements.
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        email TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        password_hash BLOB NOT NULL,
+        salt BLOB NOT NULL,
+        created_at REAL NOT NULL
+    )
+"""
+_SQL_GET_USER = "SELECT email, name, password_hash, salt, hash_alg, iterations FROM users WHERE email = ?"
+_SQL_INSERT_USER = (
+    "INSERT INTO users (email, name, password_hash, salt, created_at, hash_alg, iterations) "
+    "VALUES (?,?,?,?,?,?,?)"
+)
+_SQL_UPDATE_HASH = "UPDATE users SET password_hash = ?, salt = ?, hash_alg = ?, iterations = ? WHERE email = ?"
+
+class AuthDB:
+    def __init__(self, path: Path, size: int = 4):
+        self.path = path
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._all: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        for _ in range(max(int(size), 1)):
+            conn = sqlite3.connect(path, check_same_thread=False, timeout=30, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._all.append(conn)
+            self._pool.put(conn)
+        with self.connection() as conn:
+            conn.execute(_SCHEMA)
+            # Hash parameters per user (NULL on rows created before they were stored)
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(users)").fetchall()}
+            if "hash_alg" not in cols:
+                conn.execute("ALTER TABLE users ADD COLUMN hash_alg TEXT")
+            if "iterations" not in cols:
+                conn.execute("ALTER TABLE users ADD COLUMN iterations INTEGER")
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success, rolls back on error, always returns it."""
+        conn = self._pool.get()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._all:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._all.clear()
+
+    # DAO
+    def get_user(self, email: str):
+        with self.connection() as conn:
+            return conn.execute(_SQL_GET_USER, (email,)).fetchone()
+
+    def insert_user(self, email: str, name: str, pwhash: bytes, salt: bytes,
+                    alg: str, iterations: int) -> bool:
+        """Insert a user; False if the email is already taken."""
+        try:
+            with self.connection() as conn:
+                conn.execute(_SQL_INSERT_USER, (email, name, pwhash, salt, time.time(), alg, iterations))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def update_hash(self, email: str, pwhash: bytes, salt: bytes, alg: str, iterations: int) -> None:
+        with self.connection() as conn:
+            conn.execute(_SQL_UPDATE_HASH, (pwhash, salt, alg, iterations, email))
+
+_db = AuthDB(DB_PATH, size=int(os.environ.get("NOCTIMIND_AUTH_POOL", "4")))
+atexit.register(_db.close)
 
 # ---------- Validation ----------
 def validate_email(email: str) -> bool:
@@ -56,12 +131,132 @@ def password_strength(password: str) -> tuple[int, str]:
     return score, label
 
 # ---------- Password Hash ----------
-def _hash_password(password: str, salt: bytes | None = None) -> tuple[bytes, bytes]:
+# Cost parameters for new hashes. Users hashed with older parameters are
+# transparently rehashed on their next successful sign-in.
+HASH_ALG = "pbkdf2_sha256"
+HASH_ITERATIONS = int(os.environ.get("AUTH_PBKDF2_ITERATIONS", "120000"))
+_LEGACY_ALG, _LEGACY_ITERATIONS = "pbkdf2_sha256", 120_000  # rows without stored params
+
+_HASH_DIGESTS = {"pbkdf2_sha256": "sha256", "pbkdf2_sha512": "sha512"}
+
+def _hash_password(password: str, salt: bytes | None = None,
+                   iterations: int | None = None, alg: str = HASH_ALG) -> tuple[bytes, bytes]:
     if salt is None:
         salt = secrets.token_bytes(16)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, 120_000, dklen=32)
+    digest = _HASH_DIGESTS[alg]
+    dk = hashlib.pbkdf2_hmac(digest, password.encode("utf-8"), salt, iterations or HASH_ITERATIONS, dklen=32)
     return dk, salt
 
+# PBKDF2 is deliberately slow (~100 ms). Run it on a small worker pool (hashlib
+# releases the GIL, so this is real parallelism) with a cap on queued + running
+# hashes: a burst of logins waits its turn or is told to retry, instead of
+# pinning every server thread.
+_HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+_HASH_MAX_PENDING = int(os.environ.get("AUTH_HASH_MAX_PENDING", str(_HASH_WORKERS * 8)))
+_HASH_WAIT_S = float(os.environ.get("AUTH_HASH_WAIT_S", "5"))
+_hash_pool = ThreadPoolExecutor(max_workers=_HASH_WORKERS, thread_name_prefix="pbkdf2")
+_hash_slots = threading.BoundedSemaphore(_HASH_MAX_PENDING)
+atexit.register(_hash_pool.shutdown, wait=False)
+
+class AuthBusy(RuntimeError):
+    """Too many password hashes already queued."""
+
+def _hash_offloaded(password: str, salt: bytes | None = None,
+                    iterations: int | None = None, alg: str = HASH_ALG) -> tuple[bytes, bytes]:
+    if not _hash_slots.acquire(timeout=_HASH_WAIT_S):
+        raise AuthBusy("Sign-in is busy right now, please try again in a few seconds.")
+    try:
+        return _hash_pool.submit(_hash_password, password, salt, iterations, alg).result()
+    finally:
+        _hash_slots.release()
+
+# ---------- Attempt Throttling ----------
+class _Throttle:
+    """
+    Failed-attempt counter per key with exponential lockout: the first `free`
+    failures are free, then the n-th failure locks the key for
+    base * 2**(n - free - 1) seconds (capped). Entries are forgotten after `window` seconds of quiet.
+    """
+    def __init__(self, free: int, base_s: float, max_s: float, window_s: float = 3600.0):
+        self.free, self.base_s, self.max_s, self.window_s = free, base_s, max_s, window_s
+        self._lock = threading.Lock()
+        self._state: dict[str, list[float]] = {}  # key -> [failures, locked_until, last_seen]
+
+    def locked_for(self, key: str) -> float:
+        now = time.time()
+        with self._lock:
+            st_ = self._state.get(key)
+            if not st_:
+                return 0.0
+            if now - st_[2] > self.window_s:
+                del self._state[key]
+                return 0.0
+            return max(st_[1] - now, 0.0)
+
+    def fail(self, key: str) -> None:
+        now = time.time()
+        with self._lock:
+            st_ = self._state.setdefault(key, [0, 0.0, now])
+            st_[0] += 1
+            st_[2] = now
+            over = st_[0] - self.free
+            if over > 0:
+                st_[1] = now + min(self.base_s * (2 ** (over - 1)), self.max_s)
+            if len(self._state) > 50_000:  # bound memory under credential stuffing
+                cutoff = now - self.window_s
+                for k in [k for k, v in self._state.items() if v[2] < cutoff]:
+                    del self._state[k]
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._state.pop(key, None)
+
+_email_throttle = _Throttle(free=int(os.environ.get("AUTH_EMAIL_FREE_ATTEMPTS", "5")), base_s=2.0, max_s=900.0)
+_ip_throttle = _Throttle(free=int(os.environ.get("AUTH_IP_FREE_ATTEMPTS", "20")), base_s=2.0, max_s=900.0)
+
+# Reverse proxies whose X-Forwarded-For may be believed (comma-separated IPs /
+# CIDRs, e.g. "127.0.0.1,10.0.0.0/8"). Unset: the header is ignored, since any
+# client can send one and would dodge the per-IP lockout by rotating it.
+def _parse_networks(raw: str) -> list:
+    nets = []
+    for part in raw.split(","):
+        if part.strip():
+            try:
+                nets.append(ipaddress.ip_network(part.strip(), strict=False))
+            except ValueError:
+                pass
+    return nets
+
+_TRUSTED_PROXIES = _parse_networks(os.environ.get("NOCTIMIND_TRUSTED_PROXIES", ""))
+
+def _is_trusted_proxy(addr: str | None) -> bool:
+    try:
+        ip = ipaddress.ip_address((addr or "").strip())
+    except ValueError:
+        return False
+    return any(ip in net for net in _TRUSTED_PROXIES)
+
+def _client_ip() -> str | None:
+    """
+    Client address for throttling: the socket peer, or behind trusted proxies
+    the right-most X-Forwarded-For hop that isn't one of them.
+    """
+    try:
+        peer = getattr(st.context, "ip_address", None)
+        # Streamlit reports loopback peers (a proxy on the same host) as None
+        if not _TRUSTED_PROXIES or not _is_trusted_proxy(peer or "127.0.0.1"):
+            return peer
+        hops = [h.strip() for h in (st.context.headers.get("X-Forwarded-For") or "").split(",") if h.strip()]
+        for hop in reversed(hops):
+            if not _is_trusted_proxy(hop):
+                return hop
+        return hops[0] if hops else peer
+    except Exception:
+        return None
+
+def _lockout_message(seconds: float) -> str:
+    return f"❌ Too many attempts. Please wait {int(seconds) + 1}s and try again."
+
 # ---------- User Functions ----------
 def signup_user(email: str, name: str, password: str) -> tuple[bool, str]:
     if not validate_email(email):
@@ -72,39 +267,59 @@ def signup_user(email: str, name: str, password: str) -> tuple[bool, str]:
     if not name or not name.strip():
         return False, "❌ Please enter your name."
 
-    conn = _conn()
-    cur = conn.cursor()
-    cur.execute("SELECT email FROM users WHERE email = ?", (email.lower(),))
-    if cur.fetchone():
+    if _db.get_user(email.lower()):
         return False, "❌ An account with this email already exists."
 
-    pwhash, salt = _hash_password(password)
-    cur.execute(
-        "INSERT INTO users (email, name, password_hash, salt, created_at) VALUES (?,?,?,?,?)",
-        (email.lower(), name.strip(), pwhash, salt, time.time())
-    )
-    conn.commit()
+    try:
+        pwhash, salt = _hash_offloaded(password)
+    except AuthBusy as e:
+        return False, f"❌ {e}"
+    if not _db.insert_user(email.lower(), name.strip(), pwhash, salt, HASH_ALG, HASH_ITERATIONS):
+        return False, "❌ An account with this email already exists."
     return True, "✅ Account created successfully."
 
-def signin_user(email: str, password: str) -> tuple[bool, str, dict | None]:
+def signin_user(email: str, password: str, ip: str | None = None) -> tuple[bool, str, dict | None]:
     if not validate_email(email):
         return False, "❌ Invalid email format.", None
     ok, msg = validate_password_policy(password)
     if not ok:
         return False, f"❌ {msg}", None
 
-    conn = _conn()
-    cur = conn.cursor()
-    cur.execute("SELECT email, name, password_hash, salt FROM users WHERE email = ?", (email.lower(),))
-    row = cur.fetchone()
+    email_key = f"email:{email.lower()}"
+    ip_key = f"ip:{ip}" if ip else None
+    wait = max(_email_throttle.locked_for(email_key), _ip_throttle.locked_for(ip_key) if ip_key else 0.0)
+    if wait > 0:
+        return False, _lockout_message(wait), None
+
+    row = _db.get_user(email.lower())
     if not row:
+        if ip_key:
+            _ip_throttle.fail(ip_key)
         return False, "❌ No account found for this email.", None
 
-    _, name, pwhash, salt = row
-    calc, _ = _hash_password(password, salt)
+    _, name, pwhash, salt, alg, iterations = row
+    alg = alg or _LEGACY_ALG
+    iterations = int(iterations or _LEGACY_ITERATIONS)
+    try:
+        calc, _ = _hash_offloaded(password, salt, iterations, alg)
+    except AuthBusy as e:
+        return False, f"❌ {e}", None
     if not hmac.compare_digest(calc, pwhash):
+        _email_throttle.fail(email_key)
+        if ip_key:
+            _ip_throttle.fail(ip_key)
         return False, "❌ Incorrect password.", None
 
+    _email_throttle.reset(email_key)
+    if alg != HASH_ALG or iterations != HASH_ITERATIONS:
+        # Cost parameters were upgraded since this hash was made: rehash now,
+        # while we have the plaintext. A failure here must not block sign-in.
+        try:
+            new_hash, new_salt = _hash_offloaded(password)
+            _db.update_hash(email.lower(), new_hash, new_salt, HASH_ALG, HASH_ITERATIONS)
+        except Exception:
+            pass
+
     user = {"email": email.lower(), "name": name}
     return True, "✅ Signed in successfully.", user
 
@@ -149,6 +364,15 @@ def require_login(message: str = "Please sign in or sign up to view this page.",
         # 👇 CRUCIAL: do not continue rendering the page unauthenticated
         st.stop()
 
+# Operators allowed on the Diagnostics page (comma-separated emails)
+ADMIN_EMAILS = frozenset(
+    e.strip().lower() for e in os.environ.get("NOCTIMIND_ADMIN_EMAILS", "").split(",") if e.strip()
+)
+
+def is_admin(user: dict | None = None) -> bool:
+    user = user if user is not None else current_user()
+    return bool(user) and (user.get("email") or "").strip().lower() in ADMIN_EMAILS
+
 def gate_page(page_title: str = "This page requires an account", message: str = "Please sign in or sign up to view this page."):
     st.title(page_title)
     require_login(message=message, show_forms=True)
@@ -162,7 +386,7 @@ def login_form():
         score, label = password_strength(password)
         st.progress(score, text=f"Password strength: {label} ({score})")
     if st.button("Sign In", type="primary"):
-        ok, msg, user = signin_user(email, password)
+        ok, msg, user = signin_user(email, password, ip=_client_ip())
         if ok:
             st.session_state["auth_user"] = user
             st.success(f"Welcome back, {user['name']}!")
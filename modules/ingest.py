@@ -0,0 +1,477 @@
+# modules/ingest.py
+from __future__ import annotations
+import argparse
+import csv
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Bulk import of a journal (JSONL or CSV, one dream per record) for one user:
+#
+#   read -> [embed, batched] -> [analyze, N workers] -> [insert, batched]
+#
+# Stages run on their own threads joined by bounded queues, so a slow stage
+# (usually the rate-limited LLM) backs the others up instead of letting the
+# reader pull the whole file into memory. LLM calls go through the same
+# shared limiter as the app (modules.ratelimit); a dream whose analysis still
+# fails after retries is saved with its analysis pending, and the app's
+# analysis worker picks it up later. Committed records are checkpointed, so
+# an interrupted import resumes where it stopped.
+#
+#   python -m modules.ingest journal.jsonl --user me@example.com
+#
+# Records need a "text" (or "dream") field; "created_at" (or "date"), "tags"
+# (string or list), "sleep_hours" and "sleep_quality" are optional.
+
+log = logging.getLogger("noctimind.ingest")
+
+# ---------- Records ----------
+
+def _parse_time(value) -> Optional[str]:
+    """ISO date / datetime (any offset) -> naive UTC 'YYYY-MM-DDTHH:MM:SS' like storage uses."""
+    if value in (None, ""):
+        return None
+    dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat(timespec="seconds")
+
+def _opt_float(value) -> Optional[float]:
+    return None if value in (None, "") else float(value)
+
+def parse_record(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize one input record; raises ValueError when it can't be imported."""
+    text = str(raw.get("text") or raw.get("dream") or "").strip()
+    if not text:
+        raise ValueError("empty text")
+    tags = raw.get("tags")
+    if isinstance(tags, (list, tuple)):
+        tags = ", ".join(str(t) for t in tags)
+    quality = _opt_float(raw.get("sleep_quality"))
+    return {
+        "text": text,
+        "created_at": _parse_time(raw.get("created_at") or raw.get("date")),
+        "tags": str(tags).strip() if tags else None,
+        "sleep_hours": _opt_float(raw.get("sleep_hours")),
+        "sleep_quality": None if quality is None else int(min(max(round(quality), 1), 5)),
+    }
+
+def read_records(path: Path, fmt: Optional[str] = None) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield (index, raw record) where index is the record's position in the
+    file; a line that isn't valid JSON is yielded as the exception instead.
+    """
+    fmt = fmt or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from enumerate(csv.DictReader(f))
+            return
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                yield i, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield i, e
+
+# ---------- Checkpoint ----------
+
+class Checkpoint:
+    """
+    Indices of records already stored (or skipped as invalid), saved
+    atomically as a low watermark plus the done indices above it.
+    """
+
+    def __init__(self, path: Path, source: Path, user_email: str):
+        self.path = path
+        st = source.stat()
+        self.fingerprint = {"source": str(source.resolve()), "size": st.st_size, "user": user_email}
+        self.watermark = 0
+        self.done: set = set()
+        self.lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Resume from an existing checkpoint for the same file and user."""
+        if not self.path.exists():
+            return False
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        if data.get("fingerprint") != self.fingerprint:
+            raise ValueError(f"{self.path} belongs to a different input or user; pass --restart to ignore it")
+        self.watermark = int(data.get("watermark", 0))
+        self.done = set(data.get("done", []))
+        return True
+
+    def is_done(self, index: int) -> bool:
+        with self.lock:
+            return index < self.watermark or index in self.done
+
+    def mark(self, indices) -> None:
+        with self.lock:
+            self.done.update(indices)
+            while self.watermark in self.done:
+                self.done.discard(self.watermark)
+                self.watermark += 1
+
+    def save(self) -> None:
+        with self.lock:
+            data = {"fingerprint": self.fingerprint, "watermark": self.watermark,
+                    "done": sorted(self.done), "updated_at": time.time()}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+# ---------- Pipeline ----------
+
+_DONE = object()  # end-of-stream marker
+
+@dataclass
+class StageStats:
+    items: int = 0
+    busy_s: float = 0.0
+    queue_max: int = 0
+
+@dataclass
+class IngestResult:
+    read: int = 0
+    resumed_skips: int = 0
+    invalid: int = 0
+    analyzed: int = 0
+    analysis_queued: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    wall_s: float = 0.0
+    rebuild_s: float = 0.0
+    limiters: List[Dict[str, Any]] = field(default_factory=list)
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def summary(self) -> Dict[str, Any]:
+        out = {k: v for k, v in self.__dict__.items() if k != "stages"}
+        out["records_per_s"] = self.inserted / self.wall_s if self.wall_s else 0.0
+        out["stages"] = {
+            name: dict(s.__dict__, per_s=(s.items / s.busy_s if s.busy_s > 1e-3 else 0.0))
+            for name, s in self.stages.items()
+        }
+        return out
+
+class IngestPipeline:
+    def __init__(
+        self,
+        user_email: str,
+        checkpoint: Checkpoint,
+        embed_batch: int = 32,
+        insert_batch: int = 50,
+        analysis_workers: int = 4,
+        queue_size: int = 64,
+        analyze: bool = True,
+        analysis_retries: int = 2,
+        linger_s: float = 0.05,
+    ):
+        self.email = user_email.strip().lower()
+        self.checkpoint = checkpoint
+        self.embed_batch = max(1, embed_batch)
+        self.insert_batch = max(1, insert_batch)
+        self.workers = max(1, analysis_workers)
+        self.analyze = analyze
+        self.retries = max(0, analysis_retries)
+        self.linger_s = linger_s
+        self.q_embed: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.q_analyze: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.q_write: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.abort = threading.Event()
+        self.result = IngestResult(stages={n: StageStats() for n in ("embed", "analyze", "insert")})
+        self._lock = threading.Lock()
+
+    # --- queue helpers (backpressure-aware, abortable) ---
+
+    def _put(self, q: queue.Queue, item, stage: str) -> bool:
+        while not self.abort.is_set():
+            try:
+                q.put(item, timeout=0.2)
+            except queue.Full:
+                continue
+            s = self.result.stages[stage]
+            s.queue_max = max(s.queue_max, q.qsize())
+            return True
+        return False
+
+    def _get(self, q: queue.Queue, timeout: Optional[float] = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.abort.is_set():
+            wait = 0.2 if deadline is None else min(0.2, deadline - time.monotonic())
+            if wait <= 0:
+                raise queue.Empty
+            try:
+                return q.get(timeout=wait)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _batch(self, q: queue.Queue, size: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Block for one item, then take more until `size` or the linger runs out."""
+        first = self._get(q)
+        if first is _DONE:
+            return [], True
+        items = [first]
+        while len(items) < size:
+            try:
+                item = self._get(q, timeout=self.linger_s)
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _fail(self, stage: str, e: BaseException) -> None:
+        log.exception("ingest %s stage failed", stage)
+        with self._lock:
+            self.result.error = self.result.error or f"{stage}: {type(e).__name__}: {e}"
+        self.abort.set()
+
+    # --- stages ---
+
+    def _read(self, records: Iterator[Tuple[int, Any]]) -> None:
+        try:
+            for idx, raw in records:
+                if self.abort.is_set():
+                    return
+                if self.checkpoint.is_done(idx):
+                    self.result.resumed_skips += 1
+                    continue
+                self.result.read += 1
+                try:
+                    if isinstance(raw, Exception):
+                        raise ValueError(str(raw))
+                    rec = parse_record(raw)
+                except (ValueError, TypeError) as e:
+                    log.warning("record %s skipped: %s", idx, e)
+                    self.result.invalid += 1
+                    self.checkpoint.mark([idx])
+                    continue
+                rec["index"] = idx
+                if not self._put(self.q_embed, rec, "embed"):
+                    return
+        except Exception as e:
+            self._fail("read", e)
+        finally:
+            self._put(self.q_embed, _DONE, "embed")
+
+    def _embed(self) -> None:
+        from modules.nlp import get_embeddings
+        s = self.result.stages["embed"]
+        try:
+            done = False
+            while not done:
+                items, done = self._batch(self.q_embed, self.embed_batch)
+                if not items:
+                    continue
+                t0 = time.perf_counter()
+                vecs = get_embeddings([r["text"] for r in items], batch_size=self.embed_batch)
+                s.busy_s += time.perf_counter() - t0
+                s.items += len(items)
+                for rec, vec in zip(items, vecs):
+                    rec["embedding"] = vec
+                    if not self._put(self.q_analyze, rec, "analyze"):
+                        return
+        except Exception as e:
+            self._fail("embed", e)
+        finally:
+            for _ in range(self.workers):
+                self._put(self.q_analyze, _DONE, "analyze")
+
+    def _analyze_one(self, rec: Dict[str, Any]) -> None:
+        from modules.llm import analyze_dream_llm, normalize_analysis
+        for attempt in range(self.retries + 1):
+            try:
+                rec.update(normalize_analysis(analyze_dream_llm(rec["text"], user_key=self.email)))
+                with self._lock:
+                    self.result.analyzed += 1
+                return
+            except Exception as e:
+                if attempt < self.retries:
+                    time.sleep(min(2 ** attempt, 10))
+                    continue
+                log.warning("record %s: analysis failed (%s); saving it with analysis pending",
+                            rec["index"], e)
+        rec["analysis_pending"] = True
+
+    def _analyzer(self) -> None:
+        s = self.result.stages["analyze"]
+        try:
+            while True:
+                rec = self._get(self.q_analyze)
+                if rec is _DONE:
+                    return
+                t0 = time.perf_counter()
+                if self.analyze:
+                    self._analyze_one(rec)
+                else:
+                    rec["analysis_pending"] = True
+                with self._lock:
+                    s.busy_s += time.perf_counter() - t0
+                    s.items += 1
+                if not self._put(self.q_write, rec, "insert"):
+                    return
+        except Exception as e:
+            self._fail("analyze", e)
+        finally:
+            self._put(self.q_write, _DONE, "insert")
+
+    def _write(self) -> None:
+        from modules.storage import insert_dreams
+        s = self.result.stages["insert"]
+        open_workers = self.workers
+        pending: List[Dict[str, Any]] = []
+        try:
+            while open_workers:
+                items, ended = self._batch(self.q_write, self.insert_batch - len(pending))
+                if self.abort.is_set() and not items:
+                    break
+                open_workers -= int(ended)
+                pending.extend(items)
+                if len(pending) < self.insert_batch and open_workers:
+                    continue
+                self._flush(pending, insert_dreams, s)
+                pending = []
+            self._flush(pending, insert_dreams, s)
+        except Exception as e:
+            self._fail("insert", e)
+
+    def _flush(self, items: List[Dict[str, Any]], insert_dreams, s: StageStats) -> None:
+        if not items:
+            return
+        t0 = time.perf_counter()
+        ids = insert_dreams(self.email, items)
+        s.busy_s += time.perf_counter() - t0
+        s.items += len(items)
+        self.result.inserted += sum(1 for i in ids if i is not None)
+        self.result.duplicates += sum(1 for i in ids if i is None)
+        self.result.analysis_queued += sum(1 for i, r in zip(ids, items)
+                                           if i is not None and r.get("analysis_pending"))
+        # Only after the commit: a crash before this line re-reads these
+        # records on resume, and insert_dreams skips the duplicates.
+        self.checkpoint.mark(r["index"] for r in items)
+        self.checkpoint.save()
+
+    def run(self, records: Iterator[Tuple[int, Any]], progress_s: float = 0.0) -> IngestResult:
+        threads = [
+            threading.Thread(target=self._read, args=(records,), name="ingest-read", daemon=True),
+            threading.Thread(target=self._embed, name="ingest-embed", daemon=True),
+            *[threading.Thread(target=self._analyzer, name=f"ingest-analyze-{i}", daemon=True)
+              for i in range(self.workers)],
+            threading.Thread(target=self._write, name="ingest-insert", daemon=True),
+        ]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        try:
+            while any(t.is_alive() for t in threads):
+                threads[-1].join(timeout=progress_s or 0.5)
+                if progress_s:
+                    self._progress(time.perf_counter() - t0)
+        except KeyboardInterrupt:
+            log.warning("interrupted; finishing the current batch and saving the checkpoint")
+            self.result.error = "interrupted"
+            self.abort.set()
+            for t in threads:
+                t.join()
+        self.result.wall_s = time.perf_counter() - t0
+        self.checkpoint.save()
+        from modules.ratelimit import limiter_metrics
+        self.result.limiters = limiter_metrics()
+        return self.result
+
+    def _progress(self, elapsed: float) -> None:
+        r = self.result
+        print(
+            f"\r{elapsed:7.1f}s  read {r.read:,}  embedded {r.stages['embed'].items:,}  "
+            f"analyzed {r.stages['analyze'].items:,}  stored {r.inserted:,}  "
+            f"({r.inserted / max(elapsed, 1e-9):.1f}/s)  queues {self.q_embed.qsize()}/"
+            f"{self.q_analyze.qsize()}/{self.q_write.qsize()}",
+            end="", file=sys.stderr, flush=True,
+        )
+
+# ---------- CLI ----------
+
+def _print_summary(result: IngestResult, rebuild: bool) -> None:
+    s = result.summary()
+    print(f"\n\nstored {s['inserted']:,} dream(s) in {s['wall_s']:.1f}s ({s['records_per_s']:.1f}/s)")
+    print(f"  read {s['read']:,} · invalid {s['invalid']:,} · duplicates {s['duplicates']:,} · "
+          f"already done {s['resumed_skips']:,}")
+    print(f"  analyzed {s['analyzed']:,} · left pending for the app worker {s['analysis_queued']:,}")
+    print(f"  {'stage':<10}{'items':>9}{'busy s':>10}{'items/s':>10}{'max queue':>11}")
+    for name, st in s["stages"].items():
+        print(f"  {name:<10}{st['items']:>9,}{st['busy_s']:>10.1f}{st['per_s']:>10.1f}{st['queue_max']:>11}")
+    for lim in s["limiters"]:
+        if lim.get("admitted"):
+            print(f"  {lim['name']} limiter: {lim['admitted']:,} admitted · wait p50 {lim['wait_p50_s']:.2f}s "
+                  f"p95 {lim['wait_p95_s']:.2f}s · {lim['throttled_429']} throttled (429)")
+    if rebuild:
+        print(f"  rebuilt per-user aggregates in {s['rebuild_s']:.1f}s")
+    if s["error"]:
+        print(f"  stopped early: {s['error']} — rerun the same command to resume")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(
+        prog="python -m modules.ingest",
+        description="Import a JSONL / CSV journal of dreams for one user (embed, analyze, store).",
+    )
+    ap.add_argument("input", type=Path)
+    ap.add_argument("--user", required=True, help="owner's email (as used to sign in)")
+    ap.add_argument("--format", choices=["jsonl", "csv"], default=None, help="default: from the file extension")
+    ap.add_argument("--checkpoint", type=Path, default=None, help="default: <input>.ingest.json")
+    ap.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    ap.add_argument("--embed-batch", type=int, default=32)
+    ap.add_argument("--insert-batch", type=int, default=50)
+    ap.add_argument("--analysis-workers", type=int, default=4,
+                    help="concurrent LLM calls (the shared limiter still applies GROQ_RPM / GROQ_MAX_CONCURRENT)")
+    ap.add_argument("--analysis-retries", type=int, default=2)
+    ap.add_argument("--queue-size", type=int, default=64, help="bound on each inter-stage queue")
+    ap.add_argument("--no-analyze", action="store_true",
+                    help="store with analysis pending and leave the LLM work to the app's worker")
+    ap.add_argument("--progress-s", type=float, default=2.0, help="progress line interval (0 = off)")
+    ap.add_argument("--json", type=Path, default=None, help="also write the summary here")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if not args.input.exists():
+        ap.error(f"{args.input} not found")
+    email = args.user.strip().lower()
+
+    ckpt = Checkpoint(args.checkpoint or args.input.with_name(args.input.name + ".ingest.json"), args.input, email)
+    if not args.restart and ckpt.load():
+        log.info("resuming from %s (%d record(s) already done)", ckpt.path, ckpt.watermark + len(ckpt.done))
+
+    pipeline = IngestPipeline(
+        email, ckpt,
+        embed_batch=args.embed_batch, insert_batch=args.insert_batch,
+        analysis_workers=args.analysis_workers, queue_size=args.queue_size,
+        analyze=not args.no_analyze, analysis_retries=args.analysis_retries,
+    )
+    result = pipeline.run(read_records(args.input, args.format), progress_s=args.progress_s)
+
+    # Imported dreams may predate stored ones; the running per-user stats
+    # (exponentially weighted means) assume insertion order, so rebuild once.
+    rebuild = result.inserted > 0
+    if rebuild:
+        from modules.storage import rebuild_user_aggregates
+        t0 = time.perf_counter()
+        rebuild_user_aggregates(email)
+        result.rebuild_s = time.perf_counter() - t0
+
+    _print_summary(result, rebuild)
+    if args.json:
+        args.json.write_text(json.dumps(result.summary(), indent=2, default=str), encoding="utf-8")
+    return 1 if result.error else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# modules/insights.py
+from __future__ import annotations
+import json
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from modules.stats import NEG_AFFECT_KEYS, EMOTION_KEYS
+
+# Per-user insights held as arrays: an (N, 7) float32 emotion matrix in
+# EMOTION_ORDER plus sleep columns, oldest first. Prefix sums are computed
+# once, so means over any "last N dreams" window are O(1) lookups.
+
+EMOTION_ORDER = list(EMOTION_KEYS)
+_NEG_IDX = [EMOTION_ORDER.index(k) for k in NEG_AFFECT_KEYS]
+
+class InsightsEngine:
+    def __init__(
+        self,
+        created_at: Sequence[str],
+        emotions: np.ndarray,
+        sleep_hours: np.ndarray,
+        sleep_quality: np.ndarray,
+    ):
+        self.created_at = np.asarray(created_at, dtype=object)
+        self.emotions = np.asarray(emotions, dtype=np.float32).reshape(-1, len(EMOTION_ORDER))
+        self.sleep_hours = np.asarray(sleep_hours, dtype=np.float32)
+        self.sleep_quality = np.asarray(sleep_quality, dtype=np.float32)
+        self.neg_affect = self.emotions[:, _NEG_IDX].sum(axis=1)
+
+        # Leading zero row: sum over rows [i, j) == prefix[j] - prefix[i].
+        # float64 so long histories don't drift.
+        self._emo_prefix = np.vstack([
+            np.zeros((1, len(EMOTION_ORDER))),
+            np.cumsum(self.emotions, axis=0, dtype=np.float64),
+        ])
+        self._neg_prefix = np.concatenate([[0.0], np.cumsum(self.neg_affect, dtype=np.float64)])
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, str, Optional[float], Optional[float]]]) -> "InsightsEngine":
+        """Build from storage.fetch_insight_rows (created_at, emotions_json, sleep_hours, sleep_quality)."""
+        rows = list(rows)
+        emo = np.zeros((len(rows), len(EMOTION_ORDER)), dtype=np.float32)
+        for i, (_, raw, _, _) in enumerate(rows):
+            try:
+                d = json.loads(raw) if raw else {}
+            except Exception:
+                d = {}
+            if isinstance(d, dict):
+                for j, k in enumerate(EMOTION_ORDER):
+                    try:
+                        emo[i, j] = float(d.get(k, 0) or 0)
+                    except (TypeError, ValueError):
+                        pass
+        col = lambda i: np.array([np.nan if r[i] is None else r[i] for r in rows], dtype=np.float32)
+        return cls([r[0] for r in rows], emo, col(2), col(3))
+
+    @property
+    def n(self) -> int:
+        return int(self.emotions.shape[0])
+
+    def _window(self, last_n: Optional[int]) -> Tuple[int, int]:
+        k = self.n if last_n is None else max(0, min(int(last_n), self.n))
+        return self.n - k, self.n
+
+    def mean_emotions(self, last_n: Optional[int] = None) -> Dict[str, float]:
+        """Average emotion distribution over all dreams or the last `last_n` (O(1))."""
+        i, j = self._window(last_n)
+        if j == i:
+            return {k: (100.0 if k == "neutral" else 0.0) for k in EMOTION_ORDER}
+        m = (self._emo_prefix[j] - self._emo_prefix[i]) / (j - i)
+        return {k: float(v) for k, v in zip(EMOTION_ORDER, m)}
+
+    def mean_neg_affect(self, last_n: Optional[int] = None) -> float:
+        i, j = self._window(last_n)
+        return float((self._neg_prefix[j] - self._neg_prefix[i]) / (j - i)) if j > i else 0.0
+
+    def rolling_neg_affect(self, window: int) -> np.ndarray:
+        """Trailing mean of negative affect over up to `window` dreams, one value per dream."""
+        if self.n == 0:
+            return np.zeros(0, dtype=np.float64)
+        w = max(1, int(window))
+        end = np.arange(1, self.n + 1)
+        start = np.maximum(0, end - w)
+        return (self._neg_prefix[end] - self._neg_prefix[start]) / (end - start)
+
+    def frame(self, columns: Sequence[str] = ("sleep_hours", "sleep_quality", "neg_affect")) -> pd.DataFrame:
+        """Small numeric DataFrame view for plotting helpers that take a df."""
+        cols = {c: getattr(self, c) for c in columns}
+        return pd.DataFrame(cols)
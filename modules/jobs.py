@@ -0,0 +1,80 @@
+# modules/jobs.py
+from __future__ import annotations
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from modules.llm import analyze_dream_llm, normalize_analysis
+from modules.storage import (
+    claim_analysis_job, complete_analysis_job, fail_analysis_job,
+    update_dream_analysis, fetch_dream_by_id,
+)
+
+# Background worker for the durable analysis queue in storage.analysis_jobs.
+# Dreams are saved first (with their embedding) and analyzed here; a failed
+# or unparseable LLM call is retried with backoff instead of storing a fallback.
+
+log = logging.getLogger("noctimind.jobs")
+
+_POLL_S = float(os.environ.get("NOCTIMIND_JOB_POLL_S", "1.0"))
+_MAX_ATTEMPTS = int(os.environ.get("NOCTIMIND_JOB_MAX_ATTEMPTS", "8"))
+
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+_wake = threading.Event()
+
+def run_one_job() -> bool:
+    """Claim and process a single due job. Returns False when nothing was due."""
+    job = claim_analysis_job()
+    if not job:
+        return False
+    try:
+        out = normalize_analysis(analyze_dream_llm(job["text"], user_key=job["user_email"]))
+    except Exception as e:
+        status = fail_analysis_job(job["id"], f"{type(e).__name__}: {e}", max_attempts=_MAX_ATTEMPTS)
+        log.warning("analysis job %s for dream %s failed (attempt %s): %s -> %s",
+                    job["id"], job["dream_id"], job["attempts"] + 1, e, status)
+        return True
+    update_dream_analysis(job["dream_id"], **out)
+    complete_analysis_job(job["id"])
+    return True
+
+def _loop():
+    while True:
+        try:
+            while run_one_job():
+                pass
+        except Exception:
+            log.exception("analysis worker loop error")
+        _wake.wait(_POLL_S)
+        _wake.clear()
+
+def ensure_worker() -> None:
+    """Start the process-wide analysis worker thread once (idempotent)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_loop, name="noctimind-analysis-worker", daemon=True)
+            _worker.start()
+    _wake.set()
+
+def wait_for_analysis(user_email: str, dream_id: int, timeout: float = 20.0,
+                      on_poll: Optional[Callable[[float], None]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Poll until the dream's analysis is done (returns the dream row) or `timeout`
+    elapses (returns None; the job stays queued and finishes in the background).
+    """
+    ensure_worker()
+    t0 = time.monotonic()
+    while True:
+        row = fetch_dream_by_id(user_email, dream_id)
+        if row and row.get("analysis_status") in (None, "done"):
+            return row
+        elapsed = time.monotonic() - t0
+        if elapsed >= timeout or (row and row.get("analysis_status") == "failed"):
+            return None
+        if on_poll is not None:
+            on_poll(elapsed)
+        time.sleep(0.4)
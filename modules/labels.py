@@ -0,0 +1,32 @@
+# modules/labels.py
+from __future__ import annotations
+import re
+from typing import Iterable, List, Optional
+
+# Normalization for motif and tag labels stored in the motifs / tags tables:
+# lower-case, collapse whitespace, trim surrounding punctuation, de-duplicate
+# (first occurrence wins). "  Falling ", "falling." and "FALLING" are one label.
+
+_WS_RE = re.compile(r"\s+")
+_TRIM = " \t\r\n.,;:!?\"'`()[]{}#"
+MAX_LABEL_LEN = 64
+
+def normalize_label(value) -> str:
+    if value is None:
+        return ""
+    s = _WS_RE.sub(" ", str(value)).strip(_TRIM).lower()
+    return s[:MAX_LABEL_LEN].strip()
+
+def normalize_labels(values: Optional[Iterable]) -> List[str]:
+    out: List[str] = []
+    seen = set()
+    for v in values or []:
+        s = normalize_label(v)
+        if s and s not in seen:
+            seen.add(s)
+            out.append(s)
+    return out
+
+def split_tags(tags: Optional[str]) -> List[str]:
+    """Comma-separated tag string (as typed on the Log page) -> normalized tags."""
+    return normalize_labels((tags or "").split(","))
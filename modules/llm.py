@@ -5,10 +5,13 @@ import requests
 import streamlit as st
 from dotenv import load_dotenv
 
+from modules.ratelimit import LLM_LIMITER, retry_after_seconds
+from modules.telemetry import timed
+
 # Load .env for local dev
 load_dotenv()
 
-_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+_DEFAULT_BASE_URL = "https://api.groq.com/openai/v1"
 
 _SYSTEM = (
     "You are NoctiMind, a careful dream analyst. "
@@ -52,7 +55,19 @@ def _get_groq_model() -> str:
         return val
     return os.environ.get("GROQ_MODEL", "llama-3.3-70b-versatile")
 
-def _call_groq(messages, temperature=0.2):
+def _get_base_url() -> str:
+    # GROQ_BASE_URL lets benchmarks point at a local stand-in (tools/groq_stub.py)
+    val = _safe_get_secret("GROQ_BASE_URL") or os.environ.get("GROQ_BASE_URL") or _DEFAULT_BASE_URL
+    return val.rstrip("/")
+
+@timed("llm.groq_chat")
+def _call_groq(messages, temperature=0.2, user_key: str | None = None, on_wait=None, max_retries: int = 2):
+    """
+    POST a chat completion through the shared, fair rate limiter.
+    `user_key` identifies the caller for per-user fairness; `on_wait(position, eta_s)`
+    is invoked while the request is queued. 429s back off the whole process
+    (honouring Retry-After) and are retried up to `max_retries` times.
+    """
     api_key = _get_groq_key()
     if not api_key:
         raise RuntimeError(
@@ -68,16 +83,29 @@ def _call_groq(messages, temperature=0.2):
         "messages": messages,
         "temperature": temperature,
     }
-    r = requests.post(_API_URL, headers=headers, json=payload, timeout=60)
-    r.raise_for_status()
-    data = r.json()
-    return data["choices"][0]["message"]["content"]
+    for attempt in range(max_retries + 1):
+        with LLM_LIMITER.slot(user_key, on_wait=on_wait):
+            r = requests.post(f"{_get_base_url()}/chat/completions", headers=headers, json=payload, timeout=60)
+        if r.status_code == 429 and attempt < max_retries:
+            LLM_LIMITER.penalize(retry_after_seconds(r))
+            continue
+        r.raise_for_status()
+        data = r.json()
+        return data["choices"][0]["message"]["content"]
+
+class LLMResponseError(ValueError):
+    """The model replied, but not with the JSON object we asked for."""
 
-def analyze_dream_llm(dream_text: str):
+def analyze_dream_llm(dream_text: str, user_key: str | None = None, on_wait=None):
+    """
+    Run the dream analysis prompt and return the parsed JSON object.
+    Raises LLMResponseError when the reply cannot be parsed (callers retry
+    rather than store a made-up neutral result) and requests errors on HTTP failure.
+    """
     content = _call_groq([
         {"role": "system", "content": _SYSTEM},
         {"role": "user", "content": _USER_TEMPLATE.format(dream=dream_text)}
-    ])
+    ], user_key=user_key, on_wait=on_wait)
 
     # Extract JSON if the model wrapped it in text
     start = content.find("{")
@@ -87,19 +115,53 @@ def analyze_dream_llm(dream_text: str):
 
     try:
         obj = json.loads(content)
-    except Exception:
-        # Safe fallback
-        obj = {
-            "motifs": [],
-            "archetype": "unknown",
-            "emotions": {"joy":0,"sadness":0,"fear":0,"anger":0,"disgust":0,"surprise":0,"neutral":100},
-            "reframed": "Imagine a calmer version of this story where you feel safe and supported."
-        }
+    except Exception as e:
+        raise LLMResponseError(f"Could not parse analysis JSON: {e}") from e
+    if not isinstance(obj, dict):
+        raise LLMResponseError("Analysis reply was not a JSON object.")
 
     obj.setdefault("motifs", [])
     obj.setdefault("archetype", "unknown")
-    obj.setdefault("emotions", {})
+    if not isinstance(obj.get("emotions"), dict):
+        obj["emotions"] = {}
     for k in ["joy","sadness","fear","anger","disgust","surprise","neutral"]:
-        obj["emotions"][k] = float(obj["emotions"].get(k, 0))
+        try:
+            obj["emotions"][k] = float(obj["emotions"].get(k, 0))
+        except (TypeError, ValueError):
+            obj["emotions"][k] = 0.0
     obj.setdefault("reframed", "")
     return obj
+
+def normalize_emotions(emo: dict | None) -> dict:
+    """
+    Force a consistent 7-emotion distribution as percentages (0..100, sum≈100).
+    Missing keys default to 0, and if total==0 -> neutral=100.
+    """
+    emo = emo or {}
+    keys = ["joy", "sadness", "fear", "anger", "disgust", "surprise", "neutral"]
+    total = 0.0
+    vals = {}
+    for k in keys:
+        try:
+            v = float(emo.get(k, 0.0))
+        except Exception:
+            v = 0.0
+        vals[k] = max(v, 0.0)
+        total += vals[k]
+
+    if total <= 0:
+        return {k: (100.0 if k == "neutral" else 0.0) for k in keys}
+
+    return {k: round((vals[k] / total) * 100.0, 2) for k in keys}
+
+def normalize_analysis(llm_out: dict) -> dict:
+    """Sanitize an analyze_dream_llm() result into the columns storage expects."""
+    motifs = llm_out.get("motifs", [])
+    if not isinstance(motifs, list):
+        motifs = []
+    return {
+        "motifs": [str(x) for x in motifs if isinstance(x, (str, int, float))],
+        "archetype": str(llm_out.get("archetype", "unknown")) or "unknown",
+        "reframed": str(llm_out.get("reframed", "")),
+        "emotions": normalize_emotions(llm_out.get("emotions", {})),
+    }
@@ -0,0 +1,73 @@
+# modules/motif_graph.py
+from __future__ import annotations
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+
+from modules.storage import fetch_motif_graph, motif_graph_version
+
+# Per-user motif co-occurrence graph (edges maintained incrementally in
+# storage.motif_edges). Graph, communities and layout are cached by the
+# user's graph version. After a small change the previous positions are kept
+# and only new motifs are placed, so the picture doesn't jump between reruns.
+
+MAX_NODES = 60
+
+@lru_cache(maxsize=64)
+def _graph(email: str, version: int, max_nodes: int) -> nx.Graph:
+    _, nodes, edges = fetch_motif_graph(email, max_nodes=max_nodes)
+    g = nx.Graph()
+    for name, count in nodes.items():
+        g.add_node(name, count=count)
+    g.add_weighted_edges_from(edges)
+    return g
+
+def motif_graph(user_email: str, max_nodes: int = MAX_NODES) -> Tuple[int, nx.Graph]:
+    """(version, graph) for the user's top motifs; treat the graph as read-only."""
+    email = (user_email or "").strip().lower()
+    version = motif_graph_version(email)
+    return version, _graph(email, version, max_nodes)
+
+@lru_cache(maxsize=64)
+def _communities(email: str, version: int, max_nodes: int) -> Tuple[Tuple[str, ...], ...]:
+    g = _graph(email, version, max_nodes)
+    if g.number_of_edges() == 0:
+        return tuple((n,) for n in g.nodes)
+    comms = nx.community.louvain_communities(g, weight="weight", seed=42)
+    return tuple(tuple(sorted(c)) for c in sorted(comms, key=len, reverse=True))
+
+def motif_communities(user_email: str, max_nodes: int = MAX_NODES) -> List[Tuple[str, ...]]:
+    """Clusters of motifs that tend to co-occur (Louvain, largest first)."""
+    email = (user_email or "").strip().lower()
+    return list(_communities(email, motif_graph_version(email), max_nodes))
+
+# Last layout per user: (version, max_nodes, positions)
+_LAYOUTS: Dict[str, Tuple[int, int, Dict[str, Tuple[float, float]]]] = {}
+_LAYOUT_LOCK = threading.Lock()
+
+def motif_layout(user_email: str, max_nodes: int = MAX_NODES) -> Dict[str, Tuple[float, float]]:
+    """Spring-layout positions, reused until the graph changes and warm-started after."""
+    email = (user_email or "").strip().lower()
+    version, g = motif_graph(email, max_nodes)
+    with _LAYOUT_LOCK:
+        prev = _LAYOUTS.get(email)
+    if prev and prev[0] == version and prev[1] == max_nodes:
+        return prev[2]
+
+    init: Optional[Dict[str, Tuple[float, float]]] = None
+    if prev:
+        init = {n: p for n, p in prev[2].items() if n in g}
+    if not g.number_of_nodes():
+        pos = {}
+    elif init and len(init) >= 0.75 * g.number_of_nodes():
+        # Mostly the same motifs: keep known nodes pinned, place only the new ones
+        fixed = list(init) if len(init) < g.number_of_nodes() else None
+        pos = nx.spring_layout(g, pos=init, fixed=fixed, weight="weight", seed=42, iterations=30) if fixed else init
+    else:
+        pos = nx.spring_layout(g, pos=init or None, weight="weight", seed=42, iterations=50)
+    pos = {n: (float(x), float(y)) for n, (x, y) in pos.items()}
+    with _LAYOUT_LOCK:
+        _LAYOUTS[email] = (version, max_nodes, pos)
+    return pos
@@ -3,6 +3,8 @@ import nltk
 from sentence_transformers import SentenceTransformer
 from typing import List, Dict
 
+from modules.telemetry import timed
+
 _model_cache = None
 
 def ensure_nltk():
@@ -17,11 +19,20 @@ def _emb_model():
         _model_cache = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
     return _model_cache
 
+@timed("nlp.embedding")
 def get_embedding(text: str) -> np.ndarray:
     m = _emb_model()
     vec = m.encode([text], normalize_embeddings=True)
     return vec[0]
 
+@timed("nlp.embedding_batch")
+def get_embeddings(texts: List[str], batch_size: int = 32) -> np.ndarray:
+    """Embed many texts in one model call; (N, dim) rows, L2-normalized like get_embedding."""
+    m = _emb_model()
+    if not texts:
+        return np.zeros((0, m.get_sentence_embedding_dimension()), dtype=np.float32)
+    return m.encode(list(texts), batch_size=batch_size, normalize_embeddings=True)
+
 def cosine_sim_matrix(X: np.ndarray) -> np.ndarray:
     Xn = X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-9)
     return Xn @ Xn.T
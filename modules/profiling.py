@@ -0,0 +1,117 @@
+# modules/profiling.py
+from __future__ import annotations
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List
+
+import pandas as pd
+import streamlit as st
+
+from modules.auth import is_admin
+
+# One-shot cProfile of a single page rerun, for admins diagnosing slow pages
+# on real data. Trigger with ?profile=1 on the page URL or the buttons on the
+# Diagnostics page; the page runs its body inside `with profile_page(id):`.
+# The profile is saved to PROFILE_DIR as <page>-<timestamp>.prof (open with
+# snakeviz / pstats) and the top cumulative functions are shown inline.
+#
+# On Python 3.12+ cProfile hooks sys.monitoring for the whole process, so
+# only one profile may run at a time (module lock) and it also sees other
+# sessions' work done meanwhile. The profiler is always disabled on exit,
+# including st.stop / st.rerun / exceptions.
+
+PROFILE_DIR = Path(os.environ.get("NOCTIMIND_PROFILE_DIR", "data/profiles"))
+TOP_N = 30
+
+_NEXT_KEY = "_nm_profile_next"
+_ACTIVE = threading.Lock()  # one profile per process
+
+def request_profile(page_id: str) -> None:
+    """Profile the next run of `page_id` in this session (Diagnostics page button)."""
+    st.session_state[_NEXT_KEY] = page_id
+
+def _requested(page_id: str) -> bool:
+    """Consume a ?profile=1 / Diagnostics request for this page (admins only)."""
+    by_param = st.query_params.get("profile") in ("1", "true", "yes")
+    by_flag = st.session_state.get(_NEXT_KEY) == page_id
+    if not (by_param or by_flag) or not is_admin():
+        return False
+    # one execution only
+    if by_param:
+        del st.query_params["profile"]
+    st.session_state.pop(_NEXT_KEY, None)
+    return True
+
+@contextmanager
+def profile_page(page_id: str) -> Iterator[bool]:
+    """Profile the enclosed page body if an admin asked for it; yields True when active."""
+    if not _requested(page_id):
+        yield False
+        return
+    if not _ACTIVE.acquire(blocking=False):
+        st.info("⏱ Profiler busy — another profile is running in this process. Try again in a moment.")
+        yield False
+        return
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except ValueError:  # another profiling tool holds sys.monitoring (Python 3.12+)
+        _ACTIVE.release()
+        st.info("⏱ Profiler busy — another profiling tool is active in this process.")
+        yield False
+        return
+    t0 = time.perf_counter()
+    completed = False
+    try:
+        yield True
+        completed = True
+    finally:
+        prof.disable()
+        _ACTIVE.release()
+        path = _save(prof, page_id)
+    # Runs that stop early (st.stop / st.rerun / errors) are saved but not rendered
+    if completed:
+        _render(prof, path, time.perf_counter() - t0)
+
+def top_functions(stats: pstats.Stats, n: int = TOP_N) -> pd.DataFrame:
+    rows = []
+    for (file, line, func), (cc, nc, tt, ct, _callers) in stats.stats.items():  # type: ignore[attr-defined]
+        rows.append({
+            "function": func,
+            "location": f"{Path(file).name}:{line}" if line else file,
+            "calls": nc,
+            "cumulative_ms": ct * 1000,
+            "self_ms": tt * 1000,
+        })
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    return df.sort_values("cumulative_ms", ascending=False).head(n).round(2).reset_index(drop=True)
+
+def _save(prof: cProfile.Profile, page_id: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    path = PROFILE_DIR / f"{page_id}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}.prof"
+    prof.dump_stats(str(path))
+    return path
+
+def _render(prof: cProfile.Profile, path: Path, wall: float) -> None:
+    with st.expander(f"⏱ Profile of this run — {wall * 1000:.0f} ms", expanded=True):
+        st.caption(f"Saved to `{path}`")
+        if sys.version_info >= (3, 12):
+            st.caption("Includes work from other sessions in this process during the run.")
+        st.dataframe(top_functions(pstats.Stats(prof)), hide_index=True, use_container_width=True)
+        st.download_button("Download .prof", path.read_bytes(), file_name=path.name,
+                           mime="application/octet-stream", key=f"dl_{path.name}")
+
+def saved_profiles(limit: int = 20) -> List[Path]:
+    """Most recent saved profiles first."""
+    if not PROFILE_DIR.exists():
+        return []
+    return sorted(PROFILE_DIR.glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True)[:limit]
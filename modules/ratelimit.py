@@ -0,0 +1,273 @@
+# modules/ratelimit.py
+from __future__ import annotations
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import streamlit as st
+
+# Process-wide admission control for outbound Groq calls.
+# Every Streamlit session runs in the same process, so module-level limiters
+# are shared by all users: a token bucket caps the request rate, and a
+# round-robin queue across users keeps one heavy user from starving the rest.
+
+def _safe_get_secret(key: str):
+    try:
+        if hasattr(st, "secrets") and key in st.secrets:
+            return st.secrets[key]
+    except Exception:
+        pass
+    return None
+
+def _cfg_float(key: str, default: float) -> float:
+    val = _safe_get_secret(key) or os.environ.get(key)
+    try:
+        return float(val) if val is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+class QueueTimeout(RuntimeError):
+    """Raised when a request waited longer than the limiter's timeout."""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(float(rate), 1e-6)
+        self.capacity = max(float(capacity), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if one is available now)."""
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1.0
+
+    def penalize(self, seconds: float, now: float) -> None:
+        """Empty the bucket so nothing is admitted for `seconds` (e.g. after a 429)."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0) - max(seconds, 0.0) * self.rate
+
+
+class _Ticket:
+    __slots__ = ("user", "enqueued")
+
+    def __init__(self, user: str):
+        self.user = user
+        self.enqueued = time.monotonic()
+
+
+class FairLimiter:
+    """
+    Token-bucket limiter with a fair (round-robin per user) waiting queue.
+
+    Use as:
+        with limiter.slot(user_email, on_wait=cb):
+            requests.post(...)
+
+    `on_wait(position, eta_seconds)` is called from the waiting thread while the
+    request is queued, so a page can show "you're #3 in line, ~8s".
+    """
+
+    def __init__(self, name: str, rate_per_min: float, burst: float,
+                 max_concurrent: int, timeout: float = 120.0):
+        self.name = name
+        self.bucket = TokenBucket(rate_per_min / 60.0, burst)
+        self.max_concurrent = max(int(max_concurrent), 1)
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._queues: "OrderedDict[str, deque[_Ticket]]" = OrderedDict()
+        self._inflight = 0
+        # metrics
+        self._admitted = 0
+        self._timeouts = 0
+        self._throttled = 0
+        self._max_depth = 0
+        self._waits: deque[float] = deque(maxlen=1000)
+
+    # ---------- Queue bookkeeping (call with lock held) ----------
+    def _depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _order(self) -> List[_Ticket]:
+        """Admission order: one ticket per user per round, users in rotation order."""
+        out: List[_Ticket] = []
+        queues = list(self._queues.values())
+        r = 0
+        while True:
+            added = False
+            for q in queues:
+                if len(q) > r:
+                    out.append(q[r])
+                    added = True
+            if not added:
+                return out
+            r += 1
+
+    def _head(self) -> Optional[_Ticket]:
+        for q in self._queues.values():
+            if q:
+                return q[0]
+        return None
+
+    def _remove(self, ticket: _Ticket) -> None:
+        q = self._queues.get(ticket.user)
+        if q is None:
+            return
+        try:
+            q.remove(ticket)
+        except ValueError:
+            pass
+        if not q:
+            del self._queues[ticket.user]
+
+    def _eta(self, position: int, now: float) -> float:
+        # Tokens needed before this ticket: everyone ahead of it, plus itself.
+        need = position + 1 - max(self.bucket.tokens, 0.0)
+        base = self.bucket.wait_time(now)
+        return max(base, need / self.bucket.rate if need > 0 else 0.0)
+
+    # ---------- Public API ----------
+    def acquire(self, user: str | None = None,
+                on_wait: Optional[Callable[[int, float], None]] = None,
+                timeout: float | None = None) -> None:
+        user = (user or "anonymous").strip().lower() or "anonymous"
+        timeout = self.timeout if timeout is None else timeout
+        ticket = _Ticket(user)
+        with self._cond:
+            self._queues.setdefault(user, deque()).append(ticket)
+            self._max_depth = max(self._max_depth, self._depth())
+
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                wait = 0.5
+                if self._head() is ticket and self._inflight < self.max_concurrent:
+                    wait = self.bucket.wait_time(now)
+                    if wait <= 0:
+                        self.bucket.take(now)
+                        self._remove(ticket)
+                        # Rotate: this user goes to the back of the line.
+                        if user in self._queues:
+                            self._queues.move_to_end(user)
+                        self._inflight += 1
+                        self._admitted += 1
+                        self._waits.append(now - ticket.enqueued)
+                        self._cond.notify_all()
+                        return
+                if now - ticket.enqueued > timeout:
+                    self._remove(ticket)
+                    self._timeouts += 1
+                    self._cond.notify_all()
+                    raise QueueTimeout(
+                        f"{self.name}: gave up after waiting {timeout:.0f}s in the request queue."
+                    )
+                order = self._order()
+                position = order.index(ticket) if ticket in order else 0
+                eta = self._eta(position, now)
+                self._cond.wait(timeout=min(max(wait, 0.05), 0.5))
+            if on_wait is not None:
+                try:
+                    on_wait(position, eta)
+                except Exception:
+                    pass
+
+    def release(self) -> None:
+        with self._cond:
+            self._inflight = max(self._inflight - 1, 0)
+            self._cond.notify_all()
+
+    def penalize(self, seconds: float) -> None:
+        """Back off the whole process after the upstream said 429."""
+        with self._cond:
+            self._throttled += 1
+            self.bucket.penalize(seconds, time.monotonic())
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, user: str | None = None,
+             on_wait: Optional[Callable[[int, float], None]] = None,
+             timeout: float | None = None):
+        self.acquire(user, on_wait=on_wait, timeout=timeout)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def status(self, user: str | None = None) -> Dict[str, float]:
+        """Current queue position (0-based, -1 if not queued) and ETA for a user."""
+        user = (user or "anonymous").strip().lower()
+        with self._cond:
+            now = time.monotonic()
+            order = self._order()
+            for i, t in enumerate(order):
+                if t.user == user:
+                    return {"position": i, "eta_s": self._eta(i, now)}
+            return {"position": -1, "eta_s": 0.0}
+
+    def metrics(self) -> Dict[str, float]:
+        with self._cond:
+            waits = sorted(self._waits)
+            def pct(p: float) -> float:
+                if not waits:
+                    return 0.0
+                return waits[min(int(p * len(waits)), len(waits) - 1)]
+            return {
+                "name": self.name,
+                "queue_depth": self._depth(),
+                "max_queue_depth": self._max_depth,
+                "active_users": len(self._queues),
+                "inflight": self._inflight,
+                "admitted": self._admitted,
+                "timeouts": self._timeouts,
+                "throttled_429": self._throttled,
+                "wait_p50_s": pct(0.50),
+                "wait_p95_s": pct(0.95),
+                "wait_max_s": waits[-1] if waits else 0.0,
+                "tokens": round(self.bucket.tokens, 3),
+            }
+
+
+# ---------- Shared limiters ----------
+LLM_LIMITER = FairLimiter(
+    "groq-chat",
+    rate_per_min=_cfg_float("GROQ_RPM", 30.0),
+    burst=_cfg_float("GROQ_BURST", 5.0),
+    max_concurrent=int(_cfg_float("GROQ_MAX_CONCURRENT", 4)),
+    timeout=_cfg_float("GROQ_QUEUE_TIMEOUT", 120.0),
+)
+
+STT_LIMITER = FairLimiter(
+    "groq-stt",
+    rate_per_min=_cfg_float("GROQ_STT_RPM", 20.0),
+    burst=_cfg_float("GROQ_STT_BURST", 3.0),
+    max_concurrent=int(_cfg_float("GROQ_STT_MAX_CONCURRENT", 2)),
+    timeout=_cfg_float("GROQ_QUEUE_TIMEOUT", 120.0),
+)
+
+def limiter_metrics() -> List[Dict[str, float]]:
+    """Snapshot of queue depth / wait-time metrics for every shared limiter."""
+    return [LLM_LIMITER.metrics(), STT_LIMITER.metrics()]
+
+def retry_after_seconds(resp, default: float = 2.0) -> float:
+    """Parse a Retry-After header (seconds) from a 429 response."""
+    try:
+        return max(float(resp.headers.get("retry-after", default)), 0.0)
+    except (TypeError, ValueError):
+        return default
@@ -1,14 +1,33 @@
 # modules/speech.py
 import os
 import io
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import inspect
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Dict, Iterator, NamedTuple
 import requests
+import soundfile as sf
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from dotenv import load_dotenv
 
+from modules.ratelimit import STT_LIMITER, retry_after_seconds
+from modules.audio import prepare_for_stt, chunk_for_stt
+from modules import telemetry
+from modules.telemetry import timed
+
 load_dotenv()
 
-# Groq OpenAI-compatible transcription endpoint
-_GROQ_AUDIO_URL = "https://api.groq.com/openai/v1/audio/transcriptions"
+# Groq OpenAI-compatible transcription endpoint (base overridable via GROQ_BASE_URL)
+_DEFAULT_BASE_URL = "https://api.groq.com/openai/v1"
 
 def _safe_get_secret(key: str):
     try:
@@ -21,30 +40,316 @@ def _safe_get_secret(key: str):
 def _get_groq_key():
     return _safe_get_secret("GROQ_API_KEY") or os.environ.get("GROQ_API_KEY")
 
+def _get_audio_url():
+    base = _safe_get_secret("GROQ_BASE_URL") or os.environ.get("GROQ_BASE_URL") or _DEFAULT_BASE_URL
+    return f"{base.rstrip('/')}/audio/transcriptions"
+
 def _get_stt_model():
     # default to whisper-large-v3 (you can change in .env or secrets)
     return _safe_get_secret("GROQ_STT_MODEL") or os.environ.get("GROQ_STT_MODEL", "whisper-large-v3")
 
-def transcribe_audio_bytes(audio_bytes: bytes, filename: str = "audio.wav", response_format: str = "text") -> str:
+def _get_stt_backend_name() -> str:
+    # "groq" (default) or "local" (offline, deterministic; for tests and benchmarks)
+    return (_safe_get_secret("STT_BACKEND") or os.environ.get("STT_BACKEND", "groq")).strip().lower()
+
+# ---------- Transcription cache ----------
+# Streamlit reruns hand back the same uploaded file on every widget interaction;
+# cache transcripts by hash(audio) + model so each recording is sent exactly once.
+# In-memory LRU always; set STT_CACHE_DB (e.g. data/stt_cache.db) to persist.
+
+def audio_digest(audio_bytes: bytes) -> str:
+    return hashlib.sha256(audio_bytes or b"").hexdigest()
+
+class TranscriptCache:
+    def __init__(self, max_items: int = 128, db_path: str | None = None):
+        self.max_items = max(int(max_items), 1)
+        self.db_path = Path(db_path) if db_path else None
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.db_path is not None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._db() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS transcripts (
+                        key TEXT PRIMARY KEY,
+                        transcript TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """)
+
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.isolation_level = None  # autocommit; each statement is its own txn
+        return closing(conn)
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return self._mem[key]
+        if self.db_path is not None:
+            with self._db() as conn:
+                row = conn.execute("SELECT transcript FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._remember(key, row[0])
+                with self._lock:
+                    self.hits += 1
+                return row[0]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, transcript: str) -> None:
+        self._remember(key, transcript)
+        if self.db_path is not None:
+            with self._db() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO transcripts (key, transcript, created_at) VALUES (?,?,?)",
+                    (key, transcript, time.time()),
+                )
+
+    def _remember(self, key: str, transcript: str) -> None:
+        with self._lock:
+            self._mem[key] = transcript
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_items:
+                self._mem.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._mem), "hits": self.hits, "misses": self.misses,
+                    "persisted": self.db_path is not None}
+
+_CACHE = TranscriptCache(
+    max_items=int(_safe_get_secret("STT_CACHE_SIZE") or os.environ.get("STT_CACHE_SIZE", "128")),
+    db_path=_safe_get_secret("STT_CACHE_DB") or os.environ.get("STT_CACHE_DB") or None,
+)
+
+def transcript_cache_stats() -> dict:
+    return _CACHE.stats()
+
+# ---------- Backends ----------
+# A backend turns audio bytes into text. `fmt` is the container/codec
+# extension ("wav", "flac", "ogg", "mp3", ...). The streaming variant splits
+# long audio on silence and yields partial transcripts in order; backends
+# only need to implement `transcribe` to get it. Keyword options a backend
+# doesn't use (user_key, on_wait, ...) are accepted and ignored.
+
+class PartialTranscript(NamedTuple):
+    text: str
+    done: int
+    total: int
+
+class STTBackend(ABC):
+    name = "base"
+
+    @property
+    def model_id(self) -> str:
+        """Identifies the engine/model in cache keys."""
+        return self.name
+
+    @abstractmethod
+    def transcribe(self, audio_bytes: bytes, fmt: str = "wav", **kw) -> str:
+        """Transcribe one request's worth of audio and return the text."""
+
+    def transcribe_stream(self, audio_bytes: bytes, fmt: str = "wav", max_chunk_s: float | None = None,
+                          overlap_s: float = 1.0, max_workers: int | None = None,
+                          **kw) -> Iterator[PartialTranscript]:
+        max_chunk_s = max_chunk_s or float(os.environ.get("STT_CHUNK_SECONDS", "30"))
+        max_workers = max_workers or int(os.environ.get("STT_CHUNK_WORKERS", "3"))
+        chunks = chunk_for_stt(audio_bytes, max_chunk_s=max_chunk_s, overlap_s=overlap_s)
+        if not chunks or len(chunks) == 1:
+            yield PartialTranscript(self.transcribe(audio_bytes, fmt, **kw), 1, 1)
+            return
+        chunk_fmt = "flac" if chunks[0][:4] == b"fLaC" else "ogg"
+        text = ""
+        # Chunk threads inherit the caller's script context, so an on_wait
+        # callback that updates the page still works from inside them
+        ctx = get_script_run_ctx(suppress_warning=True)
+        init = (lambda: add_script_run_ctx(threading.current_thread(), ctx)) if ctx else None
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stt-chunk", initializer=init) as pool:
+            futures = [pool.submit(self.transcribe, c, chunk_fmt, preprocess=False, **kw) for c in chunks]
+            for i, fut in enumerate(futures):
+                text = stitch_transcripts(text, fut.result())
+                yield PartialTranscript(text, i + 1, len(chunks))
+
+class GroqBackend(STTBackend):
+    """Groq's OpenAI-compatible Whisper endpoint, behind the shared STT limiter."""
+    name = "groq"
+
+    @property
+    def model_id(self) -> str:
+        return f"groq:{_get_stt_model()}"
+
+    @timed("speech.groq_request")
+    def transcribe(self, audio_bytes: bytes, fmt: str = "wav", user_key: str | None = None,
+                   on_wait=None, max_retries: int = 2, preprocess: bool = True,
+                   response_format: str = "text") -> str:
+        api_key = _get_groq_key()
+        if not api_key:
+            raise RuntimeError("GROQ_API_KEY not found for transcription.")
+
+        filename = f"audio.{fmt}"
+        if preprocess:
+            audio_bytes, filename = prepare_for_stt(audio_bytes, filename)
+
+        data = {
+            "model": _get_stt_model(),
+            "response_format": response_format,  # "text" -> plain string back
+            # You can add "temperature": 0 here if desired
+        }
+        headers = {"Authorization": f"Bearer {api_key}"}
+
+        for attempt in range(max_retries + 1):
+            files = {
+                "file": (filename, io.BytesIO(audio_bytes), "application/octet-stream"),
+            }
+            with STT_LIMITER.slot(user_key, on_wait=on_wait):
+                resp = requests.post(_get_audio_url(), headers=headers, files=files, data=data, timeout=120)
+            if resp.status_code == 429 and attempt < max_retries:
+                STT_LIMITER.penalize(retry_after_seconds(resp))
+                continue
+            resp.raise_for_status()
+            # For response_format="text" the body is the transcript string
+            return resp.text.strip()
+
+class LocalBackend(STTBackend):
+    """
+    Offline stand-in: no network, same bytes -> same text. The word count tracks
+    the audio duration (~2.5 words/s) so downstream stages see realistic sizes.
+    STT_LOCAL_LATENCY_MS adds a fixed delay per call to mimic a real engine.
+    """
+    name = "local"
+    _WORDS = ("i was walking through a quiet forest when the path turned into an old school "
+              "corridor and water began rising around the desks while someone kept calling my name").split()
+
+    def __init__(self, latency_ms: float | None = None):
+        self.latency_ms = float(os.environ.get("STT_LOCAL_LATENCY_MS", "0") if latency_ms is None else latency_ms)
+
+    def transcribe(self, audio_bytes: bytes, fmt: str = "wav", **kw) -> str:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000.0)
+        try:
+            info = sf.info(io.BytesIO(audio_bytes))
+            seconds = info.frames / float(info.samplerate or 1)
+        except Exception:
+            seconds = len(audio_bytes) / 32_000.0  # assume 16 kHz 16-bit mono
+        seed = int(audio_digest(audio_bytes)[:8], 16)
+        n = max(int(seconds * 2.5), 1)
+        words = [self._WORDS[(seed + i * 7) % len(self._WORDS)] for i in range(n)]
+        return " ".join(words).capitalize() + "."
+
+_BACKENDS: Dict[str, Callable[[], STTBackend]] = {
+    "groq": GroqBackend,
+    "local": LocalBackend,
+}
+_backend_cache: Dict[str, STTBackend] = {}
+
+def register_stt_backend(name: str, factory: Callable[[], STTBackend]) -> None:
+    """Make another engine selectable with STT_BACKEND=<name>."""
+    if inspect.isclass(factory) and inspect.isabstract(factory):
+        missing = ", ".join(sorted(factory.__abstractmethods__))
+        raise TypeError(f"STT backend '{name}' does not implement: {missing}")
+    _BACKENDS[name.strip().lower()] = factory
+    _backend_cache.pop(name.strip().lower(), None)
+
+def get_stt_backend(name: str | None = None) -> STTBackend:
+    name = (name or _get_stt_backend_name())
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown STT_BACKEND '{name}'. Available: {', '.join(sorted(_BACKENDS))}")
+    if name not in _backend_cache:
+        _backend_cache[name] = _BACKENDS[name]()
+    return _backend_cache[name]
+
+# ---------- Public API ----------
+def _fmt_from_filename(filename: str) -> str:
+    return (Path(filename or "audio.wav").suffix.lstrip(".") or "wav").lower()
+
+@timed("speech.transcribe")
+def transcribe_audio_bytes(audio_bytes: bytes, filename: str = "audio.wav", response_format: str = "text",
+                           user_key: str | None = None, on_wait=None, max_retries: int = 2,
+                           use_cache: bool = True, preprocess: bool = True) -> str:
     """
-    Send raw audio bytes to Groq Whisper endpoint and return the transcript (str).
+    Transcribe raw audio bytes with the configured backend (STT_BACKEND, Groq
+    Whisper by default) and return the transcript (str).
     Supported formats: wav, mp3, m4a, webm, etc.
+    Repeated audio is answered from the transcript cache. With `preprocess`,
+    audio is downmixed to 16 kHz mono FLAC/Opus first (see modules.audio).
+    """
+    backend = get_stt_backend()
+    cache_key = f"{audio_digest(audio_bytes)}:{backend.model_id}:{response_format}"
+    if use_cache:
+        hit = _CACHE.get(cache_key)
+        if hit is not None:
+            return hit
+
+    transcript = backend.transcribe(
+        audio_bytes, _fmt_from_filename(filename), preprocess=preprocess, user_key=user_key,
+        on_wait=on_wait, max_retries=max_retries, response_format=response_format,
+    )
+    if use_cache:
+        _CACHE.put(cache_key, transcript)
+    return transcript
+
+def transcribe_long_audio(audio_bytes: bytes, filename: str = "audio.wav",
+                          user_key: str | None = None, max_chunk_s: float | None = None,
+                          overlap_s: float = 1.0, max_workers: int | None = None, on_wait=None
+                          ) -> Iterator[PartialTranscript]:
+    """
+    Split a recording on silence, transcribe the chunks concurrently, and yield
+    (transcript_so_far, chunks_done, chunks_total) each time the next chunk in
+    order is ready. Short or undecodable audio is sent as a single request.
+    `on_wait(position, eta_s)` reports the STT queue while a chunk waits.
+    The whole transcription is timed as the "speech.transcribe" span.
+    """
+    # span() can't be held open across yields, so time the stream by hand
+    t0 = time.perf_counter()
+    try:
+        yield from _transcribe_stream(audio_bytes, filename, user_key, max_chunk_s, overlap_s, max_workers,
+                                      on_wait)
+    except GeneratorExit:
+        raise  # abandoned by the caller: not a finished transcription
+    except Exception:
+        telemetry.record("speech.transcribe", time.perf_counter() - t0, error=True)
+        raise
+    telemetry.record("speech.transcribe", time.perf_counter() - t0)
+
+def _transcribe_stream(audio_bytes: bytes, filename: str, user_key: str | None, max_chunk_s: float | None,
+                       overlap_s: float, max_workers: int | None, on_wait) -> Iterator[PartialTranscript]:
+    backend = get_stt_backend()
+    cache_key = f"{audio_digest(audio_bytes)}:{backend.model_id}:chunked"
+    hit = _CACHE.get(cache_key)
+    if hit is not None:
+        yield PartialTranscript(hit, 1, 1)
+        return
+
+    part = PartialTranscript("", 0, 0)
+    for part in backend.transcribe_stream(audio_bytes, _fmt_from_filename(filename), max_chunk_s=max_chunk_s,
+                                          overlap_s=overlap_s, max_workers=max_workers, user_key=user_key,
+                                          on_wait=on_wait):
+        yield part
+    _CACHE.put(cache_key, part.text)
+
+# ---------- Stitching ----------
+_WORD_RE = re.compile(r"[^\w']+")
+
+def _norm_words(text: str) -> list[str]:
+    return [w for w in _WORD_RE.sub(" ", text.lower()).split() if w]
+
+def stitch_transcripts(prev: str, nxt: str, max_overlap_words: int = 15) -> str:
+    """
+    Join two consecutive chunk transcripts, dropping the words the second one
+    repeats from the overlapping audio (longest suffix/prefix word match).
     """
-    api_key = _get_groq_key()
-    if not api_key:
-        raise RuntimeError("GROQ_API_KEY not found for transcription.")
-
-    files = {
-        "file": (filename, io.BytesIO(audio_bytes), "application/octet-stream"),
-    }
-    data = {
-        "model": _get_stt_model(),
-        "response_format": response_format,  # "text" -> plain string back
-        # You can add "temperature": 0 here if desired
-    }
-    headers = {"Authorization": f"Bearer {api_key}"}
-
-    resp = requests.post(_GROQ_AUDIO_URL, headers=headers, files=files, data=data, timeout=120)
-    resp.raise_for_status()
-    # For response_format="text" the body is the transcript string
-    return resp.text.strip()
+    prev, nxt = (prev or "").strip(), (nxt or "").strip()
+    if not prev or not nxt:
+        return prev or nxt
+    a, b_raw = _norm_words(prev), nxt.split()
+    b = [_norm_words(w)[0] if _norm_words(w) else "" for w in b_raw]
+    for k in range(min(max_overlap_words, len(a), len(b)), 0, -1):
+        if a[-k:] == b[:k]:
+            return (prev + " " + " ".join(b_raw[k:])).strip()
+    return prev + " " + nxt
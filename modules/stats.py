@@ -0,0 +1,206 @@
+# modules/stats.py
+from __future__ import annotations
+import json
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Running statistics that can be updated one dream at a time and merged across
+# users, so pages read a handful of numbers instead of refitting over all rows.
+
+EMOTION_KEYS = ("joy", "sadness", "fear", "anger", "disgust", "surprise", "neutral")
+NEG_AFFECT_KEYS = ("fear", "sadness", "anger", "disgust")
+
+# (x column, y column) pairs whose regression the Insights page shows
+REGRESSION_PAIRS: Tuple[Tuple[str, str], ...] = (
+    ("sleep_hours", "neg_affect"),
+    ("sleep_quality", "neg_affect"),
+)
+
+def neg_affect(emotions: Optional[Dict[str, float]]) -> float:
+    """Negative affect on the percent scale: fear + sadness + anger + disgust."""
+    emotions = emotions or {}
+    return float(sum(float(emotions.get(k, 0) or 0) for k in NEG_AFFECT_KEYS))
+
+def regression_points(
+    sleep_hours: Optional[float],
+    sleep_quality: Optional[float],
+    emotions: Optional[Dict[str, float]],
+) -> Dict[Tuple[str, str], Tuple[float, float]]:
+    """The (x, y) point one dream contributes to each REGRESSION_PAIRS entry (if any)."""
+    values = {"sleep_hours": sleep_hours, "sleep_quality": sleep_quality, "neg_affect": neg_affect(emotions)}
+    out = {}
+    for xc, yc in REGRESSION_PAIRS:
+        x, y = values.get(xc), values.get(yc)
+        if x is None or y is None:
+            continue
+        x, y = float(x), float(y)
+        if np.isfinite(x) and np.isfinite(y):
+            out[(xc, yc)] = (x, y)
+    return out
+
+@dataclass
+class RegressionStats:
+    """
+    Sufficient statistics for a simple y = slope * x + intercept fit, kept in
+    Welford / co-moment form (numerically stable) plus the x range for drawing.
+    """
+    n: int = 0
+    mean_x: float = 0.0
+    mean_y: float = 0.0
+    m2x: float = 0.0
+    m2y: float = 0.0
+    cxy: float = 0.0
+    min_x: Optional[float] = None
+    max_x: Optional[float] = None
+
+    @classmethod
+    def from_arrays(cls, xs: Iterable[float], ys: Iterable[float]) -> "RegressionStats":
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        mask = np.isfinite(xs) & np.isfinite(ys)
+        xs, ys = xs[mask], ys[mask]
+        if xs.size == 0:
+            return cls()
+        mx, my = float(xs.mean()), float(ys.mean())
+        dx, dy = xs - mx, ys - my
+        return cls(
+            n=int(xs.size), mean_x=mx, mean_y=my,
+            m2x=float(dx @ dx), m2y=float(dy @ dy), cxy=float(dx @ dy),
+            min_x=float(xs.min()), max_x=float(xs.max()),
+        )
+
+    def add(self, x: float, y: float) -> "RegressionStats":
+        self.n += 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x += dx / self.n
+        self.mean_y += dy / self.n
+        self.m2x += dx * (x - self.mean_x)
+        self.m2y += dy * (y - self.mean_y)
+        self.cxy += dx * (y - self.mean_y)
+        self.min_x = x if self.min_x is None else min(self.min_x, x)
+        self.max_x = x if self.max_x is None else max(self.max_x, x)
+        return self
+
+    def merge(self, other: "RegressionStats") -> "RegressionStats":
+        """Combine two disjoint samples (e.g. several users) into a new object."""
+        if other.n == 0:
+            return RegressionStats(**asdict(self))
+        if self.n == 0:
+            return RegressionStats(**asdict(other))
+        n = self.n + other.n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        w = self.n * other.n / n
+        return RegressionStats(
+            n=n,
+            mean_x=self.mean_x + dx * other.n / n,
+            mean_y=self.mean_y + dy * other.n / n,
+            m2x=self.m2x + other.m2x + dx * dx * w,
+            m2y=self.m2y + other.m2y + dy * dy * w,
+            cxy=self.cxy + other.cxy + dx * dy * w,
+            min_x=min(self.min_x, other.min_x),
+            max_x=max(self.max_x, other.max_x),
+        )
+
+    @property
+    def slope(self) -> Optional[float]:
+        if self.n < 2 or self.m2x <= 0:
+            return None
+        return self.cxy / self.m2x
+
+    @property
+    def intercept(self) -> Optional[float]:
+        s = self.slope
+        return None if s is None else self.mean_y - s * self.mean_x
+
+    @property
+    def r2(self) -> Optional[float]:
+        if self.slope is None:
+            return None
+        if self.m2y <= 0:
+            return 0.0
+        return min(1.0, self.cxy * self.cxy / (self.m2x * self.m2y))
+
+    def to_dict(self) -> Dict[str, float]:
+        return asdict(self)
+
+# Recent-trend smoothing for OnlineStats: weight halves every this many dreams
+EW_HALFLIFE_DREAMS = 7.0
+
+@dataclass
+class OnlineStats:
+    """
+    Per-user running statistics, one entry per field (emotions, neg_affect,
+    sleep_hours, sleep_quality): count, mean and M2 (Welford) plus an
+    exponentially weighted mean of recent values. `n_dreams` counts every
+    logged dream, analyzed or not.
+    """
+    n_dreams: int = 0
+    fields: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    def add(self, name: str, x: Optional[float]) -> None:
+        if x is None:
+            return
+        x = float(x)
+        if not np.isfinite(x):
+            return
+        f = self.fields.setdefault(name, {"count": 0, "mean": 0.0, "m2": 0.0, "ew": x})
+        f["count"] += 1
+        d = x - f["mean"]
+        f["mean"] += d / f["count"]
+        f["m2"] += d * (x - f["mean"])
+        alpha = 1.0 - 0.5 ** (1.0 / EW_HALFLIFE_DREAMS)
+        f["ew"] += alpha * (x - f["ew"])
+
+    def add_dream(self, sleep_hours: Optional[float], sleep_quality: Optional[float]) -> None:
+        """A newly logged dream (sleep fields are known at save time)."""
+        self.n_dreams += 1
+        self.add("sleep_hours", sleep_hours)
+        self.add("sleep_quality", sleep_quality)
+
+    def add_analysis(self, emotions: Optional[Dict[str, float]]) -> None:
+        """A dream whose emotions just became available."""
+        emotions = emotions or {}
+        for k in EMOTION_KEYS:
+            self.add(k, emotions.get(k, 0) or 0)
+        self.add("neg_affect", neg_affect(emotions))
+
+    def replay_ew(self, emotions_in_order: Iterable[Optional[Dict[str, float]]]) -> None:
+        """
+        Recompute the emotion EW means from analyzed dreams oldest first (for
+        an analysis that landed after newer ones). Counts and means are
+        order-independent and left as they are.
+        """
+        scratch = OnlineStats()
+        for emotions in emotions_in_order:
+            scratch.add_analysis(emotions)
+        for name, f in scratch.fields.items():
+            if name in self.fields:
+                self.fields[name]["ew"] = f["ew"]
+
+    def count(self, name: str) -> int:
+        return int(self.fields.get(name, {}).get("count", 0))
+
+    def mean(self, name: str) -> Optional[float]:
+        return self.fields[name]["mean"] if self.count(name) else None
+
+    def variance(self, name: str) -> Optional[float]:
+        c = self.count(name)
+        return self.fields[name]["m2"] / (c - 1) if c > 1 else None
+
+    def ew_mean(self, name: str) -> Optional[float]:
+        return self.fields[name]["ew"] if self.count(name) else None
+
+    def to_json(self) -> str:
+        return json.dumps({"n_dreams": self.n_dreams, "fields": self.fields})
+
+    @classmethod
+    def from_json(cls, raw: Optional[str]) -> "OnlineStats":
+        try:
+            d: Dict[str, Any] = json.loads(raw) if raw else {}
+        except Exception:
+            d = {}
+        return cls(n_dreams=int(d.get("n_dreams", 0)), fields=dict(d.get("fields", {})))
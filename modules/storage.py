@@ -1,22 +1,43 @@
 # modules/storage.py
 from __future__ import annotations
-from sqlalchemy import create_engine, text as sa_text
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import bindparam, create_engine, event, text as sa_text
+import os
 import json
 import pandas as pd
 import numpy as np
+import time
+import random
 from datetime import datetime
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Optional, List, Tuple
+
+from modules.wordfreq import word_counts, corpus_counts
+from modules.labels import normalize_label, normalize_labels, split_tags
+from modules.telemetry import timed
+from modules.stats import RegressionStats, REGRESSION_PAIRS, regression_points, OnlineStats
 
 # Single app DB (auth can remain in data/auth.db from auth.py)
-_DB_PATH = "sqlite:///noctimind.db"
+# NOCTIMIND_DB points benchmarks / load tests at a scratch database file.
+_DB_PATH = f"sqlite:///{os.environ.get('NOCTIMIND_DB', 'noctimind.db')}"
 
+# One pooled connection per concurrent user of the engine (page scripts and the
+# analysis worker run on different threads; a single shared connection would
+# interleave their transactions). WAL lets readers proceed during a write and
+# busy_timeout makes writers wait for the lock instead of failing.
 _engine = create_engine(
     _DB_PATH,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool
+    connect_args={"check_same_thread": False, "timeout": 30},
+    pool_size=8,
+    max_overflow=8,
 )
 
+@event.listens_for(_engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA busy_timeout=30000")
+    cur.close()
+
 # ---------- Schema & Migration ----------
 
 def _column_exists(conn, table: str, column: str) -> bool:
@@ -24,6 +45,20 @@ def _column_exists(conn, table: str, column: str) -> bool:
     cols = {row[1] for row in info}  # (cid, name, type, notnull, dflt_value, pk)
     return column in cols
 
+def _table_exists(conn, table: str) -> bool:
+    return conn.execute(
+        sa_text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :t"), dict(t=table)
+    ).first() is not None
+
+def _loads(raw, default):
+    try:
+        return json.loads(raw) if raw else default
+    except Exception:
+        return default
+
+def _top_emotion(emotions: Optional[Dict[str, float]]) -> str:
+    return max(emotions, key=lambda k: emotions.get(k, 0)) if emotions else "neutral"
+
 def init_db():
     """Create base table (if not present) and ensure user scoping column/index exist."""
     with _engine.begin() as conn:
@@ -58,8 +93,166 @@ def init_db():
         # SQLite supports IF NOT EXISTS for indexes.
         conn.execute(sa_text("CREATE INDEX IF NOT EXISTS idx_dreams_user_email ON dreams(user_email)"))
 
-# Call on import so app has schema ready
-init_db()
+        # LLM analysis state: 'done' | 'pending' | 'failed' (NULL on old rows == done)
+        if not _column_exists(conn, "dreams", "analysis_status"):
+            conn.execute(sa_text("ALTER TABLE dreams ADD COLUMN analysis_status TEXT"))
+
+        # Denormalized top emotion so History can filter in SQL; backfill old rows once
+        if not _column_exists(conn, "dreams", "top_emotion"):
+            conn.execute(sa_text("ALTER TABLE dreams ADD COLUMN top_emotion TEXT"))
+        stale = conn.execute(sa_text("""
+            SELECT id, emotions FROM dreams
+            WHERE top_emotion IS NULL AND COALESCE(analysis_status, 'done') = 'done'
+        """)).all()
+        if stale:
+            conn.execute(
+                sa_text("UPDATE dreams SET top_emotion = :top WHERE id = :id"),
+                [dict(id=i, top=_top_emotion(_loads(e, {}))) for i, e in stale]
+            )
+        # Keyset pagination / date filters walk this index newest-first
+        conn.execute(sa_text(
+            "CREATE INDEX IF NOT EXISTS idx_dreams_user_created ON dreams(user_email, created_at, id)"
+        ))
+
+        # Durable queue of LLM analyses still to run (see modules/jobs.py)
+        conn.execute(sa_text("""
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          dream_id INTEGER NOT NULL,
+          user_email TEXT NOT NULL,
+          status TEXT NOT NULL DEFAULT 'queued',
+          attempts INTEGER NOT NULL DEFAULT 0,
+          next_run_at REAL NOT NULL,
+          locked_until REAL,
+          last_error TEXT,
+          created_at REAL NOT NULL,
+          updated_at REAL NOT NULL
+        )
+        """))
+        conn.execute(sa_text(
+            "CREATE INDEX IF NOT EXISTS idx_analysis_jobs_due ON analysis_jobs(status, next_run_at)"
+        ))
+        conn.execute(sa_text(
+            "CREATE INDEX IF NOT EXISTS idx_analysis_jobs_dream ON analysis_jobs(dream_id)"
+        ))
+
+        # Per-user word counts for the word cloud, maintained on insert/wipe.
+        # word_freq_meta.version changes whenever the counts do (render cache key).
+        conn.execute(sa_text("""
+        CREATE TABLE IF NOT EXISTS word_freqs (
+          user_email TEXT NOT NULL,
+          word TEXT NOT NULL,
+          count INTEGER NOT NULL,
+          PRIMARY KEY (user_email, word)
+        ) WITHOUT ROWID
+        """))
+        conn.execute(sa_text("""
+        CREATE TABLE IF NOT EXISTS word_freq_meta (
+          user_email TEXT PRIMARY KEY,
+          version INTEGER NOT NULL
+        )
+        """))
+
+        # Running regression statistics per user and (x, y) pair (see modules/stats.py)
+        conn.execute(sa_text("""
+        CREATE TABLE IF NOT EXISTS regression_stats (
+          user_email TEXT NOT NULL,
+          x_col TEXT NOT NULL,
+          y_col TEXT NOT NULL,
+          n INTEGER NOT NULL,
+          mean_x REAL NOT NULL,
+          mean_y REAL NOT NULL,
+          m2x REAL NOT NULL,
+          m2y REAL NOT NULL,
+          cxy REAL NOT NULL,
+          min_x REAL,
+          max_x REAL,
+          PRIMARY KEY (user_email, x_col, y_col)
+        )
+        """))
+
+        # One row of running per-user statistics (see modules/stats.OnlineStats)
+        conn.execute(sa_text("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+          user_email TEXT PRIMARY KEY,
+          stats TEXT NOT NULL,
+          updated_at REAL NOT NULL
+        )
+        """))
+
+        # Normalized motif / tag vocabularies with per-dream link tables
+        # (inverted index: label -> dreams). Backfilled once from the JSON /
+        # comma-string columns the first time the link tables are created.
+        backfill = not _table_exists(conn, "dream_tags")
+        for kind, link, fk in (("motifs", "dream_motifs", "motif_id"), ("tags", "dream_tags", "tag_id")):
+            conn.execute(sa_text(f"""
+            CREATE TABLE IF NOT EXISTS {kind} (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              name TEXT NOT NULL UNIQUE
+            )
+            """))
+            conn.execute(sa_text(f"""
+            CREATE TABLE IF NOT EXISTS {link} (
+              dream_id INTEGER NOT NULL,
+              {fk} INTEGER NOT NULL,
+              user_email TEXT NOT NULL,
+              PRIMARY KEY (dream_id, {fk})
+            ) WITHOUT ROWID
+            """))
+            conn.execute(sa_text(
+                f"CREATE INDEX IF NOT EXISTS idx_{link}_user ON {link}(user_email, {fk}, dream_id)"
+            ))
+        if backfill:
+            _backfill_labels(conn)
+
+        # Motif co-occurrence graph: weight = dreams sharing both motifs (a_id < b_id).
+        # motif_graph_meta.version changes with the edges (layout / community cache key).
+        conn.execute(sa_text("""
+        CREATE TABLE IF NOT EXISTS motif_edges (
+          user_email TEXT NOT NULL,
+          a_id INTEGER NOT NULL,
+          b_id INTEGER NOT NULL,
+          weight INTEGER NOT NULL,
+          PRIMARY KEY (user_email, a_id, b_id)
+        ) WITHOUT ROWID
+        """))
+        conn.execute(sa_text("CREATE INDEX IF NOT EXISTS idx_motif_edges_b ON motif_edges(user_email, b_id)"))
+        conn.execute(sa_text("""
+        CREATE TABLE IF NOT EXISTS motif_graph_meta (
+          user_email TEXT PRIMARY KEY,
+          version INTEGER NOT NULL
+        )
+        """))
+
+        # Materialized archetype counts / first-last seen and a from -> to
+        # transition matrix between consecutive analyzed dreams.
+        # archetype_meta remembers each user's latest archetype (and marks them built).
+        conn.execute(sa_text("""
+        CREATE TABLE IF NOT EXISTS archetype_stats (
+          user_email TEXT NOT NULL,
+          archetype TEXT NOT NULL,
+          count INTEGER NOT NULL,
+          first_seen TEXT NOT NULL,
+          last_seen TEXT NOT NULL,
+          PRIMARY KEY (user_email, archetype)
+        ) WITHOUT ROWID
+        """))
+        conn.execute(sa_text("""
+        CREATE TABLE IF NOT EXISTS archetype_transitions (
+          user_email TEXT NOT NULL,
+          from_archetype TEXT NOT NULL,
+          to_archetype TEXT NOT NULL,
+          count INTEGER NOT NULL,
+          PRIMARY KEY (user_email, from_archetype, to_archetype)
+        ) WITHOUT ROWID
+        """))
+        conn.execute(sa_text("""
+        CREATE TABLE IF NOT EXISTS archetype_meta (
+          user_email TEXT PRIMARY KEY,
+          last_archetype TEXT
+        )
+        """))
+
 
 # ---------- Insert & Fetch (Per-User) ----------
 
@@ -71,6 +264,7 @@ def _to_bytes_float32(arr_like) -> Optional[bytes]:
     except Exception:
         return None
 
+@timed()
 def insert_dream(
     user_email: str,
     text: str,
@@ -81,44 +275,174 @@ def insert_dream(
     archetype: Optional[str],
     reframed: Optional[str],
     emotions: Optional[Dict[str, float]],
-    embedding: Optional[List[float] | np.ndarray]
+    embedding: Optional[List[float] | np.ndarray],
+    analysis_pending: bool = False,
 ) -> int:
     """
     Insert a single dream row for a specific user.
     NOTE: parameter name `text` is preserved to match existing callers.
+    With `analysis_pending=True` the LLM columns are left empty and an analysis
+    job is queued in the same transaction; the worker fills them in later.
+    """
+    if not (user_email and user_email.strip()):
+        raise ValueError("user_email is required for per-user storage.")
+
+    email = user_email.strip().lower()
+    created_at = datetime.utcnow().isoformat(timespec="seconds")
+    with _engine.begin() as conn:
+        return _insert_dream(
+            conn, email, created_at, text, tags, sleep_hours, sleep_quality,
+            motifs, archetype, reframed, emotions, embedding, analysis_pending,
+        )
+
+@timed()
+def insert_dreams(user_email: str, dreams: List[Dict[str, Any]], skip_duplicates: bool = True) -> List[Optional[int]]:
+    """
+    Insert many dreams for one user in a single transaction (bulk import).
+    Each dict takes the insert_dream arguments by name plus an optional
+    `created_at` (ISO, UTC; defaults to now). With `skip_duplicates`, a dream
+    whose (created_at, text) the user already has is skipped and its id is None.
+    Aggregates are updated as for insert_dream; call rebuild_user_aggregates
+    afterwards if the dreams predate ones already stored.
     """
     if not (user_email and user_email.strip()):
         raise ValueError("user_email is required for per-user storage.")
 
+    email = user_email.strip().lower()
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    ids: List[Optional[int]] = []
     with _engine.begin() as conn:
+        existing = set()
+        if skip_duplicates:
+            stamps = sorted({d.get("created_at") or now for d in dreams})
+            if stamps:
+                existing = set(conn.execute(
+                    sa_text("""
+                        SELECT created_at, text FROM dreams
+                        WHERE user_email = :user_email AND created_at IN :stamps
+                    """).bindparams(bindparam("stamps", expanding=True)),
+                    dict(user_email=email, stamps=stamps)
+                ).all())
+        for d in dreams:
+            created_at = d.get("created_at") or now
+            key = (created_at, (d.get("text") or "").strip())
+            if key in existing:
+                ids.append(None)
+                continue
+            existing.add(key)
+            ids.append(_insert_dream(
+                conn, email, created_at, d.get("text"), d.get("tags"),
+                d.get("sleep_hours"), d.get("sleep_quality"), d.get("motifs"), d.get("archetype"),
+                d.get("reframed"), d.get("emotions"), d.get("embedding"), bool(d.get("analysis_pending")),
+            ))
+    return ids
+
+def _insert_dream(conn, email: str, created_at: str, text, tags, sleep_hours, sleep_quality,
+                  motifs, archetype, reframed, emotions, embedding, analysis_pending: bool) -> int:
+    conn.execute(
+        sa_text("""
+        INSERT INTO dreams (
+            created_at, user_email, text, tags, sleep_hours, sleep_quality,
+            motifs, archetype, reframed, emotions, embedding, analysis_status, top_emotion
+        )
+        VALUES (
+            :created_at, :user_email, :text, :tags, :sleep_hours, :sleep_quality,
+            :motifs, :archetype, :reframed, :emotions, :embedding, :analysis_status, :top_emotion
+        )
+        """),
+        dict(
+            created_at=created_at,
+            user_email=email,
+            text=(text or "").strip(),
+            tags=(tags or "").strip() if tags else None,
+            sleep_hours=float(sleep_hours) if sleep_hours is not None else None,
+            sleep_quality=int(sleep_quality) if sleep_quality is not None else None,
+            motifs=json.dumps(motifs or []),
+            archetype=(archetype or "unknown"),
+            reframed=(reframed or ""),
+            emotions=json.dumps(emotions or {}),
+            embedding=_to_bytes_float32(embedding),
+            analysis_status=("pending" if analysis_pending else "done"),
+            top_emotion=(None if analysis_pending else _top_emotion(emotions)),
+        )
+    )
+    res = conn.execute(sa_text("SELECT last_insert_rowid()"))
+    dream_id = int(res.scalar_one())
+    _add_word_counts(conn, email, text or "")
+    _update_user_stats(conn, email, lambda us: us.add_dream(sleep_hours, sleep_quality))
+    _link_labels(conn, "tags", dream_id, email, split_tags(tags))
+    if analysis_pending:
+        _enqueue_analysis(conn, dream_id, email)
+    else:
+        _apply_analysis(conn, dict(
+            id=dream_id, user_email=email, created_at=created_at,
+            sleep_hours=sleep_hours, sleep_quality=sleep_quality,
+            motifs=motifs, archetype=archetype, emotions=emotions,
+        ))
+    return dream_id
+
+@timed()
+def update_dream_analysis(
+    dream_id: int,
+    motifs: Optional[List[str]],
+    archetype: Optional[str],
+    reframed: Optional[str],
+    emotions: Optional[Dict[str, float]],
+) -> None:
+    """Fill in the LLM columns of a dream saved with `analysis_pending=True`."""
+    with _engine.begin() as conn:
+        prev = conn.execute(
+            sa_text("""
+                SELECT id, user_email, created_at, sleep_hours, sleep_quality, analysis_status
+                FROM dreams WHERE id = :id
+            """),
+            dict(id=int(dream_id))
+        ).mappings().first()
         conn.execute(
             sa_text("""
-            INSERT INTO dreams (
-                created_at, user_email, text, tags, sleep_hours, sleep_quality,
-                motifs, archetype, reframed, emotions, embedding
-            )
-            VALUES (
-                :created_at, :user_email, :text, :tags, :sleep_hours, :sleep_quality,
-                :motifs, :archetype, :reframed, :emotions, :embedding
-            )
+                UPDATE dreams
+                SET motifs = :motifs, archetype = :archetype, reframed = :reframed,
+                    emotions = :emotions, top_emotion = :top_emotion, analysis_status = 'done'
+                WHERE id = :id
             """),
             dict(
-                created_at=datetime.utcnow().isoformat(timespec="seconds"),
-                user_email=user_email.strip().lower(),
-                text=(text or "").strip(),
-                tags=(tags or "").strip() if tags else None,
-                sleep_hours=float(sleep_hours) if sleep_hours is not None else None,
-                sleep_quality=int(sleep_quality) if sleep_quality is not None else None,
+                id=int(dream_id),
                 motifs=json.dumps(motifs or []),
                 archetype=(archetype or "unknown"),
                 reframed=(reframed or ""),
                 emotions=json.dumps(emotions or {}),
-                embedding=_to_bytes_float32(embedding)
+                top_emotion=_top_emotion(emotions),
             )
         )
-        res = conn.execute(sa_text("SELECT last_insert_rowid()"))
-        return int(res.scalar_one())
+        # A re-delivered job must not count the same dream twice
+        if prev and (prev["analysis_status"] or "done") != "done":
+            _apply_analysis(conn, dict(prev, motifs=motifs, archetype=archetype, emotions=emotions))
 
+def _apply_analysis(conn, dream: Dict[str, Any]) -> None:
+    """
+    Fold one newly analyzed dream into the per-user aggregates. `dream` has
+    id, user_email, created_at, sleep_hours, sleep_quality, motifs, archetype, emotions.
+    """
+    email = dream["user_email"]
+    _add_regression_points(
+        conn, email, regression_points(dream["sleep_hours"], dream["sleep_quality"], dream["emotions"])
+    )
+    if _later_analysis_exists(conn, email, dream["id"], dream["created_at"]):
+        # Landed after newer dreams (retries / backoff): the EW means must
+        # follow dream order, not the order analyses finish in
+        def fold(us: OnlineStats) -> None:
+            us.add_analysis(dream["emotions"])
+            us.replay_ew(_recent_analyzed_emotions(conn, email))
+    else:
+        def fold(us: OnlineStats) -> None:
+            us.add_analysis(dream["emotions"])
+    _update_user_stats(conn, email, fold)
+    motifs = normalize_labels(dream["motifs"])
+    _link_labels(conn, "motifs", dream["id"], email, motifs)
+    _add_motif_edges(conn, email, motifs)
+    _add_archetype(conn, email, dream["id"], dream["archetype"], dream["created_at"])
+
+@timed()
 def fetch_dreams_dataframe(user_email: str) -> pd.DataFrame:
     """Return all dreams for a given user (ascending by created_at) as a rich dataframe."""
     if not (user_email and user_email.strip()):
@@ -172,6 +496,7 @@ def fetch_dreams_dataframe(user_email: str) -> pd.DataFrame:
     df = pd.DataFrame(data)
     return df
 
+@timed()
 def fetch_dream_by_id(user_email: str, dream_id: int) -> Optional[Dict[str, Any]]:
     """Fetch a single dream by id for a given user."""
     with _engine.begin() as conn:
@@ -204,6 +529,152 @@ def fetch_dream_by_id(user_email: str, dream_id: int) -> Optional[Dict[str, Any]
         r["embedding"] = None
     return r
 
+@timed()
+def fetch_data_version(user_email: str) -> str:
+    """
+    Cheap change token for a user's dreams: moves on every insert, finished
+    analysis and wipe. Pages use it as a cache key for derived structures.
+    """
+    with _engine.begin() as conn:
+        n, max_id, done = conn.execute(
+            sa_text("""
+                SELECT COUNT(*), COALESCE(MAX(id), 0),
+                       SUM(CASE WHEN COALESCE(analysis_status, 'done') = 'done' THEN 1 ELSE 0 END)
+                FROM dreams WHERE user_email = :user_email
+            """),
+            dict(user_email=(user_email or "").strip().lower())
+        ).one()
+    return f"{n}:{max_id}:{done or 0}"
+
+@timed()
+def fetch_insight_rows(user_email: str) -> List[Tuple[str, str, Optional[float], Optional[float]]]:
+    """(created_at, emotions_json, sleep_hours, sleep_quality) of analyzed dreams, oldest first."""
+    with _engine.begin() as conn:
+        return [tuple(r) for r in conn.execute(
+            sa_text("""
+                SELECT created_at, emotions, sleep_hours, sleep_quality FROM dreams
+                WHERE user_email = :user_email AND COALESCE(analysis_status, 'done') = 'done'
+                ORDER BY created_at ASC, id ASC
+            """),
+            dict(user_email=(user_email or "").strip().lower())
+        ).all()]
+
+@timed()
+def fetch_monthly_counts(user_email: str) -> pd.DataFrame:
+    """Dreams per calendar month (UTC) as a DataFrame with columns month, count."""
+    with _engine.begin() as conn:
+        rows = conn.execute(
+            sa_text("""
+                SELECT substr(created_at, 1, 7) AS month, COUNT(*) AS count FROM dreams
+                WHERE user_email = :user_email
+                GROUP BY month ORDER BY month
+            """),
+            dict(user_email=(user_email or "").strip().lower())
+        ).all()
+    return pd.DataFrame(rows, columns=["month", "count"])
+
+@timed()
+def fetch_analysis_status_counts(user_email: str) -> Dict[str, int]:
+    """Dreams per analysis_status ('done' / 'pending' / 'failed'); rows from before the column count as done."""
+    with _engine.begin() as conn:
+        rows = conn.execute(
+            sa_text("""
+                SELECT COALESCE(analysis_status, 'done') AS status, COUNT(*) FROM dreams
+                WHERE user_email = :user_email
+                GROUP BY status
+            """),
+            dict(user_email=(user_email or "").strip().lower())
+        ).all()
+    return {str(status): int(n) for status, n in rows}
+
+# Columns the History list needs per row; the full dream (text, embedding,
+# charts) is fetched with fetch_dream_by_id only when it is opened.
+_PAGE_COLUMNS = """
+    id, created_at, substr(text, 1, 141) AS preview, tags, archetype,
+    top_emotion, analysis_status
+"""
+
+@timed()
+def fetch_dreams_page(
+    user_email: str,
+    limit: int = 20,
+    after: Optional[Tuple[str, int]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    emotion: Optional[str] = None,
+    archetype: Optional[str] = None,
+    tag: Optional[str] = None,
+    motif: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, int]]]:
+    """
+    One page of a user's dreams, newest first, with filters evaluated in SQL.
+    `after` is the keyset cursor returned by the previous page; `start`/`end`
+    are UTC ISO bounds on created_at (end exclusive); `tag` / `motif` match the
+    normalized labels via the link tables. Returns (rows, next_cursor);
+    next_cursor is None on the last page.
+    """
+    if not (user_email and user_email.strip()):
+        raise ValueError("user_email is required.")
+
+    where = ["user_email = :user_email"]
+    params: Dict[str, Any] = dict(user_email=user_email.strip().lower(), n=int(limit) + 1)
+    if after:
+        where.append("(created_at < :c_at OR (created_at = :c_at AND id < :c_id))")
+        params.update(c_at=after[0], c_id=int(after[1]))
+    if start:
+        where.append("created_at >= :start")
+        params["start"] = start
+    if end:
+        where.append("created_at < :end")
+        params["end"] = end
+    if emotion:
+        where.append("top_emotion = :emotion")
+        params["emotion"] = emotion.strip().lower()
+    if archetype:
+        where.append("archetype = :archetype COLLATE NOCASE")
+        params["archetype"] = archetype.strip()
+    if tag and normalize_labels([tag]):
+        where.append(_label_filter_sql("tags", "tag"))
+        params["tag"] = normalize_labels([tag])[0]
+    if motif and normalize_labels([motif]):
+        where.append(_label_filter_sql("motifs", "motif"))
+        params["motif"] = normalize_labels([motif])[0]
+
+    with _engine.begin() as conn:
+        rows = conn.execute(
+            sa_text(f"""
+                SELECT {_PAGE_COLUMNS} FROM dreams
+                WHERE {' AND '.join(where)}
+                ORDER BY created_at DESC, id DESC
+                LIMIT :n
+            """),
+            params
+        ).mappings().all()
+
+    rows = [dict(r) for r in rows]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1]["created_at"], int(rows[-1]["id"]))
+    for r in rows:
+        if len(r["preview"] or "") > 140:
+            r["preview"] = r["preview"][:140] + "…"
+    return rows, next_cursor
+
+@timed()
+def fetch_archetypes(user_email: str) -> List[str]:
+    """Distinct archetypes in a user's analyzed dreams (for filter pickers)."""
+    with _engine.begin() as conn:
+        return [a for a in conn.execute(
+            sa_text("""
+                SELECT DISTINCT archetype FROM dreams
+                WHERE user_email = :user_email AND archetype IS NOT NULL AND archetype != ''
+                ORDER BY archetype
+            """),
+            dict(user_email=(user_email or "").strip().lower())
+        ).scalars().all()]
+
+@timed()
 def wipe_user_data(user_email: str) -> None:
     """Delete all dreams for a given user."""
     if not (user_email and user_email.strip()):
@@ -213,8 +684,767 @@ def wipe_user_data(user_email: str) -> None:
             sa_text("DELETE FROM dreams WHERE user_email = :user_email"),
             dict(user_email=user_email.strip().lower())
         )
+        for table in _PER_USER_TABLES:
+            conn.execute(
+                sa_text(f"DELETE FROM {table} WHERE user_email = :user_email"),
+                dict(user_email=user_email.strip().lower())
+            )
+        _bump_word_freq_version(conn, user_email.strip().lower())
+        _rebuild_user_stats(conn, user_email.strip().lower())
+        _bump_motif_graph_version(conn, user_email.strip().lower())
 
 def wipe_all_data() -> None:
     """Danger: clears the entire dreams table for all users."""
     with _engine.begin() as conn:
         conn.execute(sa_text("DELETE FROM dreams"))
+        for table in _PER_USER_TABLES:
+            conn.execute(sa_text(f"DELETE FROM {table}"))
+        # Keep versions moving forward so cached renders are invalidated.
+        conn.execute(sa_text("UPDATE word_freq_meta SET version = version + 1"))
+        conn.execute(sa_text("UPDATE motif_graph_meta SET version = version + 1"))
+
+@timed()
+def rebuild_user_aggregates(user_email: str) -> None:
+    """
+    Recompute every derived per-user table from the user's dreams (after a
+    bulk import of older dreams, whose order the incremental updates assume).
+    """
+    email = (user_email or "").strip().lower()
+    if not email:
+        return
+    with _engine.begin() as conn:
+        _rebuild_word_counts(conn, email)
+        conn.execute(sa_text("DELETE FROM regression_stats WHERE user_email = :user_email"), dict(user_email=email))
+        _rebuild_regression_stats(conn, email)
+        _rebuild_user_stats(conn, email)
+        _rebuild_motif_edges(conn, email)
+        _rebuild_archetypes(conn, email)
+
+# Tables keyed by user_email whose rows are derived from a user's dreams and
+# must be cleared with them.
+_PER_USER_TABLES = [
+    "analysis_jobs", "word_freqs", "regression_stats", "user_stats",
+    "dream_motifs", "dream_tags", "motif_edges",
+    "archetype_stats", "archetype_transitions", "archetype_meta",
+]
+
+# ---------- Analysis Jobs ----------
+# A small durable work queue: one row per dream whose LLM analysis is still
+# outstanding. Workers claim a due job with a lease (`locked_until`) so a
+# crashed worker's job becomes claimable again once the lease expires.
+
+def _enqueue_analysis(conn, dream_id: int, user_email: str) -> None:
+    now = time.time()
+    conn.execute(
+        sa_text("""
+            INSERT INTO analysis_jobs (dream_id, user_email, status, attempts,
+                                       next_run_at, created_at, updated_at)
+            VALUES (:dream_id, :user_email, 'queued', 0, :now, :now, :now)
+        """),
+        dict(dream_id=int(dream_id), user_email=user_email, now=now)
+    )
+
+@timed()
+def claim_analysis_job(lease_s: float = 120.0) -> Optional[Dict[str, Any]]:
+    """
+    Atomically claim the oldest due job (queued, or running with an expired lease).
+    Returns the job joined with its dream text, or None when nothing is due.
+    """
+    now = time.time()
+    with _engine.begin() as conn:
+        row = conn.execute(
+            sa_text("""
+                SELECT j.id, j.dream_id, j.user_email, j.attempts, d.text
+                FROM analysis_jobs j JOIN dreams d ON d.id = j.dream_id
+                WHERE (j.status = 'queued' AND j.next_run_at <= :now)
+                   OR (j.status = 'running' AND j.locked_until < :now)
+                ORDER BY j.next_run_at ASC
+                LIMIT 1
+            """),
+            dict(now=now)
+        ).mappings().first()
+        if not row:
+            return None
+        claimed = conn.execute(
+            sa_text("""
+                UPDATE analysis_jobs
+                SET status = 'running', locked_until = :lease, updated_at = :now
+                WHERE id = :id AND (status = 'queued' OR locked_until < :now)
+            """),
+            dict(id=row["id"], lease=now + lease_s, now=now)
+        ).rowcount
+    return dict(row) if claimed else None
+
+def complete_analysis_job(job_id: int) -> None:
+    with _engine.begin() as conn:
+        conn.execute(
+            sa_text("""
+                UPDATE analysis_jobs
+                SET status = 'done', locked_until = NULL, updated_at = :now
+                WHERE id = :id
+            """),
+            dict(id=int(job_id), now=time.time())
+        )
+
+def fail_analysis_job(job_id: int, error: str, max_attempts: int = 8,
+                      base_delay_s: float = 5.0, max_delay_s: float = 900.0) -> str:
+    """
+    Record a failed attempt. Reschedules with exponential backoff + jitter, or
+    marks the job 'dead' (and the dream 'failed') after `max_attempts`.
+    Returns the new job status.
+    """
+    now = time.time()
+    with _engine.begin() as conn:
+        row = conn.execute(
+            sa_text("SELECT dream_id, attempts FROM analysis_jobs WHERE id = :id"),
+            dict(id=int(job_id))
+        ).mappings().first()
+        if not row:
+            return "missing"
+        attempts = int(row["attempts"]) + 1
+        if attempts >= max_attempts:
+            status, next_run = "dead", now
+            conn.execute(
+                sa_text("UPDATE dreams SET analysis_status = 'failed' WHERE id = :id"),
+                dict(id=row["dream_id"])
+            )
+        else:
+            delay = min(base_delay_s * (2 ** (attempts - 1)), max_delay_s)
+            status, next_run = "queued", now + delay * random.uniform(0.8, 1.2)
+        conn.execute(
+            sa_text("""
+                UPDATE analysis_jobs
+                SET status = :status, attempts = :attempts, next_run_at = :next_run,
+                    locked_until = NULL, last_error = :err, updated_at = :now
+                WHERE id = :id
+            """),
+            dict(id=int(job_id), status=status, attempts=attempts,
+                 next_run=next_run, err=(error or "")[:500], now=now)
+        )
+    return status
+
+def retry_failed_analyses(user_email: str) -> int:
+    """Re-queue dead jobs for a user (e.g. after an API outage). Returns how many."""
+    now = time.time()
+    email = (user_email or "").strip().lower()
+    with _engine.begin() as conn:
+        n = conn.execute(
+            sa_text("""
+                UPDATE analysis_jobs
+                SET status = 'queued', attempts = 0, next_run_at = :now, updated_at = :now
+                WHERE user_email = :user_email AND status = 'dead'
+            """),
+            dict(user_email=email, now=now)
+        ).rowcount
+        conn.execute(
+            sa_text("""
+                UPDATE dreams SET analysis_status = 'pending'
+                WHERE user_email = :user_email AND analysis_status = 'failed'
+            """),
+            dict(user_email=email)
+        )
+    return int(n or 0)
+
+def pending_analysis_count(user_email: str | None = None) -> int:
+    """Jobs not yet finished (queued or running), optionally for one user."""
+    q = "SELECT COUNT(*) FROM analysis_jobs WHERE status IN ('queued', 'running')"
+    params: Dict[str, Any] = {}
+    if user_email:
+        q += " AND user_email = :user_email"
+        params["user_email"] = user_email.strip().lower()
+    with _engine.begin() as conn:
+        return int(conn.execute(sa_text(q), params).scalar_one())
+
+# ---------- Word Frequencies ----------
+# Incremental per-user token counts (same stopword handling as the word
+# cloud; see modules/wordfreq.py), so History never re-tokenizes the corpus.
+
+def _bump_word_freq_version(conn, email: str) -> None:
+    conn.execute(
+        sa_text("""
+            INSERT INTO word_freq_meta (user_email, version) VALUES (:user_email, 1)
+            ON CONFLICT(user_email) DO UPDATE SET version = version + 1
+        """),
+        dict(user_email=email)
+    )
+
+def _upsert_word_counts(conn, email: str, counts) -> None:
+    if counts:
+        conn.execute(
+            sa_text("""
+                INSERT INTO word_freqs (user_email, word, count) VALUES (:user_email, :word, :count)
+                ON CONFLICT(user_email, word) DO UPDATE SET count = count + excluded.count
+            """),
+            [dict(user_email=email, word=w, count=int(c)) for w, c in counts.items()]
+        )
+
+def _add_word_counts(conn, email: str, text: str) -> None:
+    # A user without a meta row hasn't been backfilled yet; leave it to the
+    # lazy rebuild so pre-existing dreams are counted too.
+    has_meta = conn.execute(
+        sa_text("SELECT 1 FROM word_freq_meta WHERE user_email = :user_email"),
+        dict(user_email=email)
+    ).first()
+    if not has_meta:
+        return
+    _upsert_word_counts(conn, email, word_counts(text))
+    _bump_word_freq_version(conn, email)
+
+def _rebuild_word_counts(conn, email: str) -> None:
+    texts = conn.execute(
+        sa_text("SELECT text FROM dreams WHERE user_email = :user_email"),
+        dict(user_email=email)
+    ).scalars().all()
+    conn.execute(sa_text("DELETE FROM word_freqs WHERE user_email = :user_email"), dict(user_email=email))
+    _upsert_word_counts(conn, email, corpus_counts(texts))
+    _bump_word_freq_version(conn, email)
+
+def word_freq_version(user_email: str) -> int:
+    """Cheap change token for the user's word counts (builds them on first use)."""
+    email = (user_email or "").strip().lower()
+    with _engine.begin() as conn:
+        v = conn.execute(
+            sa_text("SELECT version FROM word_freq_meta WHERE user_email = :user_email"),
+            dict(user_email=email)
+        ).scalar()
+        if v is None:
+            _rebuild_word_counts(conn, email)
+            v = conn.execute(
+                sa_text("SELECT version FROM word_freq_meta WHERE user_email = :user_email"),
+                dict(user_email=email)
+            ).scalar_one()
+    return int(v)
+
+@timed()
+def fetch_word_frequencies(user_email: str, top_n: int = 300) -> Tuple[int, Dict[str, int]]:
+    """Return (version, {word: count}) for the user's `top_n` most frequent words."""
+    email = (user_email or "").strip().lower()
+    version = word_freq_version(email)
+    with _engine.begin() as conn:
+        rows = conn.execute(
+            sa_text("""
+                SELECT word, count FROM word_freqs
+                WHERE user_email = :user_email
+                ORDER BY count DESC LIMIT :n
+            """),
+            dict(user_email=email, n=int(top_n))
+        ).all()
+    return version, {w: int(c) for w, c in rows}
+
+# ---------- Regression Stats ----------
+# Sufficient statistics per (user, x, y) pair, updated as analyses land, so the
+# Insights trendlines don't refit over every row. A user with no rows here has
+# not been built yet and is backfilled from their dreams on first read.
+
+_STATS_FIELDS = ("n", "mean_x", "mean_y", "m2x", "m2y", "cxy", "min_x", "max_x")
+
+def _load_regression_stats(conn, email: str) -> Dict[Tuple[str, str], RegressionStats]:
+    rows = conn.execute(
+        sa_text(f"""
+            SELECT x_col, y_col, {', '.join(_STATS_FIELDS)} FROM regression_stats
+            WHERE user_email = :user_email
+        """),
+        dict(user_email=email)
+    ).mappings().all()
+    return {(r["x_col"], r["y_col"]): RegressionStats(**{f: r[f] for f in _STATS_FIELDS}) for r in rows}
+
+def _save_regression_stats(conn, email: str, stats: Dict[Tuple[str, str], RegressionStats]) -> None:
+    if not stats:
+        return
+    conn.execute(
+        sa_text(f"""
+            INSERT INTO regression_stats (user_email, x_col, y_col, {', '.join(_STATS_FIELDS)})
+            VALUES (:user_email, :x_col, :y_col, {', '.join(':' + f for f in _STATS_FIELDS)})
+            ON CONFLICT(user_email, x_col, y_col) DO UPDATE SET
+              {', '.join(f'{f} = excluded.{f}' for f in _STATS_FIELDS)}
+        """),
+        [dict(user_email=email, x_col=xc, y_col=yc, **st.to_dict()) for (xc, yc), st in stats.items()]
+    )
+
+def _add_regression_points(conn, email: str, points: Dict[Tuple[str, str], Tuple[float, float]]) -> None:
+    stats = _load_regression_stats(conn, email)
+    if not stats or not points:
+        return  # not built yet (lazy backfill will include this dream) or nothing to add
+    for pair, (x, y) in points.items():
+        stats.setdefault(pair, RegressionStats()).add(x, y)
+    _save_regression_stats(conn, email, {p: stats[p] for p in points})
+
+def _rebuild_regression_stats(conn, email: str) -> Dict[Tuple[str, str], RegressionStats]:
+    rows = conn.execute(
+        sa_text("""
+            SELECT sleep_hours, sleep_quality, emotions FROM dreams
+            WHERE user_email = :user_email AND COALESCE(analysis_status, 'done') = 'done'
+        """),
+        dict(user_email=email)
+    ).all()
+    cols: Dict[Tuple[str, str], Tuple[List[float], List[float]]] = {p: ([], []) for p in REGRESSION_PAIRS}
+    for sh, sq, emo in rows:
+        for pair, (x, y) in regression_points(sh, sq, _loads(emo, {})).items():
+            cols[pair][0].append(x)
+            cols[pair][1].append(y)
+    stats = {p: RegressionStats.from_arrays(xs, ys) for p, (xs, ys) in cols.items()}
+    _save_regression_stats(conn, email, stats)
+    return stats
+
+@timed()
+def fetch_regression_stats(user_email: Optional[str] = None) -> Dict[Tuple[str, str], RegressionStats]:
+    """
+    {(x_col, y_col): RegressionStats} for one user, or merged across all users
+    when `user_email` is None.
+    """
+    with _engine.begin() as conn:
+        if user_email:
+            email = user_email.strip().lower()
+            return _load_regression_stats(conn, email) or _rebuild_regression_stats(conn, email)
+
+        unbuilt = conn.execute(sa_text("""
+            SELECT DISTINCT user_email FROM dreams
+            WHERE user_email IS NOT NULL
+              AND user_email NOT IN (SELECT user_email FROM regression_stats)
+        """)).scalars().all()
+        for email in unbuilt:
+            _rebuild_regression_stats(conn, email)
+        rows = conn.execute(
+            sa_text(f"SELECT x_col, y_col, {', '.join(_STATS_FIELDS)} FROM regression_stats")
+        ).mappings().all()
+    merged: Dict[Tuple[str, str], RegressionStats] = {}
+    for r in rows:
+        pair = (r["x_col"], r["y_col"])
+        merged[pair] = merged.get(pair, RegressionStats()).merge(
+            RegressionStats(**{f: r[f] for f in _STATS_FIELDS})
+        )
+    return merged
+
+# ---------- User Stats ----------
+# Running means / variances / EW means per user in a single row, updated in
+# the same transaction as the dream (sleep) and its analysis (emotions).
+
+def _write_user_stats(conn, email: str, us: OnlineStats) -> None:
+    conn.execute(
+        sa_text("""
+            INSERT INTO user_stats (user_email, stats, updated_at) VALUES (:user_email, :stats, :now)
+            ON CONFLICT(user_email) DO UPDATE SET stats = excluded.stats, updated_at = excluded.updated_at
+        """),
+        dict(user_email=email, stats=us.to_json(), now=time.time())
+    )
+
+def _rebuild_user_stats(conn, email: str) -> OnlineStats:
+    rows = conn.execute(
+        sa_text("""
+            SELECT sleep_hours, sleep_quality, emotions, analysis_status FROM dreams
+            WHERE user_email = :user_email
+            ORDER BY created_at ASC, id ASC
+        """),
+        dict(user_email=email)
+    ).all()
+    us = OnlineStats()
+    for sh, sq, emo, status in rows:
+        us.add_dream(sh, sq)
+        if (status or "done") == "done":
+            us.add_analysis(_loads(emo, {}))
+    _write_user_stats(conn, email, us)
+    return us
+
+# Analyzed dreams replayed for the EW means after an out-of-order analysis;
+# at EW_HALFLIFE_DREAMS = 7 anything older carries < 1e-10 of the weight.
+_EW_REPLAY_DREAMS = 256
+
+def _later_analysis_exists(conn, email: str, dream_id: int, created_at: str) -> bool:
+    return conn.execute(
+        sa_text("""
+            SELECT 1 FROM dreams
+            WHERE user_email = :user_email AND COALESCE(analysis_status, 'done') = 'done'
+              AND (created_at > :created_at OR (created_at = :created_at AND id > :id))
+            LIMIT 1
+        """),
+        dict(user_email=email, created_at=created_at, id=int(dream_id))
+    ).first() is not None
+
+def _recent_analyzed_emotions(conn, email: str) -> List[Dict[str, float]]:
+    """Emotions of the user's latest analyzed dreams, oldest first."""
+    rows = conn.execute(
+        sa_text("""
+            SELECT emotions FROM dreams
+            WHERE user_email = :user_email AND COALESCE(analysis_status, 'done') = 'done'
+            ORDER BY created_at DESC, id DESC
+            LIMIT :n
+        """),
+        dict(user_email=email, n=_EW_REPLAY_DREAMS)
+    ).all()
+    return [_loads(r[0], {}) for r in reversed(rows)]
+
+def _update_user_stats(conn, email: str, apply) -> None:
+    raw = conn.execute(
+        sa_text("SELECT stats FROM user_stats WHERE user_email = :user_email"),
+        dict(user_email=email)
+    ).scalar()
+    if raw is None:
+        return  # not built yet; the lazy rebuild will include this dream
+    us = OnlineStats.from_json(raw)
+    apply(us)
+    _write_user_stats(conn, email, us)
+
+@timed()
+def fetch_user_stats(user_email: str) -> OnlineStats:
+    """The user's running statistics (built from their dreams on first use)."""
+    email = (user_email or "").strip().lower()
+    with _engine.begin() as conn:
+        raw = conn.execute(
+            sa_text("SELECT stats FROM user_stats WHERE user_email = :user_email"),
+            dict(user_email=email)
+        ).scalar()
+        return OnlineStats.from_json(raw) if raw is not None else _rebuild_user_stats(conn, email)
+
+# ---------- Motifs & Tags ----------
+# Motif / tag names live once in `motifs` / `tags`; `dream_motifs` /
+# `dream_tags` link them to dreams (indexed by user + label), so frequency and
+# filter queries never decode the JSON / comma-string columns.
+
+_LABEL_TABLES = {"motifs": ("dream_motifs", "motif_id"), "tags": ("dream_tags", "tag_id")}
+
+def _link_labels(conn, kind: str, dream_id: int, email: str, names: List[str]) -> None:
+    if not names:
+        return
+    link, fk = _LABEL_TABLES[kind]
+    conn.execute(sa_text(f"INSERT OR IGNORE INTO {kind} (name) VALUES (:name)"), [dict(name=n) for n in names])
+    conn.execute(
+        sa_text(f"""
+            INSERT OR IGNORE INTO {link} (dream_id, {fk}, user_email)
+            SELECT :dream_id, id, :user_email FROM {kind} WHERE name = :name
+        """),
+        [dict(dream_id=int(dream_id), user_email=email, name=n) for n in names]
+    )
+
+def _backfill_labels(conn) -> None:
+    rows = conn.execute(sa_text("""
+        SELECT id, user_email, tags, motifs, analysis_status FROM dreams WHERE user_email IS NOT NULL
+    """)).all()
+    for dream_id, email, tags, motifs, status in rows:
+        _link_labels(conn, "tags", dream_id, email, split_tags(tags))
+        if (status or "done") == "done":
+            _link_labels(conn, "motifs", dream_id, email, normalize_labels(_loads(motifs, [])))
+
+def _top_labels(kind: str, user_email: str, k: int) -> List[Tuple[str, int]]:
+    link, fk = _LABEL_TABLES[kind]
+    with _engine.begin() as conn:
+        rows = conn.execute(
+            sa_text(f"""
+                SELECT l.name, c.n FROM (
+                    SELECT {fk} AS label_id, COUNT(*) AS n FROM {link}
+                    WHERE user_email = :user_email
+                    GROUP BY {fk}
+                ) c JOIN {kind} l ON l.id = c.label_id
+                ORDER BY c.n DESC, l.name ASC
+                LIMIT :k
+            """),
+            dict(user_email=(user_email or "").strip().lower(), k=int(k))
+        ).all()
+    return [(name, int(n)) for name, n in rows]
+
+@timed()
+def top_motifs(user_email: str, k: int = 10) -> List[Tuple[str, int]]:
+    """The user's `k` most frequent motifs as (motif, dream count)."""
+    return _top_labels("motifs", user_email, k)
+
+@timed()
+def top_tags(user_email: str, k: int = 50) -> List[Tuple[str, int]]:
+    """The user's `k` most used tags as (tag, dream count)."""
+    return _top_labels("tags", user_email, k)
+
+def _label_filter_sql(kind: str, param: str) -> str:
+    """SQL predicate on dreams.id for 'has label :param' (index lookup, no row decoding)."""
+    link, fk = _LABEL_TABLES[kind]
+    return f"""id IN (
+        SELECT dream_id FROM {link}
+        WHERE user_email = :user_email AND {fk} = (SELECT id FROM {kind} WHERE name = :{param})
+    )"""
+
+def fetch_dreams_with_motif(user_email: str, motif: str, limit: int = 20,
+                            after: Optional[Tuple[str, int]] = None):
+    """Dreams mentioning `motif`, newest first (same page shape as fetch_dreams_page)."""
+    return fetch_dreams_page(user_email, limit=limit, after=after, motif=motif)
+
+# ---------- Motif Graph ----------
+# Co-occurrence edges between a user's motifs, bumped per analyzed dream
+# (every pair of its motifs gets +1). modules/motif_graph.py builds the
+# networkx graph from these rows and caches layout/communities by version.
+
+def _bump_motif_graph_version(conn, email: str) -> None:
+    conn.execute(
+        sa_text("""
+            INSERT INTO motif_graph_meta (user_email, version) VALUES (:user_email, 1)
+            ON CONFLICT(user_email) DO UPDATE SET version = version + 1
+        """),
+        dict(user_email=email)
+    )
+
+def _motif_ids(conn, names: List[str]) -> List[int]:
+    if not names:
+        return []
+    ids = conn.execute(
+        sa_text("SELECT id FROM motifs WHERE name IN :names").bindparams(bindparam("names", expanding=True)),
+        dict(names=list(names))
+    ).scalars().all()
+    return sorted(int(i) for i in ids)
+
+def _upsert_motif_edges(conn, email: str, weights: Dict[Tuple[int, int], int]) -> None:
+    if weights:
+        conn.execute(
+            sa_text("""
+                INSERT INTO motif_edges (user_email, a_id, b_id, weight) VALUES (:user_email, :a, :b, :w)
+                ON CONFLICT(user_email, a_id, b_id) DO UPDATE SET weight = weight + excluded.weight
+            """),
+            [dict(user_email=email, a=a, b=b, w=w) for (a, b), w in weights.items()]
+        )
+
+def _add_motif_edges(conn, email: str, motifs: List[str]) -> None:
+    has_meta = conn.execute(
+        sa_text("SELECT 1 FROM motif_graph_meta WHERE user_email = :user_email"),
+        dict(user_email=email)
+    ).first()
+    if not has_meta:
+        return  # not built yet; the lazy rebuild will include this dream
+    ids = _motif_ids(conn, motifs)
+    pairs = {(a, b): 1 for i, a in enumerate(ids) for b in ids[i + 1:]}
+    _upsert_motif_edges(conn, email, pairs)
+    _bump_motif_graph_version(conn, email)
+
+def _rebuild_motif_edges(conn, email: str) -> None:
+    rows = conn.execute(
+        sa_text("SELECT dream_id, motif_id FROM dream_motifs WHERE user_email = :user_email ORDER BY dream_id"),
+        dict(user_email=email)
+    ).all()
+    by_dream: Dict[int, List[int]] = {}
+    for dream_id, motif_id in rows:
+        by_dream.setdefault(dream_id, []).append(int(motif_id))
+    weights: Dict[Tuple[int, int], int] = {}
+    for ids in by_dream.values():
+        ids.sort()
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                weights[(a, b)] = weights.get((a, b), 0) + 1
+    conn.execute(sa_text("DELETE FROM motif_edges WHERE user_email = :user_email"), dict(user_email=email))
+    _upsert_motif_edges(conn, email, weights)
+    _bump_motif_graph_version(conn, email)
+
+def motif_graph_version(user_email: str) -> int:
+    """Change token for the user's motif graph (builds the edges on first use)."""
+    email = (user_email or "").strip().lower()
+    with _engine.begin() as conn:
+        v = conn.execute(
+            sa_text("SELECT version FROM motif_graph_meta WHERE user_email = :user_email"),
+            dict(user_email=email)
+        ).scalar()
+        if v is None:
+            _rebuild_motif_edges(conn, email)
+            v = conn.execute(
+                sa_text("SELECT version FROM motif_graph_meta WHERE user_email = :user_email"),
+                dict(user_email=email)
+            ).scalar_one()
+    return int(v)
+
+@timed()
+def fetch_motif_graph(user_email: str, max_nodes: int = 60) -> Tuple[int, Dict[str, int], List[Tuple[str, str, int]]]:
+    """
+    (version, {motif: dream count}, [(motif_a, motif_b, weight)]) restricted to
+    the user's `max_nodes` most frequent motifs.
+    """
+    email = (user_email or "").strip().lower()
+    version = motif_graph_version(email)
+    nodes = dict(top_motifs(email, k=max_nodes))
+    with _engine.begin() as conn:
+        rows = conn.execute(
+            sa_text("""
+                SELECT ma.name, mb.name, e.weight FROM motif_edges e
+                JOIN motifs ma ON ma.id = e.a_id
+                JOIN motifs mb ON mb.id = e.b_id
+                WHERE e.user_email = :user_email
+            """),
+            dict(user_email=email)
+        ).all()
+    edges = [(a, b, int(w)) for a, b, w in rows if a in nodes and b in nodes]
+    return version, nodes, edges
+
+@timed()
+def motif_neighbors(user_email: str, motif: str, k: int = 5) -> List[Tuple[str, int]]:
+    """Motifs that most often appear together with `motif`, as (motif, shared dreams)."""
+    email = (user_email or "").strip().lower()
+    names = normalize_labels([motif])
+    if not names:
+        return []
+    motif_graph_version(email)  # make sure edges exist
+    with _engine.begin() as conn:
+        rows = conn.execute(
+            sa_text("""
+                WITH m AS (SELECT id FROM motifs WHERE name = :name)
+                SELECT o.name, e.weight FROM motif_edges e JOIN motifs o ON o.id = e.b_id
+                WHERE e.user_email = :user_email AND e.a_id = (SELECT id FROM m)
+                UNION ALL
+                SELECT o.name, e.weight FROM motif_edges e JOIN motifs o ON o.id = e.a_id
+                WHERE e.user_email = :user_email AND e.b_id = (SELECT id FROM m)
+                ORDER BY 2 DESC, 1 ASC
+                LIMIT :k
+            """),
+            dict(user_email=email, name=names[0], k=int(k))
+        ).all()
+    return [(n, int(w)) for n, w in rows]
+
+# ---------- Archetype Stats ----------
+# Per-user archetype counts with first/last seen, plus counts of which
+# archetype followed which (in dream order), maintained as analyses land. A user without an
+# archetype_meta row has not been built yet and is backfilled on first read.
+
+def _upsert_archetypes(conn, email: str, counts: Dict[str, Tuple[int, str, str]],
+                       transitions: Dict[Tuple[str, str], int], last: Optional[str]) -> None:
+    if counts:
+        conn.execute(
+            sa_text("""
+                INSERT INTO archetype_stats (user_email, archetype, count, first_seen, last_seen)
+                VALUES (:user_email, :a, :n, :first, :last)
+                ON CONFLICT(user_email, archetype) DO UPDATE SET
+                  count = count + excluded.count,
+                  first_seen = MIN(first_seen, excluded.first_seen),
+                  last_seen = MAX(last_seen, excluded.last_seen)
+            """),
+            [dict(user_email=email, a=a, n=n, first=f, last=l) for a, (n, f, l) in counts.items()]
+        )
+    if transitions:
+        conn.execute(
+            sa_text("""
+                INSERT INTO archetype_transitions (user_email, from_archetype, to_archetype, count)
+                VALUES (:user_email, :a, :b, :n)
+                ON CONFLICT(user_email, from_archetype, to_archetype) DO UPDATE SET count = count + excluded.count
+            """),
+            [dict(user_email=email, a=a, b=b, n=n) for (a, b), n in transitions.items()]
+        )
+    conn.execute(
+        sa_text("""
+            INSERT INTO archetype_meta (user_email, last_archetype) VALUES (:user_email, :last)
+            ON CONFLICT(user_email) DO UPDATE SET last_archetype = COALESCE(excluded.last_archetype, last_archetype)
+        """),
+        dict(user_email=email, last=last)
+    )
+
+def _archetype_neighbor(conn, email: str, dream_id: int, created_at: str, later: bool) -> Optional[str]:
+    """Archetype of the closest analyzed dream before (or after) this one in (created_at, id) order."""
+    cmp, order = (">", "ASC") if later else ("<", "DESC")
+    rows = conn.execute(
+        sa_text(f"""
+            SELECT archetype FROM dreams
+            WHERE user_email = :user_email AND COALESCE(analysis_status, 'done') = 'done'
+              AND (created_at {cmp} :created_at OR (created_at = :created_at AND id {cmp} :id))
+            ORDER BY created_at {order}, id {order}
+        """),
+        dict(user_email=email, created_at=created_at, id=int(dream_id))
+    )
+    for (raw,) in rows:
+        name = normalize_label(raw)
+        if name and name != "unknown":
+            return name
+    return None
+
+def _add_archetype(conn, email: str, dream_id: int, archetype: Optional[str], created_at: str) -> None:
+    """
+    Count one analyzed dream. Transitions follow dream order, not the order
+    analyses finish in: a dream landing between two others splits their edge.
+    """
+    name = normalize_label(archetype)
+    if not name or name == "unknown":
+        return
+    if conn.execute(
+        sa_text("SELECT 1 FROM archetype_meta WHERE user_email = :user_email"), dict(user_email=email)
+    ).first() is None:
+        return  # not built yet; the lazy rebuild will include this dream
+    prev = _archetype_neighbor(conn, email, dream_id, created_at, later=False)
+    nxt = _archetype_neighbor(conn, email, dream_id, created_at, later=True)
+    transitions: Dict[Tuple[str, str], int] = {}
+    for edge, n in (((prev, nxt), -1), ((prev, name), 1), ((name, nxt), 1)):
+        if edge[0] and edge[1]:
+            transitions[edge] = transitions.get(edge, 0) + n
+    # Only the newest dream moves last_archetype (None keeps the stored one)
+    _upsert_archetypes(conn, email, {name: (1, created_at, created_at)},
+                       {e: n for e, n in transitions.items() if n}, None if nxt else name)
+    if prev and nxt:
+        conn.execute(
+            sa_text("DELETE FROM archetype_transitions WHERE user_email = :user_email AND count <= 0"),
+            dict(user_email=email)
+        )
+
+def _rebuild_archetypes(conn, email: str) -> None:
+    rows = conn.execute(
+        sa_text("""
+            SELECT archetype, created_at FROM dreams
+            WHERE user_email = :user_email AND COALESCE(analysis_status, 'done') = 'done'
+            ORDER BY created_at ASC, id ASC
+        """),
+        dict(user_email=email)
+    ).all()
+    counts: Dict[str, Tuple[int, str, str]] = {}
+    transitions: Dict[Tuple[str, str], int] = {}
+    last = None
+    for raw, created_at in rows:
+        name = normalize_label(raw)
+        if not name or name == "unknown":
+            continue
+        n, first, _ = counts.get(name, (0, created_at, created_at))
+        counts[name] = (n + 1, first, created_at)
+        if last:
+            transitions[(last, name)] = transitions.get((last, name), 0) + 1
+        last = name
+    for table in ("archetype_stats", "archetype_transitions", "archetype_meta"):
+        conn.execute(sa_text(f"DELETE FROM {table} WHERE user_email = :user_email"), dict(user_email=email))
+    _upsert_archetypes(conn, email, counts, transitions, last)
+
+def _ensure_archetypes(conn, email: str) -> None:
+    built = conn.execute(
+        sa_text("SELECT 1 FROM archetype_meta WHERE user_email = :user_email"), dict(user_email=email)
+    ).first()
+    if not built:
+        _rebuild_archetypes(conn, email)
+
+@timed()
+def fetch_archetype_stats(user_email: str) -> pd.DataFrame:
+    """Columns archetype, count, share, first_seen, last_seen; most frequent first."""
+    email = (user_email or "").strip().lower()
+    with _engine.begin() as conn:
+        _ensure_archetypes(conn, email)
+        rows = conn.execute(
+            sa_text("""
+                SELECT archetype, count, first_seen, last_seen FROM archetype_stats
+                WHERE user_email = :user_email
+                ORDER BY count DESC, archetype ASC
+            """),
+            dict(user_email=email)
+        ).all()
+    df = pd.DataFrame(rows, columns=["archetype", "count", "first_seen", "last_seen"])
+    df.insert(2, "share", df["count"] / df["count"].sum() if len(df) else [])
+    return df
+
+@timed()
+def fetch_archetype_transitions(user_email: str, normalize: bool = False) -> pd.DataFrame:
+    """
+    Square from -> to matrix (index = previous archetype, columns = next) of
+    transition counts, or row-normalized probabilities with `normalize=True`.
+    """
+    email = (user_email or "").strip().lower()
+    with _engine.begin() as conn:
+        _ensure_archetypes(conn, email)
+        rows = conn.execute(
+            sa_text("""
+                SELECT from_archetype, to_archetype, count FROM archetype_transitions
+                WHERE user_email = :user_email
+            """),
+            dict(user_email=email)
+        ).all()
+    if not rows:
+        return pd.DataFrame()
+    m = pd.DataFrame(rows, columns=["from", "to", "count"]).pivot(index="from", columns="to", values="count")
+    labels = sorted(set(m.index) | set(m.columns))
+    m = m.reindex(index=labels, columns=labels).fillna(0).astype(int)
+    if normalize:
+        totals = m.sum(axis=1).replace(0, 1)
+        return m.div(totals, axis=0)
+    return m
+
+# Call on import so app has schema ready (after all helpers init_db uses are defined)
+init_db()
@@ -0,0 +1,157 @@
+# modules/telemetry.py
+from __future__ import annotations
+import contextvars
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+# Lightweight in-process timing for hot paths (embedding, Groq, STT, storage,
+# figure builders). Each span name gets a log-bucketed latency histogram
+# (~5% resolution, constant memory) from which p50/p95/p99 are read.
+# Snapshots go to the admin Diagnostics page and, periodically, to the
+# "noctimind.telemetry" logger as one JSON line; slow spans are logged as they end.
+
+log = logging.getLogger("noctimind.telemetry")
+
+def _safe_get_secret(key: str):
+    try:
+        import streamlit as st
+        return st.secrets.get(key)  # type: ignore[attr-defined]
+    except Exception:
+        return None
+
+def _cfg_float(key: str, default: float) -> float:
+    try:
+        return float(_safe_get_secret(key) or os.environ.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+# Spans slower than this are logged individually (0 disables)
+SLOW_SPAN_MS = _cfg_float("NOCTIMIND_SLOW_SPAN_MS", 2000)
+# Interval between JSON snapshot log lines (0 disables)
+EXPORT_INTERVAL_S = _cfg_float("NOCTIMIND_TELEMETRY_LOG_S", 300)
+
+_GROWTH = 1.05
+_LOG_GROWTH = math.log(_GROWTH)
+
+class Histogram:
+    """Latency histogram with geometric buckets; values in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def record(self, seconds: float, error: bool = False) -> None:
+        us = max(seconds * 1e6, 1.0)
+        b = int(math.log(us) / _LOG_GROWTH)
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+        self.count += 1
+        self.errors += int(error)
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return float("nan")
+        rank = q * self.count
+        seen = 0
+        for b in sorted(self.buckets):
+            seen += self.buckets[b]
+            if seen >= rank:
+                # bucket midpoint, clamped to what was actually observed
+                mid = _GROWTH ** (b + 0.5) / 1e6
+                return min(max(mid, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        ms = lambda s: round(s * 1000, 3)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.50)) if self.count else None,
+            "p95_ms": ms(self.quantile(0.95)) if self.count else None,
+            "p99_ms": ms(self.quantile(0.99)) if self.count else None,
+            "max_ms": ms(self.max) if self.count else None,
+            "total_s": round(self.total, 3),
+        }
+
+_hists: Dict[str, Histogram] = {}
+_lock = threading.Lock()
+_since = time.time()
+_last_export = time.monotonic()
+_current: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("noctimind_span", default=None)
+
+def record(name: str, seconds: float, error: bool = False) -> None:
+    """Add one timing to span `name` (for callers that measure themselves)."""
+    global _last_export
+    with _lock:
+        h = _hists.get(name)
+        if h is None:
+            h = _hists[name] = Histogram()
+        h.record(seconds, error)
+        due = EXPORT_INTERVAL_S > 0 and time.monotonic() - _last_export >= EXPORT_INTERVAL_S
+        if due:
+            _last_export = time.monotonic()
+    if due:
+        log_snapshot()
+
+@contextmanager
+def span(name: str, **attrs: Any):
+    """Time the enclosed block under `name`; exceptions are counted and re-raised."""
+    parent = _current.get()
+    token = _current.set(name)
+    t0 = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        _current.reset(token)
+        record(name, dt, error)
+        if SLOW_SPAN_MS and dt * 1000 >= SLOW_SPAN_MS:
+            log.warning(json.dumps({
+                "event": "slow_span", "span": name, "parent": parent,
+                "ms": round(dt * 1000, 1), "error": error, **attrs,
+            }, default=str))
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Decorator form of span(); defaults to "<module>.<function>"."""
+    def deco(fn: Callable) -> Callable:
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def snapshot() -> Dict[str, Any]:
+    """{"since": epoch, "spans": {name: summary}} for every span seen in this process."""
+    with _lock:
+        spans = {k: h.summary() for k, h in sorted(_hists.items())}
+    return {"since": _since, "pid": os.getpid(), "spans": spans}
+
+def log_snapshot() -> None:
+    log.info(json.dumps({"event": "telemetry_snapshot", **snapshot()}, default=str))
+
+def reset() -> None:
+    global _since
+    with _lock:
+        _hists.clear()
+        _since = time.time()
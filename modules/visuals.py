@@ -1,18 +1,24 @@
 # modules/visuals.py
 from __future__ import annotations
+import copy
 import math
+from functools import lru_cache
 from typing import Dict, Iterable, List, Tuple, Any
 
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from wordcloud import WordCloud, STOPWORDS
+from wordcloud import WordCloud
+
+from modules.wordfreq import STOPS, merge_plurals
+from modules.stats import RegressionStats, EMOTION_KEYS
+from modules.telemetry import timed
 
 # ------------------------------------------------------------
 # Emotion configuration
 # ------------------------------------------------------------
-EMOTION_ORDER = ["joy","sadness","fear","anger","disgust","surprise","neutral"]
+EMOTION_ORDER = list(EMOTION_KEYS)
 EMOTION_PALETTE = {
     "joy":      "#F9D423",  # warm yellow
     "sadness":  "#4A90E2",  # blue
@@ -31,13 +37,11 @@ def _ordered_items(emotions: Dict[str, float]) -> List[Tuple[str, float]]:
 # ------------------------------------------------------------
 # Emotion breakdown (Bar) – colored by emotion
 # ------------------------------------------------------------
-def render_emotion_bar(emotions: Dict[str, float]):
-    import streamlit as st
-    data = _ordered_items(emotions)
+def _build_emotion_bar(vals: np.ndarray) -> go.Figure:
     df = pd.DataFrame({
-        "emotion": [k.capitalize() for k, _ in data],
-        "value": [v for _, v in data],
-        "key": [k for k, _ in data],
+        "emotion": [k.capitalize() for k in EMOTION_ORDER],
+        "value": list(vals),
+        "key": list(EMOTION_ORDER),
     })
     colors = [EMOTION_PALETTE[k] for k in df["key"]]
     fig = go.Figure(
@@ -56,36 +60,96 @@ def render_emotion_bar(emotions: Dict[str, float]):
         yaxis_title="%",
         template="plotly_dark",
     )
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+def render_emotion_bar(emotions: Dict[str, float]):
+    import streamlit as st
+    st.plotly_chart(emotion_bar_figure(emotions), use_container_width=True)
 
 # ------------------------------------------------------------
 # Emotion arcs over time – colored by emotion
 # ------------------------------------------------------------
-def emotion_arc_chart(df: pd.DataFrame) -> go.Figure:
+def emotion_matrix(df: pd.DataFrame) -> np.ndarray:
+    """(N, 7) float32 matrix of emotion percentages in EMOTION_ORDER."""
+    if df.empty:
+        return np.zeros((0, len(EMOTION_ORDER)), dtype=np.float32)
+    if all(k in df.columns for k in EMOTION_ORDER):
+        m = df[EMOTION_ORDER]
+    else:
+        recs = [e if isinstance(e, dict) else {} for e in df["emotions"].tolist()]
+        m = pd.DataFrame.from_records(recs, columns=EMOTION_ORDER)
+    return m.apply(pd.to_numeric, errors="coerce").fillna(0.0).to_numpy(dtype=np.float32)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of `n_out` points that
+    keep the visual shape of (x, y). Always keeps the first and last point.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)  # n_out-2 inner buckets
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        # average of the next bucket is the third triangle vertex
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+@timed()
+def emotion_arc_chart(df: pd.DataFrame, resample: str | None = None, rolling: int | None = None,
+                      max_points: int = 2000, webgl_threshold: int = 1000) -> go.Figure:
+    """
+    Emotion percentages over time, one line per emotion.
+      - resample: pandas offset alias ("D", "W", "MS") -> mean per period
+      - rolling: window (in points, after resampling) for a rolling mean
+      - max_points: total point budget; each series is LTTB-downsampled to its share
+      - webgl_threshold: above this many points in total, use Scattergl
+    """
     if df.empty:
         return go.Figure()
-    rows = []
-    for _, r in df.iterrows():
-        row = {"created_at": r["created_at"]}
-        emo = r.get("emotions") or {}
-        for k in EMOTION_ORDER:
-            row[k] = float(emo.get(k, 0.0))
-        rows.append(row)
-    wide = pd.DataFrame(rows)
-    wide["created_at"] = pd.to_datetime(wide["created_at"])
-    long = wide.melt(id_vars="created_at", var_name="emotion", value_name="percent")
-
-    color_map = {k: EMOTION_PALETTE[k] for k in EMOTION_ORDER}
-    fig = px.line(
-        long, x="created_at", y="percent", color="emotion",
-        color_discrete_map=color_map, title="Emotion arcs over time"
-    )
-    fig.update_traces(mode="lines+markers", hovertemplate="%{legendgroup}: %{y:.1f}%<extra></extra>")
+    ts = pd.to_datetime(df["created_at"])
+    wide = pd.DataFrame(emotion_matrix(df), columns=EMOTION_ORDER, index=pd.DatetimeIndex(ts))
+    wide = wide[wide.index.notna()].sort_index()
+    if resample:
+        wide = wide.resample(resample).mean().dropna(how="all")
+    if rolling and rolling > 1:
+        wide = wide.rolling(int(rolling), min_periods=1).mean()
+    if wide.empty:
+        return go.Figure()
+
+    x = wide.index
+    xnum = x.asi8.astype(np.float64)
+    per_series = max(max_points // len(EMOTION_ORDER), 3)
+    total_pts = min(len(x), per_series) * len(EMOTION_ORDER)
+    Trace = go.Scattergl if total_pts > webgl_threshold else go.Scatter
+    mode = "lines+markers" if min(len(x), per_series) <= 200 else "lines"
+
+    traces = []
+    for k in EMOTION_ORDER:
+        yv = wide[k].to_numpy()
+        idx = lttb_indices(xnum, yv, per_series)
+        traces.append(Trace(
+            x=x[idx], y=yv[idx], mode=mode, name=k, legendgroup=k,
+            line=dict(color=EMOTION_PALETTE[k]), marker=dict(color=EMOTION_PALETTE[k]),
+            hovertemplate="%{legendgroup}: %{y:.1f}%<extra></extra>",
+        ))
+    fig = go.Figure(data=traces)
     fig.update_layout(
+        title="Emotion arcs over time",
         height=360, template="plotly_dark",
         margin=dict(l=10, r=10, t=40, b=10),
         xaxis_title="Time", yaxis_title="%",
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, x=0.0)
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, x=0.0, title_text="emotion")
     )
     return fig
 
@@ -94,6 +158,7 @@ def emotion_arc_chart(df: pd.DataFrame) -> go.Figure:
 # ------------------------------------------------------------
 
 
+@timed()
 def wordcloud_image(texts) -> "PIL.Image.Image":
     """
     Build a word cloud from a list of strings.
@@ -108,70 +173,99 @@ def wordcloud_image(texts) -> "PIL.Image.Image":
     else:
         corpus = ""
 
-    # Enrich stopwords – tune as needed
-    extra_stops = {
-        "dream", "dreams", "like", "really", "just", "one", "get", "got",
-        "see", "saw", "go", "went", "feel", "felt", "know", "think",
-        "wake", "woke", "woken", "night", "day", "time"
-    }
-    stops = STOPWORDS.union(extra_stops)
-
     wc = WordCloud(
         width=1000,
         height=500,
         background_color="white",
-        stopwords=stops,
+        stopwords=STOPS,
         collocations=False,   # prevents bigrams like "dream dream"
         prefer_horizontal=0.95,
     )
     return wc.generate(corpus).to_image()
 
 
+@timed()
+def wordcloud_png_from_frequencies(freqs: Dict[str, float]) -> bytes:
+    """
+    Render a word cloud from precomputed {word: count} (see storage.fetch_word_frequencies)
+    and return PNG bytes, which are cheap to cache and hand to st.image.
+    """
+    import io
+    freqs = merge_plurals({w: float(c) for w, c in (freqs or {}).items() if c > 0})
+    if not freqs:
+        return b""
+    wc = WordCloud(
+        width=1000,
+        height=500,
+        background_color="white",
+        prefer_horizontal=0.95,
+    )
+    buf = io.BytesIO()
+    wc.generate_from_frequencies(freqs).to_image().save(buf, format="PNG")
+    return buf.getvalue()
+
+
 # ------------------------------------------------------------
 # Correlation scatter with trendline
 # ------------------------------------------------------------
-def correlation_scatter(df: pd.DataFrame, x: str, y: str, title: str = "Correlation"):
-    import plotly.express as px
-    import plotly.graph_objects as go
-
-    # Base scatter
-    fig = px.scatter(df, x=x, y=y, title=title)
-
-    # Lightweight OLS via NumPy (no statsmodels dependency)
-    try:
-        xs = pd.to_numeric(df[x], errors="coerce").to_numpy()
-        ys = pd.to_numeric(df[y], errors="coerce").to_numpy()
-        mask = np.isfinite(xs) & np.isfinite(ys)
-        xs = xs[mask]
-        ys = ys[mask]
-
-        if xs.size >= 2:
-            # slope, intercept for y = m*x + b
-            slope, intercept = np.polyfit(xs, ys, 1)
-            xline = np.linspace(xs.min(), xs.max(), 100)
-            yline = slope * xline + intercept
-
-            fig.add_trace(
-                go.Scatter(
-                    x=xline,
-                    y=yline,
-                    mode="lines",
-                    name="Trendline",
-                    hovertemplate="Trend: %{y:.3f}<extra></extra>"
-                )
+@timed()
+def correlation_scatter(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    title: str = "Correlation",
+    stats: RegressionStats | None = None,
+    mode: str = "auto",
+    webgl_threshold: int = 1000,
+    density_threshold: int = 20000,
+    bins: int = 40,
+):
+    """
+    Scatter of `y` against `x` with an OLS trendline and R² in the title.
+    - mode="auto" picks SVG points, WebGL points above `webgl_threshold`, and a
+      2D-binned density view above `density_threshold` ("svg" / "webgl" / "density" force one).
+    - `stats` (modules.stats.RegressionStats, e.g. from storage.fetch_regression_stats)
+      supplies the fit; otherwise it is computed from the data in one pass.
+    """
+    xs = pd.to_numeric(df[x], errors="coerce").to_numpy(dtype=float) if x in df else np.array([])
+    ys = pd.to_numeric(df[y], errors="coerce").to_numpy(dtype=float) if y in df else np.array([])
+    mask = np.isfinite(xs) & np.isfinite(ys)
+    xs, ys = xs[mask], ys[mask]
+
+    if mode == "auto":
+        mode = "density" if xs.size > density_threshold else "webgl" if xs.size > webgl_threshold else "svg"
+    hover = f"{x}: "+"%{x}<br>"+f"{y}: "+"%{y}<extra></extra>"
+
+    if mode == "density":
+        fig = go.Figure(go.Histogram2d(
+            x=xs, y=ys, nbinsx=bins, nbinsy=bins,
+            colorscale="Blues", colorbar=dict(title="Dreams"),
+            hovertemplate=f"{x}: "+"%{x}<br>"+f"{y}: "+"%{y}<br>dreams: %{z}<extra></extra>",
+        ))
+    elif mode == "webgl":
+        fig = go.Figure(go.Scattergl(
+            x=xs, y=ys, mode="markers", marker=dict(size=4, opacity=0.5),
+            hovertemplate=hover, showlegend=False,
+        ))
+    else:
+        fig = go.Figure(go.Scatter(x=xs, y=ys, mode="markers", hovertemplate=hover, showlegend=False))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y)
+
+    # Lightweight OLS from sufficient statistics (no statsmodels dependency)
+    fit = stats if stats is not None and stats.n else RegressionStats.from_arrays(xs, ys)
+    if fit.slope is not None:
+        xline = np.linspace(fit.min_x, fit.max_x, 100)
+        fig.add_trace(
+            go.Scatter(
+                x=xline,
+                y=fit.slope * xline + fit.intercept,
+                mode="lines",
+                name="Trendline",
+                hovertemplate="Trend: %{y:.3f}<extra></extra>"
             )
+        )
+        fig.update_layout(title=f"{title} (R²={fit.r2:.3f})")
 
-            # R^2 for context
-            yhat = slope * xs + intercept
-            ss_res = np.sum((ys - yhat) ** 2)
-            ss_tot = np.sum((ys - ys.mean()) ** 2)
-            r2 = 1.0 - ss_res / ss_tot if ss_tot > 0 else 0.0
-            fig.update_layout(title=f"{title} (R²={r2:.3f})")
-    except Exception:
-        # If anything goes wrong, just show the scatter without a line
-        pass
-
-    fig.update_traces(hovertemplate=f"{x}: "+"%{x}<br>"+f"{y}: "+"%{y}<extra></extra>")
     fig.update_layout(plot_bgcolor="#ffffff", paper_bgcolor="#ffffff")
 
     return fig
@@ -179,6 +273,7 @@ def correlation_scatter(df: pd.DataFrame, x: str, y: str, title: str = "Correlat
 # ------------------------------------------------------------
 # Emotion distribution (Pie) – colored by emotion
 # ------------------------------------------------------------
+@timed()
 def emotion_distribution_pie(data) -> "go.Figure":
     """
     Build a pie chart for emotion distribution.
@@ -257,28 +352,17 @@ def emotion_distribution_pie(data) -> "go.Figure":
 # ------------------------------------------------------------
 # Emotion Map (circular) – top emotion blinks
 # ------------------------------------------------------------
-def emotion_node_graph(emotions: Dict[str, float], blink_top: bool = True) -> go.Figure:
-    """
-    Circular node map:
-      - Color = palette per emotion
-      - Size = percentage
-      - Top emotion blinks (opacity + outline width)
-      - ▶ button moved to top-left, with label showing which emotion is highlighted
-    """
-    items = _ordered_items(emotions)
-    keys = [k for k, _ in items]
+def _build_node_graph(vals: np.ndarray, blink_top: bool = True) -> go.Figure:
+    """Full construction of the node map; used once per mode to make the skeleton."""
+    keys = list(EMOTION_ORDER)
     labels = [k.capitalize() for k in keys]
-    vals = np.array([v for _, v in items], dtype=float)
-
-    n = len(items)
-    if n == 0:
-        return go.Figure()
+    n = len(keys)
 
-    # Circle layout
+    # Circle layout (rounded: exact coordinates only bloat the JSON)
     R = 1.0
     angles = np.linspace(0, 2*math.pi, n, endpoint=False)
-    xs = R * np.cos(angles)
-    ys = R * np.sin(angles)
+    xs = np.round(R * np.cos(angles), 4)
+    ys = np.round(R * np.sin(angles), 4)
 
     sizes = 12 + 0.6 * vals   # visual size
     colors = [EMOTION_PALETTE[k] for k in keys]
@@ -391,3 +475,170 @@ def emotion_node_graph(emotions: Dict[str, float], blink_top: bool = True) -> go
 
 
     return fig
+
+# ------------------------------------------------------------
+# Motif co-occurrence network
+# ------------------------------------------------------------
+MOTIF_COMMUNITY_COLORS = ["#0ea5e9", "#ef4444", "#22c55e", "#eab308", "#9B59B6", "#F5A623", "#64748b"]
+
+@timed()
+def motif_network_figure(g, pos: Dict[str, Tuple[float, float]], communities=None) -> go.Figure:
+    """
+    Plotly network for a motif graph (see modules/motif_graph.py):
+      - node size = dreams mentioning the motif, color = community
+      - edge width = dreams sharing both motifs (one trace per width bucket)
+    """
+    fig = go.Figure()
+    if not pos:
+        return fig
+    wmax = max((d.get("weight", 1) for _, _, d in g.edges(data=True)), default=1)
+    buckets: Dict[int, Tuple[List, List]] = {}
+    for a, b, d in g.edges(data=True):
+        w = 1 + round(3 * d.get("weight", 1) / wmax)
+        xs, ys = buckets.setdefault(w, ([], []))
+        xs += [pos[a][0], pos[b][0], None]
+        ys += [pos[a][1], pos[b][1], None]
+    for w, (xs, ys) in sorted(buckets.items()):
+        fig.add_trace(go.Scatter(
+            x=xs, y=ys, mode="lines", line=dict(width=w, color="rgba(100,116,139,0.45)"),
+            hoverinfo="skip", showlegend=False,
+        ))
+
+    group = {}
+    for i, comm in enumerate(communities or []):
+        for n in comm:
+            group[n] = i
+    nodes = list(pos)
+    counts = np.array([g.nodes[n].get("count", 1) for n in nodes], dtype=float)
+    fig.add_trace(go.Scatter(
+        x=[pos[n][0] for n in nodes], y=[pos[n][1] for n in nodes],
+        mode="markers+text", text=nodes, textposition="top center",
+        marker=dict(
+            size=10 + 20 * np.sqrt(counts / counts.max()),
+            color=[MOTIF_COMMUNITY_COLORS[group.get(n, 0) % len(MOTIF_COMMUNITY_COLORS)] for n in nodes],
+            line=dict(color="white", width=1),
+        ),
+        customdata=counts,
+        hovertemplate="%{text}: %{customdata:.0f} dreams<extra></extra>",
+        showlegend=False,
+    ))
+    fig.update_layout(
+        height=480,
+        margin=dict(l=10, r=10, t=10, b=10),
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False, scaleanchor="x", scaleratio=1),
+        plot_bgcolor="#ffffff",
+        paper_bgcolor="#ffffff",
+    )
+    return fig
+
+# ------------------------------------------------------------
+# Archetype transitions (heatmap)
+# ------------------------------------------------------------
+@timed()
+def archetype_transition_heatmap(probs: pd.DataFrame, counts: pd.DataFrame | None = None) -> go.Figure:
+    """Row-normalized from -> to archetype matrix (storage.fetch_archetype_transitions)."""
+    text = counts.to_numpy() if counts is not None else None
+    fig = go.Figure(go.Heatmap(
+        z=probs.to_numpy(),
+        x=[c.capitalize() for c in probs.columns],
+        y=[i.capitalize() for i in probs.index],
+        zmin=0, zmax=1, colorscale="Blues",
+        customdata=text,
+        hovertemplate="%{y} → %{x}: %{z:.0%}"
+            + (" (%{customdata})" if text is not None else "") + "<extra></extra>",
+        colorbar=dict(title="P(next)", tickformat=".0%"),
+    ))
+    fig.update_layout(
+        height=max(300, 40 * len(probs) + 120),
+        margin=dict(l=10, r=10, t=10, b=10),
+        xaxis_title="Next archetype",
+        yaxis_title="Previous archetype",
+        yaxis=dict(autorange="reversed"),
+        plot_bgcolor="#ffffff",
+        paper_bgcolor="#ffffff",
+    )
+    return fig
+
+# ------------------------------------------------------------
+# Figure skeletons + memoization
+# ------------------------------------------------------------
+# History / Log render one node map per dream. Layout, circle geometry, frames
+# and buttons never change, so each figure is built once as a plain dict and
+# later figures are deep copies patched with the 7 values and the top index.
+# Copies are memoized on the whole-percent vector (what the labels show); the
+# exact values are patched into each returned figure, so hovers and sizes
+# keep full precision.
+
+FIGURE_CACHE_SIZE = 512
+
+def _rounded_vector(emotions: Dict[str, float]) -> Tuple[float, ...]:
+    return tuple(float(round(v)) for _, v in _ordered_items(emotions))
+
+def _exact_vector(emotions: Dict[str, float]) -> np.ndarray:
+    return np.array([v for _, v in _ordered_items(emotions)], dtype=float)
+
+@lru_cache(maxsize=None)
+def _node_graph_skeleton(blink_top: bool) -> dict:
+    return _build_node_graph(np.zeros(len(EMOTION_ORDER)), blink_top).to_dict()
+
+def _patch_nodes(trace: dict, vals: np.ndarray, top_idx: int, line_on: float, opacity_on: float | None) -> None:
+    n = len(vals)
+    labels = [k.capitalize() for k in EMOTION_ORDER]
+    trace["text"] = [f"{labels[i]}<br>{vals[i]:.0f}%" for i in range(n)]
+    marker = trace["marker"]
+    marker["size"] = [round(12 + 0.6 * v, 2) for v in vals]
+    marker["line"]["width"] = [line_on if i == top_idx else 1 for i in range(n)]
+    if opacity_on is not None:
+        marker["opacity"] = [opacity_on if i == top_idx else 1.0 for i in range(n)]
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def _node_graph_dict(vec: Tuple[float, ...], top_idx: int, blink_top: bool) -> dict:
+    # top_idx comes from the exact values: rounding can tie the top two
+    vals = np.array(vec, dtype=float)
+    d = copy.deepcopy(_node_graph_skeleton(blink_top))
+    _patch_nodes(d["data"][1], vals, top_idx, 3, None)
+    if blink_top:
+        # frame ON (bold + opaque), frame OFF (dim + thin)
+        _patch_nodes(d["frames"][0]["data"][1], vals, top_idx, 6, 1.0)
+        _patch_nodes(d["frames"][1]["data"][1], vals, top_idx, 1, 0.2)
+    d["layout"]["annotations"][0]["text"] = f"Highlighting: <b>{EMOTION_ORDER[top_idx].capitalize()}</b>"
+    return d
+
+@timed()
+def emotion_node_graph(emotions: Dict[str, float], blink_top: bool = True) -> go.Figure:
+    """
+    Circular node map:
+      - Color = palette per emotion
+      - Size = percentage
+      - Top emotion blinks (opacity + outline width)
+      - ▶ button moved to top-left, with label showing which emotion is highlighted
+    """
+    exact = _exact_vector(emotions)
+    d = copy.deepcopy(_node_graph_dict(_rounded_vector(emotions), int(np.argmax(exact)), bool(blink_top)))
+    sizes = (12 + 0.6 * exact).tolist()
+    for fig_data in [d["data"]] + [f["data"] for f in d.get("frames", [])]:
+        fig_data[1]["marker"]["size"] = list(sizes)
+    # The dict came from a validated figure; skip re-validating the copy
+    return go.Figure(d, _validate=False)
+
+@lru_cache(maxsize=None)
+def _bar_skeleton() -> dict:
+    return _build_emotion_bar(np.zeros(len(EMOTION_ORDER))).to_dict()
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def _emotion_bar_dict(vec: Tuple[float, ...]) -> dict:
+    d = copy.deepcopy(_bar_skeleton())
+    d["data"][0]["y"] = list(vec)
+    return d
+
+@timed()
+def emotion_bar_figure(emotions: Dict[str, float]) -> go.Figure:
+    """Emotion breakdown bar chart (memoized on the whole-percent vector, exact bar heights)."""
+    d = copy.deepcopy(_emotion_bar_dict(_rounded_vector(emotions)))
+    d["data"][0]["y"] = _exact_vector(emotions).tolist()
+    return go.Figure(d, _validate=False)
+
+def figure_cache_stats() -> Dict[str, Any]:
+    info = {"node_graph": _node_graph_dict.cache_info(), "emotion_bar": _emotion_bar_dict.cache_info()}
+    return {k: {"hits": v.hits, "misses": v.misses, "size": v.currsize} for k, v in info.items()}
@@ -0,0 +1,50 @@
+# modules/wordfreq.py
+from __future__ import annotations
+import re
+from collections import Counter
+from typing import Dict, Iterable
+
+from wordcloud import STOPWORDS
+
+# Tokenization shared by the word cloud and the per-user frequency table in
+# storage (word_freqs), so counts maintained incrementally on insert match
+# what WordCloud.generate() would have counted over the whole corpus.
+
+# Enrich stopwords – tune as needed
+EXTRA_STOPWORDS = {
+    "dream", "dreams", "like", "really", "just", "one", "get", "got",
+    "see", "saw", "go", "went", "feel", "felt", "know", "think",
+    "wake", "woke", "woken", "night", "day", "time"
+}
+STOPS = frozenset(w.lower() for w in STOPWORDS.union(EXTRA_STOPWORDS))
+
+# Same token pattern WordCloud uses by default
+_TOKEN_RE = re.compile(r"\w[\w']*")
+
+def word_counts(text: str) -> Counter:
+    """Lower-cased word counts for one text, minus stopwords, numbers and possessive 's."""
+    out: Counter = Counter()
+    for tok in _TOKEN_RE.findall(text or ""):
+        w = tok.lower()
+        if w.endswith("'s"):
+            w = w[:-2]
+        if not w or w.isdigit() or w in STOPS:
+            continue
+        out[w] += 1
+    return out
+
+def corpus_counts(texts: Iterable[str]) -> Counter:
+    total: Counter = Counter()
+    for t in texts:
+        total.update(word_counts(t))
+    return total
+
+def merge_plurals(freqs: Dict[str, float]) -> Dict[str, float]:
+    """Fold 'doors' into 'door' when both occur (WordCloud's normalize_plurals)."""
+    out = dict(freqs)
+    for w in list(out):
+        if w.endswith("s") and not w.endswith("ss") and len(w) > 3:
+            singular = w[:-1]
+            if singular in out:
+                out[singular] += out.pop(w)
+    return out
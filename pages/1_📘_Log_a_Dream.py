@@ -11,7 +11,8 @@ from modules.auth import require_login, current_user
 
 # -------- NLP / LLM / Embeddings --------
 from modules.nlp import get_embedding, ensure_nltk
-from modules.llm import analyze_dream_llm
+from modules.jobs import ensure_worker, wait_for_analysis
+from modules.ratelimit import LLM_LIMITER
 
 # -------- Storage (per-user) --------
 from modules.storage import insert_dream  # expects user_email as first arg (per-user)
@@ -20,7 +21,7 @@ from modules.storage import insert_dream  # expects user_email as first arg (per
 from modules.visuals import render_emotion_bar, emotion_node_graph
 
 # -------- Voice (optional) --------
-from modules.speech import transcribe_audio_bytes
+from modules.speech import transcribe_long_audio, audio_digest
 
 # -------- shadcn helpers --------
 from components.shad_theme import use_page, header, nav_tabs, card
@@ -42,34 +43,78 @@ nav_tabs("Dream Logs")
 # if active == "Reports": st.switch_page("pages/3_🧭_Insights.py")
 
 ensure_nltk()
+ensure_worker()
 
 # -------------------------- Helpers --------------------------
-def _normalize_emotions(emo: Dict[str, float] | None) -> Dict[str, float]:
+def _queue_notice(label: str):
     """
-    Force a consistent 7-emotion distribution as percentages (0..100, sum≈100).
-    Missing keys default to 0, and if total==0 -> neutral=100.
+    Return an `on_wait(position, eta_s)` callback that shows the caller's place in
+    the shared Groq queue while their request waits for a slot.
     """
-    emo = emo or {}
-    keys = ["joy", "sadness", "fear", "anger", "disgust", "surprise", "neutral"]
-    total = 0.0
-    vals = {}
-    for k in keys:
-        try:
-            v = float(emo.get(k, 0.0))
-        except Exception:
-            v = 0.0
-        vals[k] = max(v, 0.0)
-        total += vals[k]
-
-    if total <= 0:
-        return {k: (100.0 if k == "neutral" else 0.0) for k in keys}
-
-    return {k: round((vals[k] / total) * 100.0, 2) for k in keys}
-
-def _safe_list(txt_list):
-    if not isinstance(txt_list, list):
-        return []
-    return [str(x) for x in txt_list if isinstance(x, (str, int, float))]
+    slot = st.empty()
+
+    def _on_wait(position: int, eta_s: float):
+        if position <= 0 and eta_s < 1:
+            slot.caption(f"⏳ {label}: you're next…")
+        else:
+            slot.caption(f"⏳ {label}: #{position + 1} in line · about {eta_s:.0f}s")
+
+    return _on_wait
+
+def _save_and_analyze(text: str, tags: str, sleep_hours: float, sleep_quality: int):
+    """
+    Save the dream + embedding right away with its analysis queued, then wait a
+    little for the background worker so the result can be shown inline.
+    """
+    with st.spinner("Embedding dream..."):
+        emb = get_embedding(text)
+
+    dream_id = insert_dream(
+        user_email=user["email"],
+        text=text,
+        tags=tags,
+        sleep_hours=float(sleep_hours),
+        sleep_quality=int(sleep_quality),
+        motifs=None,
+        archetype=None,
+        reframed=None,
+        emotions=None,
+        embedding=emb,
+        analysis_pending=True,
+    )
+    st.success("Dream saved!")
+
+    notice = _queue_notice("Busy morning")
+
+    def _on_poll(_elapsed: float):
+        q = LLM_LIMITER.status(user["email"])
+        if q["position"] >= 0:
+            notice(int(q["position"]), float(q["eta_s"]))
+
+    with st.spinner("Extracting motifs, emotions, archetype, and reframing (LLM)..."):
+        row = wait_for_analysis(user["email"], dream_id, on_poll=_on_poll)
+
+    if row is None:
+        st.info("Analysis is queued and will appear in **History** as soon as it finishes.")
+        return
+    _render_result(row)
+
+def _render_result(row: Dict):
+    emo = row.get("emotions") or {}
+    motifs = row.get("motifs") or []
+    archetype = row.get("archetype") or "unknown"
+    c1, c2 = st.columns([1, 1])
+    with c1:
+        st.write("**Archetype:**", archetype)
+        st.write("**Motifs:**", ", ".join(motifs) if motifs else "—")
+    with c2:
+        render_emotion_bar(emo)
+
+    st.subheader("Emotion Map")
+    st.plotly_chart(emotion_node_graph(emo), use_container_width=True)
+
+    with st.expander("Therapeutic reframing"):
+        st.write(row.get("reframed") or "")
 
 # -------------------------- TYPE CARD --------------------------
 def _type_card_body():
@@ -95,47 +140,7 @@ def _type_card_body():
         st.error("Please enter your dream text.")
         st.stop()
 
-    # Embedding
-    with st.spinner("Embedding dream..."):
-        emb = get_embedding(text)
-
-    # LLM pipeline
-    with st.spinner("Extracting motifs, emotions, archetype, and reframing (LLM)..."):
-        llm_out = analyze_dream_llm(text)
-
-    # Normalize & sanitize
-    emo = _normalize_emotions(llm_out.get("emotions", {}))
-    motifs = _safe_list(llm_out.get("motifs", []))
-    archetype = str(llm_out.get("archetype", "unknown")) or "unknown"
-    reframed = str(llm_out.get("reframed", ""))
-
-    # Save (PER-USER: pass user email first)
-    _ = insert_dream(
-        user_email=user["email"],
-        text=text,
-        tags=tags,
-        sleep_hours=float(sleep_hours),
-        sleep_quality=int(sleep_quality),
-        motifs=motifs,
-        archetype=archetype,
-        reframed=reframed,
-        emotions=emo,
-        embedding=emb
-    )
-
-    st.success("Dream analyzed and saved!")
-    c1, c2 = st.columns([1, 1])
-    with c1:
-        st.write("**Archetype:**", archetype)
-        st.write("**Motifs:**", ", ".join(motifs) if motifs else "—")
-    with c2:
-        render_emotion_bar(emo)
-
-    st.subheader("Emotion Map")
-    st.plotly_chart(emotion_node_graph(emo), use_container_width=True)
-
-    with st.expander("Therapeutic reframing"):
-        st.write(reframed)
+    _save_and_analyze(text, tags, sleep_hours, sleep_quality)
 
 card("Analyze & Save (Typing)", _type_card_body)
 
@@ -150,6 +155,30 @@ def _voice_card_body():
     def _set_transcript(val: str):
         st.session_state.voice_text = val or ""
 
+    def _is_new_audio(source: str, raw: bytes) -> bool:
+        """
+        The uploader returns the same file on every rerun; only transcribe when the
+        bytes change, so edits in the transcript box aren't overwritten each time.
+        """
+        return st.session_state.get(f"voice_digest_{source}") != audio_digest(raw)
+
+    def _mark_transcribed(source: str, raw: bytes):
+        st.session_state[f"voice_digest_{source}"] = audio_digest(raw)
+
+    def _transcribe(source: str, raw: bytes, filename: str, label: str):
+        """Transcribe (chunked + parallel for long notes), streaming text as chunks land."""
+        preview = st.empty()
+        t = ""
+        with st.spinner(label):
+            for t, done, total in transcribe_long_audio(raw, filename=filename, user_key=user["email"],
+                                                        on_wait=_queue_notice("Transcription queue")):
+                if total > 1:
+                    preview.info(f"**Transcribing… {done}/{total} parts**\n\n{t}")
+        preview.empty()
+        _set_transcript(t)
+        _mark_transcribed(source, raw)
+        st.success("Transcription ready. You can edit it below.")
+
     # A) Microphone recorder (optional component)
     try:
         from streamlit_mic_recorder import mic_recorder
@@ -160,11 +189,8 @@ def _voice_card_body():
             use_container_width=True,
             key="mic1",
         )
-        if audio and audio.get("bytes"):
-            with st.spinner("Transcribing your recording..."):
-                t = transcribe_audio_bytes(audio["bytes"], filename="mic.wav")
-                _set_transcript(t)
-                st.success("Transcription ready. You can edit it below.")
+        if audio and audio.get("bytes") and _is_new_audio("mic", audio["bytes"]):
+            _transcribe("mic", audio["bytes"], "mic.wav", "Transcribing your recording...")
     except Exception:
         st.caption("🎤 Microphone recorder component unavailable. You can still upload a file below.")
 
@@ -177,12 +203,9 @@ def _voice_card_body():
         key="uploader1"
     )
     if up is not None:
-        raw = up.read()
-        if raw:
-            with st.spinner("Transcribing your file..."):
-                t = transcribe_audio_bytes(raw, filename=up.name)
-                _set_transcript(t)
-                st.success("Transcription ready. You can edit it below.")
+        raw = up.getvalue()
+        if raw and _is_new_audio("upload", raw):
+            _transcribe("upload", raw, up.name, "Transcribing your file...")
 
     # C) Edit transcript and analyze
     st.text_area(
@@ -205,42 +228,6 @@ def _voice_card_body():
             st.error("No transcript text to analyze.")
             st.stop()
 
-        with st.spinner("Embedding transcript..."):
-            emb = get_embedding(voice_text)
-
-        with st.spinner("Extracting motifs, emotions, archetype, and reframing (LLM)..."):
-            llm_out = analyze_dream_llm(voice_text)
-
-        emo = _normalize_emotions(llm_out.get("emotions", {}))
-        motifs = _safe_list(llm_out.get("motifs", []))
-        archetype = str(llm_out.get("archetype", "unknown")) or "unknown"
-        reframed = str(llm_out.get("reframed", ""))
-
-        _ = insert_dream(
-            user_email=user["email"],
-            text=voice_text,
-            tags=v_tags,
-            sleep_hours=float(v_sleep_hours),
-            sleep_quality=int(v_sleep_quality),
-            motifs=motifs,
-            archetype=archetype,
-            reframed=reframed,
-            emotions=emo,
-            embedding=emb
-        )
-
-        st.success("Dream analyzed and saved!")
-        c1, c2 = st.columns([1, 1])
-        with c1:
-            st.write("**Archetype:**", archetype)
-            st.write("**Motifs:**", ", ".join(motifs) if motifs else "—")
-        with c2:
-            render_emotion_bar(emo)
-
-        st.subheader("Emotion Map")
-        st.plotly_chart(emotion_node_graph(emo), use_container_width=True)
-
-        with st.expander("Therapeutic reframing"):
-            st.write(reframed)
+        _save_and_analyze(voice_text, v_tags, v_sleep_hours, v_sleep_quality)
 
 card("Analyze & Save (Voice)", _voice_card_body)
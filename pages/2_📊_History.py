@@ -1,6 +1,8 @@
 # pages/2_📊_History.py
 from __future__ import annotations
 
+import json
+
 import streamlit as st
 import pandas as pd
 
@@ -13,12 +15,19 @@ except Exception:
 
 # Auth
 from modules.auth import require_login, current_user
+from modules.profiling import profile_page
 
 # Storage (per-user)
-from modules.storage import fetch_dreams_dataframe
+from modules.storage import (
+    fetch_analysis_status_counts, fetch_data_version, fetch_insight_rows, retry_failed_analyses,
+    fetch_word_frequencies, word_freq_version,
+    fetch_dreams_page, fetch_dream_by_id, fetch_archetypes, top_tags, top_motifs,
+)
+from modules.jobs import ensure_worker
+from modules.labels import normalize_labels
 
 # Visuals
-from modules.visuals import emotion_arc_chart, wordcloud_image, emotion_node_graph
+from modules.visuals import emotion_arc_chart, wordcloud_png_from_frequencies, emotion_node_graph, EMOTION_ORDER
 
 # shadcn helpers
 from components.shad_theme import use_page, header, nav_tabs, card
@@ -31,107 +40,215 @@ require_login("Please sign up or sign in to view this page.")
 user = current_user()
 if not user:
     st.stop()
-
-header()
-nav_tabs("Dream History")
-
-# (Optional routing)
-# if active == "Overview": st.switch_page("app.py")
-# if active == "Reports": st.switch_page("pages/3_🧭_Insights.py")
-# if active == "Notifications": st.switch_page("pages/1_📘_Log_a_Dream.py")
-
-
-# -------------------------- Data --------------------------
-df = fetch_dreams_dataframe(user["email"])
-if df.empty:
-    st.info("No dreams yet. Log one from the **Analyze** page.")
-    st.stop()
-
-# ⏰ Localize created_at to the user's timezone
-import pytz
-from datetime import datetime
-
-try:
-    from streamlit_js_eval import get_user_timezone
-    tzname = get_user_timezone()
-except Exception:
-    tzname = None
-
-if not tzname:
-    tzname = "UTC"  # fallback
-
-USER_TZ = pytz.timezone(tzname)
-
-df["created_at"] = (
-    pd.to_datetime(df["created_at"], utc=True, errors="coerce")
-      .dt.tz_convert(USER_TZ)
-)
-
-
-
-# -------------------------- Overview Charts (card) --------------------------
-def _overview_charts():
-    colA, colB = st.columns([2, 1])
-    with colA:
-        st.plotly_chart(emotion_arc_chart(df), use_container_width=True)
-
-    with colB:
-        texts = df["text"].fillna("").tolist() if "text" in df else []
-        img = wordcloud_image(texts)
-        # ✅ fix deprecation
-        st.image(img, caption="Motif/keyword cloud", use_container_width=True)
-
-card("Overview", _overview_charts)
-
-
-# -------------------------- Dream list (card) --------------------------
-def _history_list():
-    # Render each dream newest->oldest
-    for _, row in df.sort_values("created_at", ascending=False).iterrows():
-        # already tz-aware; format in a friendly way
-        created = pd.to_datetime(row["created_at"]).strftime("%b %d, %Y %I:%M %p")
-        arche = (row.get("archetype") or "Unknown").capitalize()
-        pos_em = (row.get("top_emotion") or "neutral").capitalize()
-
-        # A neat expander per dream acts like your “View” button + detail
-        preview = (row.get("preview") or row.get("text") or "")
-        preview = (preview[:140] + "…") if isinstance(preview, str) and len(preview) > 140 else preview
-
-        with st.expander(f"{created} — {arche} • {pos_em}"):
-            # Top row: quick facts
-            c1, c2, c3 = st.columns([0.55, 0.22, 0.23])
+# Admin-only profiling (?profile=1); the whole page body runs inside it
+with profile_page("history"):
+    header()
+    nav_tabs("Dream History")
+
+    # (Optional routing)
+    # if active == "Overview": st.switch_page("app.py")
+    # if active == "Reports": st.switch_page("pages/3_🧭_Insights.py")
+    # if active == "Notifications": st.switch_page("pages/1_📘_Log_a_Dream.py")
+
+
+    # -------------------------- Data --------------------------
+    # Only counts and the arc-chart input are needed up front; the list below pages
+    # through dreams with keyset cursors instead of loading the whole history.
+    counts = fetch_analysis_status_counts(user["email"])
+    if not sum(counts.values()):
+        st.info("No dreams yet. Log one from the **Analyze** page.")
+        st.stop()
+
+    # LLM analyses still queued / given up on (see modules/jobs.py)
+    ensure_worker()
+    n_pending = counts.get("pending", 0)
+    n_failed = counts.get("failed", 0)
+    if n_pending:
+        st.caption(f"⏳ {n_pending} dream(s) still being analyzed — refresh in a moment.")
+    if n_failed:
+        c1, c2 = st.columns([0.75, 0.25])
+        with c1:
+            st.warning(f"{n_failed} dream(s) could not be analyzed after several attempts.")
+        with c2:
+            if st.button("Retry analysis", use_container_width=True):
+                retry_failed_analyses(user["email"])
+                ensure_worker()
+                st.rerun()
+
+    # ⏰ Localize created_at to the user's timezone
+    import pytz
+    from datetime import datetime
+
+    try:
+        from streamlit_js_eval import get_user_timezone
+        tzname = get_user_timezone()
+    except Exception:
+        tzname = None
+
+    if not tzname:
+        tzname = "UTC"  # fallback
+
+    USER_TZ = pytz.timezone(tzname)
+
+    @st.cache_data(show_spinner=False, max_entries=32)
+    def _arc_frame(email: str, version: str, tz: str) -> pd.DataFrame:
+        # Analyzed dreams only (pending / failed ones have no emotions yet), one
+        # column per emotion; rebuilt only when the user's dreams change (version)
+        rows = fetch_insight_rows(email)
+        frame = pd.DataFrame.from_records(
+            [json.loads(emo or "{}") for _, emo, _, _ in rows], columns=EMOTION_ORDER
+        )
+        frame.insert(0, "created_at", pd.to_datetime([r[0] for r in rows], utc=True, errors="coerce").tz_convert(tz))
+        return frame
+
+    arc_df = _arc_frame(user["email"], fetch_data_version(user["email"]), tzname)
+
+
+
+    # -------------------------- Overview Charts (card) --------------------------
+    def _overview_charts():
+        colA, colB = st.columns([2, 1])
+        with colA:
+            c1, c2 = st.columns(2)
             with c1:
-                st.caption("Preview")
-                st.write(preview or "—")
+                # Long histories default to weekly means so the chart stays light
+                options = {"Every dream": None, "Daily mean": "D", "Weekly mean": "W"}
+                default = "Weekly mean" if len(arc_df) > 365 else "Every dream"
+                res = st.selectbox("Resolution", list(options), index=list(options).index(default), key="arc_res")
             with c2:
-                st.caption("Archetype")
-                st.write(arche or "—")
-            with c3:
-                st.caption("Top Emotion")
-                st.write(pos_em or "—")
-
+                smooth = st.slider("Rolling average (points)", 1, 14, 1, key="arc_roll")
+            st.plotly_chart(emotion_arc_chart(arc_df, resample=options[res], rolling=smooth), use_container_width=True)
+
+        with colB:
+            png = _wordcloud_png(user["email"], word_freq_version(user["email"]))
+            if png:
+                st.image(png, caption="Motif/keyword cloud", use_container_width=True)
+            else:
+                st.caption("Not enough words yet for a cloud.")
+
+    @st.cache_data(show_spinner=False, max_entries=64)
+    def _wordcloud_png(email: str, version: int) -> bytes:
+        # version changes whenever the user's word counts do, so reruns reuse the PNG
+        _, freqs = fetch_word_frequencies(email)
+        return wordcloud_png_from_frequencies(freqs)
+
+    card("Overview", _overview_charts)
+
+
+    # -------------------------- Dream list (card) --------------------------
+    PAGE_SIZE = 20
+
+    def _label_hint(top, fallback: str) -> str:
+        return "e.g. " + (", ".join(name for name, _ in top) or fallback)
+
+    def _list_filters() -> dict:
+        f1, f2, f3, f4, f5 = st.columns([0.24, 0.17, 0.19, 0.2, 0.2])
+        with f1:
+            days = st.date_input("Dates", value=(), key="hist_dates")
+        with f2:
+            emo = st.selectbox("Top emotion", ["Any"] + [e.capitalize() for e in EMOTION_ORDER], key="hist_emo")
+        with f3:
+            arch = st.selectbox("Archetype", ["Any"] + fetch_archetypes(user["email"]), key="hist_arch")
+        # Free text (any of the user's labels, not just the common ones); the
+        # most frequent ones are offered as hints
+        with f4:
+            tag = st.text_input("Tag", placeholder=_label_hint(top_tags(user["email"], k=2), "exam"), key="hist_tag")
+        with f5:
+            motif = st.text_input("Motif", placeholder=_label_hint(top_motifs(user["email"], k=2), "water"),
+                                  key="hist_motif")
+
+        # Local calendar days -> UTC ISO bounds matching how created_at is stored
+        start = end = None
+        days = list(days) if isinstance(days, (list, tuple)) else [days]
+        if days:
+            lo, hi = days[0], days[-1]
+            to_utc = lambda d: USER_TZ.localize(datetime.combine(d, datetime.min.time())).astimezone(pytz.utc)
+            start = to_utc(lo).strftime("%Y-%m-%dT%H:%M:%S")
+            end = (to_utc(hi) + pd.Timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S")
+        return dict(
+            start=start, end=end,
+            emotion=None if emo == "Any" else emo.lower(),
+            archetype=None if arch == "Any" else arch,
+            tag=(normalize_labels([tag]) or [None])[0],
+            motif=(normalize_labels([motif]) or [None])[0],
+        )
+
+    def _dream_detail(dream_id: int):
+        # Only the opened dream pays for the full row + emotion figure
+        row = fetch_dream_by_id(user["email"], dream_id)
+        if not row:
+            st.write("—")
+            return
+        tabs = st.tabs(["Overview", "Emotions", "Archetype", "Reframe"])
+        with tabs[0]:
+            st.write("**Dream Text**")
+            st.write(row.get("text", ""))
+            st.write("**Tags:**", row.get("tags") or "—")
+            st.write(
+                "**Sleep:**",
+                f"{row.get('sleep_hours','—')}h · quality {row.get('sleep_quality','—')}/5",
+            )
+
+        with tabs[1]:
+            st.plotly_chart(
+                emotion_node_graph(row.get("emotions", {})),
+                use_container_width=True
+            )
+
+        with tabs[2]:
+            st.write("**Top Archetype:**", (row.get("archetype") or "—").capitalize())
+
+        with tabs[3]:
+            st.write(row.get("reframed") or "—")
+
+    def _history_list():
+        filters = _list_filters()
+
+        # Keyset cursors of the pages visited so far; any filter change starts over
+        if st.session_state.get("hist_filters") != filters:
+            st.session_state["hist_filters"] = filters
+            st.session_state["hist_cursors"] = [None]
+            st.session_state["hist_open"] = None
+        cursors = st.session_state["hist_cursors"]
+
+        rows, next_cursor = fetch_dreams_page(user["email"], limit=PAGE_SIZE, after=cursors[-1], **filters)
+        if not rows:
+            st.caption("No dreams match these filters.")
+
+        for row in rows:
+            created = (
+                pd.to_datetime(row["created_at"], utc=True).tz_convert(USER_TZ).strftime("%b %d, %Y %I:%M %p")
+            )
+            arche = (row.get("archetype") or "Unknown").capitalize()
+            pos_em = (row.get("top_emotion") or "neutral").capitalize()
+            if row.get("analysis_status") == "pending":
+                arche, pos_em = "⏳ Analysis pending", "—"
+            elif row.get("analysis_status") == "failed":
+                arche, pos_em = "⚠️ Analysis failed", "—"
+
+            is_open = st.session_state.get("hist_open") == row["id"]
+            c1, c2 = st.columns([0.85, 0.15])
+            with c1:
+                st.markdown(f"**{created}** — {arche} • {pos_em}")
+                st.caption(row.get("preview") or "—")
+            with c2:
+                if st.button("Hide" if is_open else "View", key=f"hist_view_{row['id']}", use_container_width=True):
+                    st.session_state["hist_open"] = None if is_open else row["id"]
+                    st.rerun()
+            if is_open:
+                _dream_detail(row["id"])
             st.divider()
 
-            tabs = st.tabs(["Overview", "Emotions", "Archetype", "Reframe"])
-            with tabs[0]:
-                st.write("**Dream Text**")
-                st.write(row.get("text", ""))
-                st.write("**Tags:**", row.get("tags") or "—")
-                st.write(
-                    "**Sleep:**",
-                    f"{row.get('sleep_hours','—')}h · quality {row.get('sleep_quality','—')}/5",
-                )
-
-            with tabs[1]:
-                st.plotly_chart(
-                    emotion_node_graph(row.get("emotions", {})),
-                    use_container_width=True
-                )
-
-            with tabs[2]:
-                st.write("**Top Archetype:**", arche if arche else "—")
-
-            with tabs[3]:
-                st.write(row.get("reframed") or "—")
-
-card("Dream History", _history_list)
+        p1, p2, p3 = st.columns([0.2, 0.6, 0.2])
+        with p1:
+            if len(cursors) > 1 and st.button("← Newer", use_container_width=True):
+                cursors.pop()
+                st.rerun()
+        with p2:
+            st.caption(f"Page {len(cursors)}")
+        with p3:
+            if next_cursor and st.button("Older →", use_container_width=True):
+                cursors.append(next_cursor)
+                st.rerun()
+
+    card("Dream History", _history_list)
@@ -3,14 +3,22 @@ from __future__ import annotations
 
 import streamlit as st
 import pandas as pd
-import numpy as np
 
 # Auth
 from modules.auth import require_login, current_user
+from modules.profiling import profile_page
 
 # Storage & visuals
-from modules.storage import fetch_dreams_dataframe
-from modules.visuals import correlation_scatter, emotion_distribution_pie
+from modules.storage import (
+    fetch_data_version, fetch_insight_rows, fetch_regression_stats, fetch_user_stats,
+    top_motifs, fetch_dreams_with_motif, motif_neighbors,
+    fetch_archetype_stats, fetch_archetype_transitions,
+)
+from modules.motif_graph import motif_graph, motif_layout, motif_communities
+from modules.insights import InsightsEngine
+from modules.visuals import (
+    correlation_scatter, emotion_distribution_pie, motif_network_figure, archetype_transition_heatmap,
+)
 
 # shadcn helpers
 from components.shad_theme import use_page, header, nav_tabs, card
@@ -23,122 +31,163 @@ require_login("Please sign up or sign in to view this page.")
 user = current_user()
 if not user:
     st.stop()
-
-header()
-nav_tabs("Dream Insights")
-
-# (Optional routing)
-# if active == "Overview": st.switch_page("app.py")
-# if active == "Analytics": st.switch_page("pages/2_📊_History.py")
-# if active == "Notifications": st.switch_page("pages/1_📘_Log_a_Dream.py")
-
-# -------------------------- Data --------------------------
-df = fetch_dreams_dataframe(user["email"])
-if df.empty:
-    st.info("Log a dream to see insights.")
-    st.stop()
-
-# Ensure 'emotions' is a dict per row (defensive)
-def _ensure_emodict(val):
-    return val if isinstance(val, dict) else {}
-
-df["emotions"] = df["emotions"].apply(_ensure_emodict)
-
-# Negative affect (percent scale)
-df["neg_affect"] = df.apply(
-    lambda r: float(r["emotions"].get("fear", 0))
-            + float(r["emotions"].get("sadness", 0))
-            + float(r["emotions"].get("anger", 0))
-            + float(r["emotions"].get("disgust", 0)),
-    axis=1
-)
-
-# Numeric safety
-for col in ("sleep_hours", "sleep_quality", "neg_affect"):
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-
-# -------------------------- Emotion Distribution (card) --------------------------
-def _emotion_dist():
-    # Build an average emotion distribution dict across all dreams
-    keys = ["joy","sadness","fear","anger","disgust","surprise","neutral"]
-    sums = {k: 0.0 for k in keys}
-    n = 0
-    for em in df["emotions"]:
-        if isinstance(em, dict):
-            for k in keys:
-                sums[k] += float(em.get(k, 0.0))
-            n += 1
-    avg = {k: round(sums[k] / n, 2) if n else (100.0 if k == "neutral" else 0.0) for k in keys}
-    st.plotly_chart(emotion_distribution_pie(avg), use_container_width=True)
-
-card("Emotion Distribution", _emotion_dist)
-
-# -------------------------- Correlations (card) --------------------------
-def _correlations():
-    c1, c2 = st.columns(2)
-    with c1:
-        d = df.dropna(subset=["sleep_hours", "neg_affect"])
-        if d.empty:
-            st.info("Need sleep hours + emotions to plot this.")
-        else:
+# Admin-only profiling (?profile=1); the whole page body runs inside it
+with profile_page("insights"):
+    header()
+    nav_tabs("Dream Insights")
+
+    # (Optional routing)
+    # if active == "Overview": st.switch_page("app.py")
+    # if active == "Analytics": st.switch_page("pages/2_📊_History.py")
+    # if active == "Notifications": st.switch_page("pages/1_📘_Log_a_Dream.py")
+
+    # -------------------------- Data --------------------------
+    @st.cache_resource(show_spinner=False, max_entries=32)
+    def _engine(email: str, version: str) -> InsightsEngine:
+        # Rebuilt only when the user's dreams change (version); reruns reuse the arrays
+        return InsightsEngine.from_rows(fetch_insight_rows(email))
+
+    eng = _engine(user["email"], fetch_data_version(user["email"]))
+    if eng.n == 0:
+        st.info("Log a dream to see insights.")
+        st.stop()
+
+    # -------------------------- Emotion Distribution (card) --------------------------
+    def _emotion_dist():
+        # Average emotion distribution across all dreams
+        avg = {k: round(v, 2) for k, v in eng.mean_emotions().items()}
+        st.plotly_chart(emotion_distribution_pie(avg), use_container_width=True)
+
+    card("Emotion Distribution", _emotion_dist)
+
+    # -------------------------- Recurring motifs (card) --------------------------
+    def _motifs():
+        top = top_motifs(user["email"], k=10)
+        if not top:
+            st.info("Motifs appear here once your dreams have been analyzed.")
+            return
+        c1, c2 = st.columns([0.6, 0.4])
+        with c1:
+            st.bar_chart(pd.DataFrame(top, columns=["motif", "dreams"]).set_index("motif")["dreams"], horizontal=True)
+        with c2:
+            pick = st.selectbox("Dreams with motif", [m for m, _ in top], key="ins_motif")
+            rows, _ = fetch_dreams_with_motif(user["email"], pick, limit=5)
+            for r in rows:
+                st.caption(f"{r['created_at'][:10]} — {r['preview']}")
+            near = motif_neighbors(user["email"], pick, k=5)
+            if near:
+                st.caption("Often appears with: " + ", ".join(f"{m} ({n})" for m, n in near))
+
+        g = motif_graph(user["email"])[1]
+        if g.number_of_edges():
             st.plotly_chart(
-                correlation_scatter(
-                    d, x="sleep_hours", y="neg_affect",
-                    title="Sleep Hours vs Negative Affect"
-                ),
-                use_container_width=True
-            )
-    with c2:
-        d = df.dropna(subset=["sleep_quality", "neg_affect"])
-        if d.empty:
-            st.info("Need sleep quality + emotions to plot this.")
-        else:
-            st.plotly_chart(
-                correlation_scatter(
-                    d, x="sleep_quality", y="neg_affect",
-                    title="Sleep Quality vs Negative Affect"
-                ),
+                motif_network_figure(g, motif_layout(user["email"]), motif_communities(user["email"])),
                 use_container_width=True
             )
 
-card("Sleep vs Negative Affect", _correlations)
-
-# -------------------------- Personalized feedback (card) --------------------------
-def _feedback():
-    n_samples = len(df)
-    if n_samples < 3:
-        st.info("Add at least 3 dreams to see trend-based feedback.")
-        return
-
-    max_n = int(min(30, n_samples))
-    default_n = int(min(10, n_samples))
-    min_n = 3
-
-    if max_n <= min_n:
-        last_n = max_n
-        st.caption(f"Analyzing last {last_n} dreams.")
-    else:
-        last_n = st.slider("Analyze last N dreams", min_value=min_n, max_value=max_n, value=default_n)
-
-    df_sorted = df.sort_values("created_at", ascending=True)
-    recent = df_sorted.tail(int(last_n))
-    avg_neg = float(recent["neg_affect"].mean()) if not recent.empty else 0.0
-
-    if avg_neg >= 50:
-        st.warning(
-            "You've had a run of **fear/sadness/anger** leaning dreams. "
-            "Try winding down earlier, reduce late screens, or do a brief pre-sleep journaling session."
+    card("Recurring Motifs", _motifs)
+
+    # -------------------------- Archetypes (card) --------------------------
+    def _archetypes():
+        stats = fetch_archetype_stats(user["email"])
+        if stats.empty:
+            st.info("Archetypes appear here once your dreams have been analyzed.")
+            return
+        view = stats.assign(
+            archetype=stats["archetype"].str.capitalize(),
+            share=(stats["share"] * 100).round(0).astype(int).astype(str) + "%",
+            first_seen=stats["first_seen"].str[:10],
+            last_seen=stats["last_seen"].str[:10],
         )
-    elif avg_neg >= 25:
-        st.info(
-            "Mixed emotional tone lately. Light relaxation before bed and consistent sleep times "
-            "may tilt dreams positively."
-        )
-    else:
-        st.success(
-            "Your recent dreams skew calmer/neutral. Keep steady routines and hydration; "
-            "you're on a good trend!"
+        st.dataframe(view, hide_index=True, use_container_width=True)
+
+        counts = fetch_archetype_transitions(user["email"])
+        if counts.empty:
+            st.caption("Transitions show up after two analyzed dreams.")
+            return
+        st.caption("What tends to come next: share of dreams with each archetype after the previous one")
+        st.plotly_chart(
+            archetype_transition_heatmap(fetch_archetype_transitions(user["email"], normalize=True), counts),
+            use_container_width=True
         )
 
-card("Personalized Feedback", _feedback)
+    card("Archetypes", _archetypes)
+
+    # -------------------------- Correlations (card) --------------------------
+    def _correlations():
+        # Trendlines come from running sums kept in storage, not a refit per render
+        fits = fetch_regression_stats(user["email"])
+        df = eng.frame()
+        c1, c2 = st.columns(2)
+        with c1:
+            d = df.dropna(subset=["sleep_hours", "neg_affect"])
+            if d.empty:
+                st.info("Need sleep hours + emotions to plot this.")
+            else:
+                st.plotly_chart(
+                    correlation_scatter(
+                        d, x="sleep_hours", y="neg_affect",
+                        stats=fits.get(("sleep_hours", "neg_affect")),
+                        title="Sleep Hours vs Negative Affect"
+                    ),
+                    use_container_width=True
+                )
+        with c2:
+            d = df.dropna(subset=["sleep_quality", "neg_affect"])
+            if d.empty:
+                st.info("Need sleep quality + emotions to plot this.")
+            else:
+                st.plotly_chart(
+                    correlation_scatter(
+                        d, x="sleep_quality", y="neg_affect",
+                        stats=fits.get(("sleep_quality", "neg_affect")),
+                        title="Sleep Quality vs Negative Affect"
+                    ),
+                    use_container_width=True
+                )
+
+    card("Sleep vs Negative Affect", _correlations)
+
+    # -------------------------- Personalized feedback (card) --------------------------
+    def _feedback():
+        n_samples = eng.n
+        if n_samples < 3:
+            st.info("Add at least 3 dreams to see trend-based feedback.")
+            return
+
+        max_n = int(min(30, n_samples))
+        default_n = int(min(10, n_samples))
+        min_n = 3
+
+        if max_n <= min_n:
+            last_n = max_n
+            st.caption(f"Analyzing last {last_n} dreams.")
+        else:
+            last_n = st.slider("Analyze last N dreams", min_value=min_n, max_value=max_n, value=default_n)
+
+        avg_neg = eng.mean_neg_affect(last_n)
+        us = fetch_user_stats(user["email"])
+        if us.count("neg_affect"):
+            sd = us.variance("neg_affect")
+            st.caption(
+                f"Negative affect — last {last_n}: {avg_neg:.0f}% · recent trend: {us.ew_mean('neg_affect'):.0f}% · "
+                f"all-time: {us.mean('neg_affect'):.0f}%" + (f" ± {sd ** 0.5:.0f}" if sd is not None else "")
+            )
+
+        if avg_neg >= 50:
+            st.warning(
+                "You've had a run of **fear/sadness/anger** leaning dreams. "
+                "Try winding down earlier, reduce late screens, or do a brief pre-sleep journaling session."
+            )
+        elif avg_neg >= 25:
+            st.info(
+                "Mixed emotional tone lately. Light relaxation before bed and consistent sleep times "
+                "may tilt dreams positively."
+            )
+        else:
+            st.success(
+                "Your recent dreams skew calmer/neutral. Keep steady routines and hydration; "
+                "you're on a good trend!"
+            )
+
+    card("Personalized Feedback", _feedback)
@@ -0,0 +1,102 @@
+# pages/5_🩺_Diagnostics.py
+from __future__ import annotations
+
+import json
+import pstats
+
+import streamlit as st
+import pandas as pd
+
+# Auth
+from modules.auth import require_login, current_user, is_admin
+
+# Telemetry & runtime state
+from modules import telemetry
+from modules.ratelimit import limiter_metrics
+from modules.speech import transcript_cache_stats
+from modules.storage import pending_analysis_count
+from modules.visuals import figure_cache_stats
+from modules.profiling import request_profile, saved_profiles, top_functions
+
+# shadcn helpers
+from components.shad_theme import use_page, header, card
+
+
+# -------------------------- Page shell --------------------------
+# Not in the nav tabs; only NOCTIMIND_ADMIN_EMAILS can open it.
+use_page("Diagnostics · NoctiMind", hide_sidebar=True)
+require_login("Please sign up or sign in to view this page.")
+user = current_user()
+if not user or not is_admin(user):
+    st.error("This page is only available to administrators.")
+    st.stop()
+
+header()
+st.markdown("#### 🩺 Diagnostics")
+snap = telemetry.snapshot()
+st.caption(
+    f"Process {snap['pid']} · timings since "
+    f"{pd.Timestamp(snap['since'], unit='s').strftime('%Y-%m-%d %H:%M:%S')} UTC"
+)
+
+# -------------------------- Spans (card) --------------------------
+def _spans():
+    if not snap["spans"]:
+        st.info("No spans recorded yet in this process.")
+        return
+    df = pd.DataFrame.from_dict(snap["spans"], orient="index").rename_axis("span").reset_index()
+    df = df.sort_values("total_s", ascending=False)
+    st.dataframe(df, hide_index=True, use_container_width=True)
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        if st.button("Reset timings", use_container_width=True):
+            telemetry.reset()
+            st.rerun()
+    with c2:
+        if st.button("Write snapshot to log", use_container_width=True):
+            telemetry.log_snapshot()
+            st.toast("Snapshot logged.")
+    with c3:
+        st.download_button(
+            "Download JSON", json.dumps(snap, indent=2, default=str),
+            file_name="noctimind-telemetry.json", mime="application/json", use_container_width=True,
+        )
+
+card("Span latency (p50 / p95 / p99)", _spans)
+
+# -------------------------- Runtime (card) --------------------------
+def _runtime():
+    c1, c2 = st.columns(2)
+    with c1:
+        st.write("**Groq limiters**")
+        st.dataframe(pd.DataFrame(limiter_metrics()), hide_index=True, use_container_width=True)
+        st.write("**Analysis queue:**", f"{pending_analysis_count()} pending")
+    with c2:
+        st.write("**Transcript cache**")
+        st.json(transcript_cache_stats())
+        st.write("**Figure caches**")
+        st.json(figure_cache_stats())
+
+card("Runtime", _runtime)
+
+# -------------------------- Profiling (card) --------------------------
+_PROFILED_PAGES = {"history": "pages/2_📊_History.py", "insights": "pages/3_🧭_Insights.py"}
+
+def _profiling():
+    st.caption("Runs one rerun of the page under cProfile (same as opening it with `?profile=1`).")
+    cols = st.columns(len(_PROFILED_PAGES))
+    for col, (page_id, path) in zip(cols, _PROFILED_PAGES.items()):
+        with col:
+            if st.button(f"Profile next {page_id.capitalize()} run", use_container_width=True):
+                request_profile(page_id)
+                st.switch_page(path)
+
+    files = saved_profiles()
+    if not files:
+        return
+    pick = st.selectbox("Saved profiles", files, format_func=lambda p: p.name)
+    st.dataframe(top_functions(pstats.Stats(str(pick))), hide_index=True, use_container_width=True)
+    st.download_button("Download .prof", pick.read_bytes(), file_name=pick.name, mime="application/octet-stream")
+
+card("Profiling", _profiling)
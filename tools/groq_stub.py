@@ -0,0 +1,219 @@
+# tools/groq_stub.py
+"""
+Local stand-in for the two Groq endpoints NoctiMind uses:
+
+  POST /openai/v1/chat/completions        (modules.llm)
+  POST /openai/v1/audio/transcriptions    (modules.speech)
+
+Replies are deterministic (derived from a hash of the request), with
+configurable latency, error rate, 429 rate, malformed-JSON rate and SSE
+streaming, so the Log page can be load-tested without spending API quota.
+
+Run:
+    python -m tools.groq_stub --port 8787 --latency-ms 400 --jitter-ms 150 --error-rate 0.02
+then point the app at it:
+    GROQ_BASE_URL=http://127.0.0.1:8787/openai/v1 GROQ_API_KEY=stub streamlit run app.py
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from email import policy as email_policy
+from email.parser import BytesParser
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+EMOTIONS = ["joy", "sadness", "fear", "anger", "disgust", "surprise", "neutral"]
+MOTIFS = ["water", "house", "chase", "falling", "school", "teeth", "flight", "door",
+          "forest", "exam", "train", "mirror", "stranger", "ocean", "stairs", "animal"]
+ARCHETYPES = ["chase/fear", "falling/loss", "exam/anxiety", "social/evaluation", "travel/transition"]
+WORDS = ["i", "was", "walking", "through", "a", "forest", "and", "the", "door", "opened",
+         "onto", "an", "ocean", "where", "my", "old", "school", "floated", "quietly"]
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 300.0
+    jitter_ms: float = 100.0
+    stt_latency_ms: float = 800.0
+    error_rate: float = 0.0        # 500s
+    rate_429: float = 0.0          # 429 with Retry-After
+    malformed_rate: float = 0.0    # 200 with non-JSON content
+    stream_chunk_ms: float = 30.0  # delay between SSE chunks when stream=true
+    seed: int = 7
+
+
+def _digest(data: bytes) -> int:
+    return int.from_bytes(hashlib.sha256(data).digest()[:8], "big")
+
+def fake_analysis(text: str) -> dict:
+    """Deterministic analysis JSON for a dream text."""
+    rng = random.Random(_digest(text.encode("utf-8")))
+    weights = [rng.random() ** 2 for _ in EMOTIONS]
+    total = sum(weights) or 1.0
+    return {
+        "motifs": rng.sample(MOTIFS, rng.randint(2, 5)),
+        "archetype": rng.choice(ARCHETYPES),
+        "emotions": {k: round(100.0 * w / total, 2) for k, w in zip(EMOTIONS, weights)},
+        "reframed": "Picture the same scene unfolding slowly, with you safe and in control.",
+    }
+
+def multipart_file(body: bytes, content_type: str) -> bytes:
+    """The `file` part of a multipart/form-data upload (the whole body if there is none)."""
+    msg = BytesParser(policy=email_policy.HTTP).parsebytes(
+        b"Content-Type: " + (content_type or "").encode("latin-1") + b"\r\n\r\n" + body
+    )
+    if msg.is_multipart():
+        for part in msg.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                return part.get_payload(decode=True) or b""
+    return body
+
+
+def fake_transcript(audio: bytes) -> str:
+    rng = random.Random(_digest(audio))
+    n = 8 + len(audio) // 16000  # roughly a word per half second of 16-bit mono audio
+    return " ".join(rng.choice(WORDS) for _ in range(min(n, 400))).capitalize() + "."
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "GroqStub/1.0"
+    cfg: StubConfig
+    rng: random.Random
+    rng_lock: threading.Lock
+
+    def log_message(self, fmt, *args):  # keep benchmarks quiet
+        pass
+
+    def _roll(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+    def _sleep(self, base_ms: float) -> None:
+        with self.rng_lock:
+            jitter = self.rng.uniform(-self.cfg.jitter_ms, self.cfg.jitter_ms)
+        time.sleep(max(base_ms + jitter, 0.0) / 1000.0)
+
+    def _send(self, status: int, body: bytes, ctype: str = "application/json", headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _maybe_fail(self) -> bool:
+        r = self._roll()
+        if r < self.cfg.rate_429:
+            self._send(429, b'{"error":{"message":"rate limited (stub)"}}', headers={"Retry-After": "1"})
+            return True
+        if r < self.cfg.rate_429 + self.cfg.error_rate:
+            self._send(500, b'{"error":{"message":"internal error (stub)"}}')
+            return True
+        return False
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.path.endswith("/chat/completions"):
+            self._chat(body)
+        elif self.path.endswith("/audio/transcriptions"):
+            self._transcribe(body)
+        else:
+            self._send(404, b'{"error":{"message":"not found"}}')
+
+    def _chat(self, body: bytes):
+        self._sleep(self.cfg.latency_ms)
+        if self._maybe_fail():
+            return
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._send(400, b'{"error":{"message":"bad json"}}')
+            return
+        user_msg = next((m.get("content", "") for m in reversed(payload.get("messages", []))
+                         if m.get("role") == "user"), "")
+        if self._roll() < self.cfg.malformed_rate:
+            content = "Sure! Here is the analysis you asked for: motifs are water and doors."
+        else:
+            content = json.dumps(fake_analysis(user_msg))
+        model = payload.get("model", "stub")
+
+        if payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            step = 24
+            for i in range(0, len(content), step):
+                chunk = {"choices": [{"index": 0, "delta": {"content": content[i:i + step]}}], "model": model}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(self.cfg.stream_chunk_ms / 1000.0)
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        out = {
+            "id": "stub-" + hashlib.sha1(body).hexdigest()[:12],
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+        }
+        self._send(200, json.dumps(out).encode("utf-8"))
+
+    def _transcribe(self, body: bytes):
+        # Latency scales mildly with upload size, like the real endpoint.
+        self._sleep(self.cfg.stt_latency_ms + len(body) / 50_000.0)
+        if self._maybe_fail():
+            return
+        # Hash only the audio: the multipart boundary is random per request
+        audio = multipart_file(body, self.headers.get("Content-Type", ""))
+        self._send(200, fake_transcript(audio).encode("utf-8"), ctype="text/plain; charset=utf-8")
+
+
+def make_server(cfg: StubConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    handler = type("StubHandler", (_Handler,), {
+        "cfg": cfg, "rng": random.Random(cfg.seed), "rng_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def start_in_thread(cfg: StubConfig, host: str = "127.0.0.1", port: int = 0):
+    """Start the stub on a background thread. Returns (server, base_url)."""
+    server = make_server(cfg, host, port)
+    threading.Thread(target=server.serve_forever, name="groq-stub", daemon=True).start()
+    h, p = server.server_address[:2]
+    return server, f"http://{h}:{p}/openai/v1"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local Groq-compatible stub server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8787)
+    ap.add_argument("--latency-ms", type=float, default=300.0)
+    ap.add_argument("--jitter-ms", type=float, default=100.0)
+    ap.add_argument("--stt-latency-ms", type=float, default=800.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--stream-chunk-ms", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=7)
+    a = ap.parse_args()
+    cfg = StubConfig(a.latency_ms, a.jitter_ms, a.stt_latency_ms, a.error_rate,
+                     a.rate_429, a.malformed_rate, a.stream_chunk_ms, a.seed)
+    server = make_server(cfg, a.host, a.port)
+    print(f"Groq stub listening on http://{a.host}:{a.port}/openai/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()